@@ -1,4 +1,14 @@
 # config.py
+# Los scripts de consola usan la configuración de la raíz (../config.py), la misma que
+# leen los módulos compartidos; acá solo se pisa lo propio de estos scripts.
+import os as _os
+
+_ROOT_CONFIG = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.abspath(__file__))), 'config.py')
+with open(_ROOT_CONFIG, encoding='utf-8') as _f:
+    exec(compile(_f.read(), _ROOT_CONFIG, 'exec'))
+
 TELEGRAM_TOKEN = ""  
 TELEGRAM_CHAT_ID = ""        
-CSV_PATH = "DB/stocks.csv"
+
+# Checkpoint propio: los indicadores de la consola no se mezclan con los de la app web
+CHECKPOINT_PATH = "DB/cache/indicators_manual.ckpt.npz"
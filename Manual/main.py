@@ -1,10 +1,24 @@
-import yfinance as yf
-import pandas as pd
 from datetime import datetime
 import os
-import requests
+import sys
+import threading
 import config
-import concurrent.futures
+
+# Módulos compartidos con la app web (raíz del repositorio)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lazy import lazy_import
+import metrics
+import profiling
+import market_data
+import throttle
+import scan_plan
+import scan_log
+import checkpoint
+import snapshot
+
+# Dependencias pesadas: se importan en el primer uso para que el menú aparezca al instante
+pd = lazy_import('pandas')
+requests = lazy_import('requests')
 
 # ------------------------------------------------------------------------------------
 # Sección 1: Análisis Técnico Mejorado
@@ -12,54 +26,61 @@ import concurrent.futures
 
 def get_technical_analysis(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="6mo", timeout=10)  # Timeout de 10 segundos
+        with metrics.span('fetch'):
+            hist = market_data.history(ticker, period="6mo", timeout=10)  # Timeout de 10 segundos
         
         if hist.empty:
             return None, "No hay datos suficientes para este ticker."
 
-        
+        return compute_technical(hist)
+    
+    except throttle.ThrottledError:
+        raise  # El escaneo reintenta el ticker más tarde
+    except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
+        return None, f"Error: {str(e)}"
+
+def compute_technical(hist):
+    """Agrega los indicadores a `hist` y devuelve (hist, última fila con los extras)."""
+    with metrics.span('indicators'):
         # Media Móvil Simple (SMA)
         hist['SMA20'] = hist['Close'].rolling(window=20).mean()
         hist['SMA50'] = hist['Close'].rolling(window=50).mean()
-        
+    
         # RSI
         delta = hist['Close'].diff()
         gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
         loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
         rs = gain / loss
         hist['RSI'] = 100 - (100 / (1 + rs))
-        
+    
         # MACD
         hist['EMA12'] = hist['Close'].ewm(span=12, adjust=False).mean()
         hist['EMA26'] = hist['Close'].ewm(span=26, adjust=False).mean()
         hist['MACD'] = hist['EMA12'] - hist['EMA26']
         hist['Signal'] = hist['MACD'].ewm(span=9, adjust=False).mean()
-        
+    
         # Bollinger Bands
         hist['STD'] = hist['Close'].rolling(window=20).std()
         hist['UpperBand'] = hist['SMA20'] + (2 * hist['STD'])
         hist['LowerBand'] = hist['SMA20'] - (2 * hist['STD'])
         latest = hist.iloc[-1].copy()
 
-        # Porcentaje respecto a Bollinger Bands
-        price = latest['Close']
-        upper = latest['UpperBand']
-        lower = latest['LowerBand']
-        latest['BB_Percent'] = ((price - lower) / (upper - lower)) * 100
-        
-        # Volumen promedio
-        latest['AvgVolume'] = hist['Volume'].tail(5).mean()
-        
-        return hist, latest
+    # Porcentaje respecto a Bollinger Bands
+    price = latest['Close']
+    upper = latest['UpperBand']
+    lower = latest['LowerBand']
+    latest['BB_Percent'] = ((price - lower) / (upper - lower)) * 100
     
-    except Exception as e:
-        return None, f"Error: {str(e)}"
+    # Volumen promedio
+    latest['AvgVolume'] = hist['Volume'].tail(5).mean()
+    
+    return hist, latest
 
 def get_fundamental_analysis(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        with metrics.span('fundamentals'):
+            info = market_data.info(ticker)
         
         # Calcular PEG Ratio
         pe_ratio = info.get('trailingPE', None)
@@ -117,9 +138,14 @@ def get_fundamental_analysis(ticker):
         return "\n".join(analysis)
     
     except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
         return f"Error en análisis fundamental: {str(e)}"
 
 def generate_recommendation(hist, latest_data):
+    with metrics.span('scoring'):
+        return _generate_recommendation(hist, latest_data)
+
+def _generate_recommendation(hist, latest_data):
     reasons = []
     price = latest_data['Close']
     
@@ -215,9 +241,13 @@ def send_telegram_message(message):
         "parse_mode": "Markdown"
     }
     try:
-        response = requests.post(url, json=payload)
+        with metrics.span('telegram'):
+            response = requests.post(url, json=payload)
+        if not response.ok:
+            metrics.inc('upstream_errors_total', service='telegram')
         return response.ok
     except:
+        metrics.inc('upstream_errors_total', service='telegram')
         return False
 
 def load_sp500_tickers():
@@ -231,12 +261,35 @@ def load_sp500_tickers():
         print(f"Error al cargar tickers: {e}")
         return ['NVDA', 'TSLA', 'AAPL', 'AMD', 'META', 'AMZN', 'GOOG', 'MSFT']
 
-# Función que procesa un solo ticker
-def process_ticker(ticker):
+# Estado de indicadores por ticker guardado entre ejecuciones (ver checkpoint.py)
+_checkpoint = checkpoint.Checkpointer(config.INDICATOR_PARAMS)
+
+def warm_technical(ticker):
+    """(hist, latest) desde el checkpoint si el ticker está al día; si no, None."""
+    state = _checkpoint.get_states().get(ticker)
+    if state is None or not state.is_fresh():
+        return None
+    metrics.inc('cache_hits_total', cache='checkpoint')
+    hist, latest = compute_technical(state.history())
+    # Las EMAs de las velas guardadas arrancan tarde: MACD y señal salen del estado
+    latest['MACD'], latest['Signal'] = state.macd_signal(config.INDICATOR_PARAMS)
+    return hist, latest
+
+# Función que procesa un solo ticker. Si se pasa `records` (una lista), también se
+# agrega ahí el registro de indicadores del ticker para el snapshot
+def process_ticker(ticker, records=None):
+    metrics.inc('scanned_tickers_total', scan='daily')
     try:
-        data, latest = get_technical_analysis(ticker)
-        if data is None or latest is None:
-            return None
+        warm = warm_technical(ticker)
+        if warm is not None:
+            data, latest = warm
+        else:
+            data, latest = get_technical_analysis(ticker)
+            if data is None or latest is None:
+                return None
+            _checkpoint.put(ticker, checkpoint.TickerState.from_history(data, config.INDICATOR_PARAMS))
+        if records is not None:
+            records.append(snapshot.feature_record(ticker, data, latest))
         
         
         recommendation, reasons, time_analysis = generate_recommendation(data, latest)
@@ -250,52 +303,52 @@ def process_ticker(ticker):
                 'target': latest['UpperBand'],
                 'reasons': reasons[:3]
             }
+    except throttle.ThrottledError:
+        raise
     except Exception as e:
          print(f"Error procesando {ticker}: {e}")  # Opcional: descomentar para debug
     return None
 
-def get_investment_recommendations():
-    tickers = load_sp500_tickers()
-    recommendations = []
-    batch_size = 50  # Procesar 50 tickers a la vez
-    max_recommendations = 5  # Límite de recomendaciones a retornar
-
-    # Dividir la lista de tickers en batches
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i + batch_size]  # Obtener el siguiente batch de tickers
-        print(f"Procesando batch {i//batch_size + 1}: {len(batch)} tickers")
-
-        # Procesar el batch actual con concurrencia
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {executor.submit(process_ticker, ticker): ticker for ticker in batch}
-
-            try:
-                for future in concurrent.futures.as_completed(futures):
-                    try:
-                        result = future.result(timeout=15)  # Timeout por futuro
-                        if result:
-                            recommendations.append(result)
-                            if len(recommendations) >= max_recommendations:
-                                break
-                    except (concurrent.futures.TimeoutError, Exception) as e:
-                        continue
-
-            finally:
-                # Cancelar todas las tareas pendientes en este batch
-                for f in futures:
-                    f.cancel()
-                executor.shutdown(wait=False)
-
-        # Detener el procesamiento si ya se alcanzó el límite de recomendaciones
-        if len(recommendations) >= max_recommendations:
-            break
-
-    return recommendations[:max_recommendations]
+def scan_plan_for(tickers, only_universe=False):
+    """Plan del escaneo. Con `only_universe` se escanean solo `tickers` (un universo
+    pedido explícitamente), sin sumar posiciones ni watchlist."""
+    if only_universe:
+        return scan_plan.build_plan(tickers, holdings=[], watchlist=[])
+    return scan_plan.build_plan(tickers)
+
+def get_investment_recommendations(tickers=None, max_recommendations=5, max_workers=None, deadline=None,
+                                   on_result=None, only_universe=False):
+    tickers = load_sp500_tickers() if tickers is None else tickers
+    # Posiciones, watchlist y los más líquidos primero, por si se agota el tiempo
+    tracker = scan_plan.ScanTracker(scan_plan_for(tickers, only_universe), seconds=deadline)
+    print(f"Procesando {len(tracker.plan)} tickers (límite {tracker.deadline.seconds}s)")
+    # Los tickers del checkpoint que quedaron atrás se ponen al día con un pedido en lote
+    if checkpoint.catch_up(_checkpoint.get_states(), tracker.tickers, config.INDICATOR_PARAMS):
+        _checkpoint.mark_dirty()
+
+    # La concurrencia real la ajusta throttle según cómo responde Yahoo; los tickers
+    # limitados (429) se reintentan en lugar de descartarse
+    records = []
+    recommendations = throttle.run_scan(
+        tracker.tickers, lambda ticker: tracker.run(lambda t: process_ticker(t, records), ticker),
+        stop=lambda results: len(results) >= max_recommendations,
+        max_workers=max_workers, deadline=tracker.deadline, on_result=on_result)
+    recommendations = recommendations[:max_recommendations]
+    scan_plan.record_flagged([r['ticker'] for r in recommendations])
+    _checkpoint.maybe_save(force=True)  # Proceso corto: se guarda al terminar cada escaneo
+    result = tracker.result(recommendations, target=max_recommendations)
+    scan_log.append('daily', result, partial=result.partial)
+    # Los indicadores calculados quedan disponibles para otras herramientas
+    try:
+        snapshot.publish_records(list(records), config.INDICATOR_PARAMS)
+    except Exception as e:
+        print(f"Error publicando el snapshot de indicadores: {e}")
+    return result
 
 def get_intraday_analysis(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="1d", interval="5m")  # Datos intradía cada 5 minutos
+        with metrics.span('fetch', interval='5m'):
+            hist = market_data.history(ticker, period="1d", interval="5m")  # Datos intradía cada 5 minutos
         
         if hist.empty:
             return None, "No hay datos intradía para este ticker."
@@ -310,19 +363,49 @@ def get_intraday_analysis(ticker):
         
         return hist, latest
     
+    except throttle.ThrottledError:
+        raise  # El escaneo reintenta el ticker más tarde
     except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
         return None, f"Error: {str(e)}"
     
     
 
-def find_intraday_opportunities():
-    tickers = load_sp500_tickers()
-    opportunities = []
-    batch_size = 50  # Procesar 50 tickers por lote
-    max_opportunities = 5  # Máximo de oportunidades a retornar
-    
+def find_intraday_opportunities(tickers=None, max_opportunities=5, max_workers=None, deadline=None,
+                                on_result=None, only_universe=False):
+    tickers = load_sp500_tickers() if tickers is None else tickers
+    tracker = scan_plan.ScanTracker(scan_plan_for(tickers, only_universe), seconds=deadline)
+
+    # Todo el universo en un solo panel de 5m (cacheado) y un barrido vectorizado; si la
+    # descarga en lote falla se vuelve al escaneo ticker por ticker
+    import intraday
+    from panel import last_valid_rows
+    try:
+        prices = intraday.load_intraday_panel(tracker.tickers)
+    except Exception as e:
+        print(f"Error descargando el panel intradía: {e}")
+        prices = None
+    if prices is not None:
+        print(f"Barrido intradía vectorizado de {len(prices.tickers)} tickers")
+        metrics.inc('scanned_tickers_total', len(prices.tickers), scan='intraday')
+        _, has_data = last_valid_rows(prices['Close'])
+        for ticker, ok in zip(prices.tickers, has_data):
+            if ok:
+                tracker.mark(ticker)
+        opportunities = intraday.rank_anomalies(prices, limit=max_opportunities)
+        for opportunity in opportunities if on_result else ():
+            on_result(opportunity)
+        scan_plan.record_flagged([o['ticker'] for o in opportunities])
+        result = tracker.result(opportunities, target=max_opportunities)
+        scan_log.append('intraday', result, partial=result.partial)
+        return result
+    return _find_intraday_per_ticker(tracker, max_opportunities, max_workers, on_result)
+
+
+def _find_intraday_per_ticker(tracker, max_opportunities, max_workers=None, on_result=None):
     # Función para procesar un ticker individual
     def process_intraday_ticker(ticker):
+        metrics.inc('scanned_tickers_total', scan='intraday')
         try:
             data, latest = get_intraday_analysis(ticker)
             if data is None or latest is None:
@@ -342,42 +425,28 @@ def find_intraday_opportunities():
                 }
             return None
             
+        except throttle.ThrottledError:
+            raise
         except Exception as e:
             # print(f"Error en {ticker}: {str(e)}")  # Descomentar para debug
             return None
 
-    # Procesamiento por batches
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i + batch_size]
-        print(f"Procesando batch intradía {i//batch_size + 1}: {len(batch)} tickers")
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=15) as executor:  # Más workers para velocidad
-            futures = {executor.submit(process_intraday_ticker, ticker): ticker for ticker in batch}
-            
-            try:
-                for future in concurrent.futures.as_completed(futures):
-                    result = future.result(timeout=10)  # Timeout más ajustado
-                    if result:
-                        opportunities.append(result)
-                        if len(opportunities) >= max_opportunities:
-                            break
-            except concurrent.futures.TimeoutError:
-                continue
-            finally:
-                # Limpieza de recursos
-                for f in futures:
-                    f.cancel()
-                executor.shutdown(wait=False)
-        
-        if len(opportunities) >= max_opportunities:
-            break
+    print(f"Procesando {len(tracker.plan)} tickers intradía (límite {tracker.deadline.seconds}s)")
+    opportunities = throttle.run_scan(
+        tracker.tickers, lambda ticker: tracker.run(process_intraday_ticker, ticker),
+        stop=lambda results: len(results) >= max_opportunities,
+        max_workers=max_workers, deadline=tracker.deadline, on_result=on_result)
+    opportunities = opportunities[:max_opportunities]
+    scan_plan.record_flagged([o['ticker'] for o in opportunities])
     
     # Ordenar por mejor oportunidad
-    return sorted(
-        opportunities[:max_opportunities], 
+    result = tracker.result(sorted(
+        opportunities, 
         key=lambda x: (x['pct_change'], x['volume_ratio']), 
         reverse=True
-    )
+    ), target=max_opportunities)
+    scan_log.append('intraday', result, partial=result.partial)
+    return result
 
 def show_glossary():
     print("\n📚 Glosario de Conceptos de Trading")
@@ -454,12 +523,14 @@ def main_menu():
     print("2. Obtener recomendaciones del día")
     print("3. Buscar oportunidades intradía")
     print("4. Glosario (Explicación de conceptos)")
-    print("5. Salir")
+    print("5. Métricas de rendimiento")
+    print("6. Salir")
     return input("\nSeleccione una opción: ")
 
 def show_intraday_opportunities():
     print("\n🔎 Buscando oportunidades intradía...")
     opportunities = find_intraday_opportunities()
+    print(f"\n⏱️ {scan_plan.describe(opportunities.coverage)}")
     
     if not opportunities:
         print("\n⚠️ No se encontraron oportunidades intradía fuertes")
@@ -470,8 +541,11 @@ def show_intraday_opportunities():
         print(f"""{idx}. {opp['ticker']}
                 Precio actual: ${opp['price']:.2f}
                 Cambio (%): {opp['pct_change']:.2f}%
-                Volumen: {opp['volume_ratio']:.1f}x promedio
-                Hora detección: {opp['timestamp']}""")
+                Volumen: {opp['volume_ratio']:.1f}x promedio""")
+        if 'volume_z' in opp:
+            print(f"""                Desde apertura: {opp['move_pct']:+.2f}% · VWAP {opp['vwap_dev_pct']:+.2f}%
+                Volumen z-score: {opp['volume_z']:.1f}""")
+        print(f"                Hora detección: {opp['timestamp']}")
                 
 
 def analyze_single_ticker():
@@ -517,6 +591,7 @@ def analyze_single_ticker():
 def show_daily_recommendations():
     print("\n🔎 Buscando oportunidades...")
     recommendations = get_investment_recommendations()
+    print(f"\n⏱️ {scan_plan.describe(recommendations.coverage)}")
     
     if not recommendations:
         print("\n⚠️ No se encontraron oportunidades fuertes")
@@ -532,19 +607,31 @@ def show_daily_recommendations():
         for reason in asset['reasons'][:2]:
             print(f"    - {reason}")
 
+def run_action(choice, action, profile=False):
+    if profile:
+        profiling.run_profiled(f"menu_{choice}", action)
+    else:
+        action()
+
 def main():
     while True:
-        choice = main_menu()
+        choice = main_menu().strip()
+        # Con FINANCEBOT_PROFILE=1, una "p" al final perfila esa acción (ej: "2p")
+        profile = profiling.ENABLED and choice.endswith('p')
+        if profile:
+            choice = choice[:-1]
         
         if choice == '1':
-            analyze_single_ticker()
+            run_action(choice, analyze_single_ticker, profile)
         elif choice == '2':
-            show_daily_recommendations()
+            run_action(choice, show_daily_recommendations, profile)
         elif choice == '3':
-            show_intraday_opportunities()
+            run_action(choice, show_intraday_opportunities, profile)
         elif choice == '4':  # Nueva opción de glosario
-            show_glossary()
-        elif choice == '5':  # Opción Salir movida a 5
+            run_action(choice, show_glossary, profile)
+        elif choice == '5':
+            metrics.print_summary()
+        elif choice == '6':  # Opción Salir movida a 6
             print("\n✅ Sesión finalizada")
             break
         else:
@@ -552,5 +639,140 @@ def main():
         
         input("\nPresione Enter para continuar...")
 
+# ------------------------------------------------------------------------------------
+# Modo sin menú para cron y pipes
+# ------------------------------------------------------------------------------------
+# python Manual/main.py scan|intraday|analyze TICKER... [--workers N] [--deadline S]
+# [--universe sp500|archivo.csv|AAPL,MSFT] [--limit N]
+#
+# Cada resultado sale por stdout como una línea JSON (NDJSON) apenas está listo, así
+# otro proceso puede consumirlo sin esperar el escaneo completo; la última línea es un
+# resumen ({"type": "summary", ...}). Los mensajes de progreso van a stderr.
+#
+# Códigos de salida: 0 ok, 1 error inesperado, 2 argumentos inválidos, 3 resultado
+# parcial (se agotó el tiempo), 4 falla de datos (algún ticker de `analyze` sin datos o
+# escaneo sin ningún ticker evaluado).
+
+EXIT_OK, EXIT_ERROR, EXIT_USAGE, EXIT_PARTIAL, EXIT_DATA = 0, 1, 2, 3, 4
+
+
+def _json_safe(value):
+    # NaN no es JSON válido y los escalares numpy no siempre se serializan solos
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def resolve_universe(universe):
+    """sp500 (Wikipedia), un CSV con columna Symbol o una lista separada por comas."""
+    if not universe or universe == 'sp500':
+        return load_sp500_tickers()
+    if os.path.exists(universe):
+        return [str(t).strip().upper() for t in pd.read_csv(universe)['Symbol'].dropna()]
+    return [t.strip().upper() for t in universe.split(',') if t.strip()]
+
+
+def analyze_record(ticker):
+    """Análisis de un ticker como registro serializable (lo que muestra la opción 1)."""
+    data, latest = get_technical_analysis(ticker)
+    if data is None:
+        return {'type': 'error', 'ticker': ticker, 'message': latest}
+    recommendation, reasons, time_analysis = generate_recommendation(data, latest)
+    entry = latest['LowerBand'] if latest['BB_Percent'] < 30 else latest['SMA20']
+    return {
+        'type': 'result',
+        'ticker': ticker,
+        'date': data.index[-1].strftime('%Y-%m-%d'),
+        'price': latest['Close'],
+        'recommendation': recommendation,
+        'entry': entry,
+        'target': latest['UpperBand'],
+        'reasons': reasons,
+        'time_analysis': time_analysis,
+    }
+
+
+def run_headless(argv):
+    import argparse
+    import contextlib
+    import json
+
+    parser = argparse.ArgumentParser(prog='main.py', description="Escaneos sin menú con salida NDJSON")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, text in (('scan', "Recomendaciones del día"), ('intraday', "Oportunidades intradía")):
+        command = sub.add_parser(name, help=text)
+        command.add_argument('--universe', default='sp500',
+                             help="sp500, un CSV con columna Symbol o tickers separados por comas")
+        command.add_argument('--limit', type=int, default=5, help="Máximo de resultados")
+    analyze = sub.add_parser('analyze', help="Análisis de uno o más tickers")
+    analyze.add_argument('tickers', nargs='+')
+    for command in sub.choices.values():
+        command.add_argument('--workers', type=int, default=None, help="Techo de hilos del escaneo")
+        command.add_argument('--deadline', type=float, default=None,
+                             help="Segundos máximos (por defecto SCAN_DEADLINE_SECONDS; 0 = sin límite)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout
+    lock = threading.Lock()
+
+    def emit(record):
+        line = json.dumps(_json_safe(record), ensure_ascii=False)
+        with lock:
+            out.write(line + '\n')
+            out.flush()
+
+    # Cualquier print del escaneo va a stderr: stdout queda solo para el NDJSON
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if args.command == 'analyze':
+                tickers = [t.upper() for t in args.tickers]
+                failures = []
+
+                def analyze_one(ticker):
+                    try:
+                        record = analyze_record(ticker)
+                    except throttle.ThrottledError:
+                        raise
+                    except Exception as e:
+                        record = {'type': 'error', 'ticker': ticker, 'message': str(e)}
+                    if record['type'] == 'error':
+                        failures.append(ticker)
+                    return record
+
+                deadline = scan_plan.Deadline(config.SCAN_DEADLINE_SECONDS if args.deadline is None else args.deadline)
+                results = throttle.run_scan(tickers, analyze_one, max_workers=args.workers,
+                                            deadline=deadline, on_result=emit)
+                done = {r['ticker'] for r in results}
+                missing = [t for t in tickers if t not in done]
+                emit({'type': 'summary', 'command': 'analyze', 'requested': len(tickers),
+                      'analyzed': len(results) - len(failures), 'failed': failures, 'missing': missing})
+                if missing:
+                    return EXIT_PARTIAL if deadline.expired() else EXIT_DATA
+                return EXIT_DATA if failures else EXIT_OK
+
+            tickers = resolve_universe(args.universe)
+            scan = get_investment_recommendations if args.command == 'scan' else find_intraday_opportunities
+            scan_name = 'daily' if args.command == 'scan' else 'intraday'
+            # Un universo explícito (CSV o lista) se escanea solo: sin posiciones ni watchlist
+            result = scan(tickers, args.limit, max_workers=args.workers, deadline=args.deadline,
+                          on_result=lambda r: emit({'type': 'result', 'scan': scan_name, **r}),
+                          only_universe=args.universe not in ('', 'sp500'))
+            emit({'type': 'summary', 'command': args.command, 'count': len(result), 'coverage': result.coverage})
+            if result.partial:
+                return EXIT_PARTIAL
+            return EXIT_DATA if tickers and not result.coverage['scanned'] else EXIT_OK
+        except Exception as e:
+            emit({'type': 'error', 'message': f"{type(e).__name__}: {e}"})
+            return EXIT_ERROR
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_headless(sys.argv[1:]))
     main()
\ No newline at end of file
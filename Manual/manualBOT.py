@@ -1,10 +1,21 @@
-import yfinance as yf
-import pandas as pd
 from datetime import datetime
 import os
-import requests
+import sys
 import config
 
+# Módulos compartidos con la app web (raíz del repositorio)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lazy import lazy_import
+import metrics
+import profiling
+import market_data
+import positions
+import scan_plan
+import scan_log
+
+# Dependencias pesadas: se importan en el primer uso para que el menú aparezca al instante
+pd = lazy_import('pandas')
+requests = lazy_import('requests')
 
 # ------------------------------------------------------------------------------------
 # Sección 1: Análisis Técnico Mejorado
@@ -12,34 +23,35 @@ import config
 
 def get_technical_analysis(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="6mo")
+        with metrics.span('fetch'):
+            hist = market_data.history(ticker, period="6mo")
         
         if hist.empty:
             return None, "No hay datos suficientes para este ticker."
         
-        # Media Móvil Simple (SMA)
-        hist['SMA20'] = hist['Close'].rolling(window=20).mean()
-        hist['SMA50'] = hist['Close'].rolling(window=50).mean()
+        with metrics.span('indicators'):
+            # Media Móvil Simple (SMA)
+            hist['SMA20'] = hist['Close'].rolling(window=20).mean()
+            hist['SMA50'] = hist['Close'].rolling(window=50).mean()
         
-        # RSI
-        delta = hist['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        hist['RSI'] = 100 - (100 / (1 + rs))
+            # RSI
+            delta = hist['Close'].diff()
+            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+            rs = gain / loss
+            hist['RSI'] = 100 - (100 / (1 + rs))
         
-        # MACD
-        hist['EMA12'] = hist['Close'].ewm(span=12, adjust=False).mean()
-        hist['EMA26'] = hist['Close'].ewm(span=26, adjust=False).mean()
-        hist['MACD'] = hist['EMA12'] - hist['EMA26']
-        hist['Signal'] = hist['MACD'].ewm(span=9, adjust=False).mean()
+            # MACD
+            hist['EMA12'] = hist['Close'].ewm(span=12, adjust=False).mean()
+            hist['EMA26'] = hist['Close'].ewm(span=26, adjust=False).mean()
+            hist['MACD'] = hist['EMA12'] - hist['EMA26']
+            hist['Signal'] = hist['MACD'].ewm(span=9, adjust=False).mean()
         
-        # Bollinger Bands (SMA20 ± 2 desviaciones estándar)
-        hist['STD'] = hist['Close'].rolling(window=20).std()
-        hist['UpperBand'] = hist['SMA20'] + (2 * hist['STD'])
-        hist['LowerBand'] = hist['SMA20'] - (2 * hist['STD'])
-        latest = hist.iloc[-1].copy()
+            # Bollinger Bands (SMA20 ± 2 desviaciones estándar)
+            hist['STD'] = hist['Close'].rolling(window=20).std()
+            hist['UpperBand'] = hist['SMA20'] + (2 * hist['STD'])
+            hist['LowerBand'] = hist['SMA20'] - (2 * hist['STD'])
+            latest = hist.iloc[-1].copy()
 
         # Porcentaje respecto a Bollinger Bands
         price = latest['Close']
@@ -53,12 +65,13 @@ def get_technical_analysis(ticker):
         return hist, latest
     
     except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
         return None, f"Error: {str(e)}"
 
 def get_fundamental_analysis(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        with metrics.span('fundamentals'):
+            info = market_data.info(ticker)
         
         fundamental = {
             'P/E Ratio': info.get('trailingPE', 'N/A'),
@@ -88,9 +101,14 @@ def get_fundamental_analysis(ticker):
         return "\n".join(analysis)
     
     except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
         return f"Error en análisis fundamental: {str(e)}"
 
 def generate_recommendation(hist, latest_data):
+    with metrics.span('scoring'):
+        return _generate_recommendation(hist, latest_data)
+
+def _generate_recommendation(hist, latest_data):
     reasons = []
     price = latest_data['Close']
     
@@ -185,7 +203,10 @@ def send_telegram_message(message):
         "text": message,
         "parse_mode": "Markdown"
     }
-    response = requests.post(url, json=payload)
+    with metrics.span('telegram'):
+        response = requests.post(url, json=payload)
+    if not response.ok:
+        metrics.inc('upstream_errors_total', service='telegram')
     return response.ok
 
 def load_sp500_tickers(csv_path=config.CSV_PATH):
@@ -209,10 +230,16 @@ def get_investment_recommendations():
         print("No se pudieron cargar los tickers. Usando lista por defecto.")
         tickers = ['NVDA', 'TSLA', 'AAPL', 'AMD', 'META', 'AMZN', 'GOOG', 'MSFT', 'BTC-USD', 'ETH-USD']
     recommendations = []
+    # Posiciones, watchlist y los más líquidos primero, por si se agota el tiempo
+    tracker = scan_plan.ScanTracker(scan_plan.build_plan(tickers))
     
-    for ticker in tickers:
+    for ticker in tracker.tickers:
+        if tracker.deadline.expired():
+            break
+        metrics.inc('scanned_tickers_total', scan='daily')
         try:
             data, latest = get_technical_analysis(ticker)
+            tracker.mark(ticker)
             if data is None:
                 continue
                 
@@ -242,130 +269,158 @@ def get_investment_recommendations():
         except Exception as e:
             continue
     
-    return recommendations
+    scan_plan.record_flagged([rec['ticker'] for rec in recommendations])
+    result = tracker.result(recommendations, target=5)
+    scan_log.append('daily', result, partial=result.partial)
+    return result
+
+
+def save_purchase(ticker, price, quantity):
+    positions.record_trade({
+        'ticker': ticker,
+        'quantity': quantity,
+        'purchase_date': datetime.now().strftime('%Y-%m-%d'),
+        'purchase_price': round(price, 2),
+        'side': 'buy'
+    })
 
 
 # ------------------------------------------------------------------------------------
 # Interfaz de Usuario (CLI) Actualizada
 # ------------------------------------------------------------------------------------
 
-def main():
-    while True:
-        print("\n=== BOT FINANCIERO  ===")
-        print("1. Analizar un ticker")
-        print("2. Registrar una compra")
-        print("3. Obtener recomendaciones del mercado Americano")
-        print("4. Salir")
+def handle_choice(choice):
+    if choice == "1":
+        ticker = input("Ingresa el ticker (ej: NVDA): ").upper()
+        data, latest = get_technical_analysis(ticker)
         
-        choice = input("Selecciona una opción: ")
+        if data is None:
+            print(latest)
+            return
         
-        if choice == "1":
-            ticker = input("Ingresa el ticker (ej: NVDA): ").upper()
-            data, latest = get_technical_analysis(ticker)
-            
-            if data is None:
-                print(latest)
-                continue
-            
-            recommendation, reasons, time_analysis = generate_recommendation(data, latest)
-            price = latest['Close']
-
-            entry_price = None
-            target_price = None
-            if recommendation == "COMPRAR":
-                if latest['BB_Percent'] < 30:
-                    entry_price = latest['LowerBand']
-                else:
-                    entry_price = latest['SMA20']
-                target_price = latest['UpperBand']
-            
-            # Resultado en consola
-            print(f"\n📊 Análisis para {ticker} (Precio: ${price:.2f})")
-            print(f"🚨 Recomendación: {recommendation}")
+        recommendation, reasons, time_analysis = generate_recommendation(data, latest)
+        price = latest['Close']
 
-            if recommendation == "COMPRAR":
-                print(f"💡 Precio de entrada ideal: ${entry_price:.2f}")
-                print(f"🎯 Objetivo técnico: ${target_price:.2f}")
-                entry_target_msg = f"\n\n🎯 *Precios Clave:*\n- Precio de Entrada: ${entry_price:.2f}\n- Precio Objetivo: ${target_price:.2f}"
+        entry_price = None
+        target_price = None
+        if recommendation == "COMPRAR":
+            if latest['BB_Percent'] < 30:
+                entry_price = latest['LowerBand']
+            else:
+                entry_price = latest['SMA20']
+            target_price = latest['UpperBand']
+        
+        # Resultado en consola
+        print(f"\n📊 Análisis para {ticker} (Precio: ${price:.2f})")
+        print(f"🚨 Recomendación: {recommendation}")
 
-            
-            else: entry_target_msg = ""  # Si no es "COMPRAR", no se agrega nada
+        if recommendation == "COMPRAR":
+            print(f"💡 Precio de entrada ideal: ${entry_price:.2f}")
+            print(f"🎯 Objetivo técnico: ${target_price:.2f}")
+            entry_target_msg = f"\n\n🎯 *Precios Clave:*\n- Precio de Entrada: ${entry_price:.2f}\n- Precio Objetivo: ${target_price:.2f}"
 
-                
-                
-            print("\n🔍 Detalles Técnicos:")
-            for reason in reasons:
-                print(f"- {reason}")
-            print("\n⏳ Horizonte Temporal:")
-            print(time_analysis)
-            
+        
+        else: entry_target_msg = ""  # Si no es "COMPRAR", no se agrega nada
 
             
-            # Análisis Fundamental
-            fundamental_analysis = get_fundamental_analysis(ticker)
-            print("\n📈 Análisis Fundamental:")
-            print(fundamental_analysis)
             
-            # Enviar a Telegram
-            telegram_msg = (
-                f"*📊Análisis de {ticker}*\n"
-                f"Precio: ${price:.2f}\n"
-                f"🚨Recomendación: {recommendation}"
-                f"{entry_target_msg}\n\n"  # Aquí se inserta el mensaje con precios clave
-
-                "🔍Detalles Técnicos:\n- " + "\n- ".join(reasons) + "\n\n"
-                "⏳Horizonte Temporal:\n" + time_analysis + "\n\n"
-                "📈Análisis Fundamental:\n" + fundamental_analysis 
-            )
+        print("\n🔍 Detalles Técnicos:")
+        for reason in reasons:
+            print(f"- {reason}")
+        print("\n⏳ Horizonte Temporal:")
+        print(time_analysis)
+        
 
-            if config.TELEGRAM_TOKEN and config.TELEGRAM_CHAT_ID:
-                success = send_telegram_message(telegram_msg)
-                if success:
-                    print("\n✅ Notificación enviada a Telegram.")
-                else:
-                    print("\n❌ Error al enviar a Telegram.")
-                
-        elif choice == "2":
-            ticker = input("Ticker comprado (ej: TSLA): ").upper()
-            price = float(input("Precio por acción: "))
-            quantity = int(input("Cantidad: "))
-            save_purchase(ticker, price, quantity)
-            print("¡Compra registrada exitosamente!")
         
-        elif choice == "3":  # Nueva opción de recomendaciones
-            print("\n🔎 Analizando oportunidades de mercado...")
-            recommendations = get_investment_recommendations()
+        # Análisis Fundamental
+        fundamental_analysis = get_fundamental_analysis(ticker)
+        print("\n📈 Análisis Fundamental:")
+        print(fundamental_analysis)
+        
+        # Enviar a Telegram
+        telegram_msg = (
+            f"*📊Análisis de {ticker}*\n"
+            f"Precio: ${price:.2f}\n"
+            f"🚨Recomendación: {recommendation}"
+            f"{entry_target_msg}\n\n"  # Aquí se inserta el mensaje con precios clave
+
+            "🔍Detalles Técnicos:\n- " + "\n- ".join(reasons) + "\n\n"
+            "⏳Horizonte Temporal:\n" + time_analysis + "\n\n"
+            "📈Análisis Fundamental:\n" + fundamental_analysis 
+        )
+
+        if config.TELEGRAM_TOKEN and config.TELEGRAM_CHAT_ID:
+            success = send_telegram_message(telegram_msg)
+            if success:
+                print("\n✅ Notificación enviada a Telegram.")
+            else:
+                print("\n❌ Error al enviar a Telegram.")
             
-            if not recommendations:
-                print("\n⚠️ No se encontraron oportunidades fuertes para corto plazo")
-                continue
-                
-            print(f"\n🚀 Top 5 Recomendaciones Corto Plazo ({datetime.now().strftime('%d/%m')}):")
-            for i, asset in enumerate(recommendations, 1):
-                print(f"\n{i}. {asset['ticker']}")
-                print(f"   Precio Actual: {asset['price']}")
-                print(f"   Precio Entrada Ideal: {asset['entry']}")
-                print(f"   Objetivo Técnico: {asset['target']}")
-                print("   Señales Técnicas:")
-                for reason in asset['reasons']:
-                    print(f"   - {reason}")
+    elif choice == "2":
+        ticker = input("Ticker comprado (ej: TSLA): ").upper()
+        price = float(input("Precio por acción: "))
+        quantity = int(input("Cantidad: "))
+        save_purchase(ticker, price, quantity)
+        print("¡Compra registrada exitosamente!")
+    
+    elif choice == "3":  # Nueva opción de recomendaciones
+        print("\n🔎 Analizando oportunidades de mercado...")
+        recommendations = get_investment_recommendations()
+        print(f"\n⏱️ {scan_plan.describe(recommendations.coverage)}")
+        
+        if not recommendations:
+            print("\n⚠️ No se encontraron oportunidades fuertes para corto plazo")
+            return
             
-            # Enviar por Telegram
-            if config.TELEGRAM_TOKEN and config.TELEGRAM_CHAT_ID:
-                telegram_msg = "📈 *Recomendaciones Corto Plazo:*\n\n"
-                for asset in recommendations:
-                    telegram_msg += (
-                        f"🏅 *{asset['ticker']}*\n"
-                        f"- Precio: {asset['price']}\n"
-                        f"- Entrada: {asset['entry']}\n"
-                        f"- Objetivo: {asset['target']}\n"
-                        f"- Señales:\n   • " + "\n   • ".join(asset['reasons']) + "\n\n"
-                    )
-                send_telegram_message(telegram_msg)
+        print(f"\n🚀 Top 5 Recomendaciones Corto Plazo ({datetime.now().strftime('%d/%m')}):")
+        for i, asset in enumerate(recommendations, 1):
+            print(f"\n{i}. {asset['ticker']}")
+            print(f"   Precio Actual: {asset['price']}")
+            print(f"   Precio Entrada Ideal: {asset['entry']}")
+            print(f"   Objetivo Técnico: {asset['target']}")
+            print("   Señales Técnicas:")
+            for reason in asset['reasons']:
+                print(f"   - {reason}")
+        
+        # Enviar por Telegram
+        if config.TELEGRAM_TOKEN and config.TELEGRAM_CHAT_ID:
+            telegram_msg = "📈 *Recomendaciones Corto Plazo:*\n\n"
+            if recommendations.partial:
+                telegram_msg += f"_{scan_plan.describe(recommendations.coverage)}_\n\n"
+            for asset in recommendations:
+                telegram_msg += (
+                    f"🏅 *{asset['ticker']}*\n"
+                    f"- Precio: {asset['price']}\n"
+                    f"- Entrada: {asset['entry']}\n"
+                    f"- Objetivo: {asset['target']}\n"
+                    f"- Señales:\n   • " + "\n   • ".join(asset['reasons']) + "\n\n"
+                )
+            send_telegram_message(telegram_msg)
+
+    elif choice == "4":
+        metrics.print_summary()
 
-        elif choice == "4":  # Actualizado
+def main():
+    while True:
+        print("\n=== BOT FINANCIERO  ===")
+        print("1. Analizar un ticker")
+        print("2. Registrar una compra")
+        print("3. Obtener recomendaciones del mercado Americano")
+        print("4. Métricas de rendimiento")
+        print("5. Salir")
+        
+        choice = input("Selecciona una opción: ")
+        # Con FINANCEBOT_PROFILE=1, una "p" al final perfila esa acción (ej: "3p")
+        profile = profiling.ENABLED and choice.strip().endswith('p')
+        choice = choice.strip().rstrip('p') if profile else choice
+        
+        if choice == "5":  # Actualizado
             print("¡Hasta luego!")
             break
+        elif profile:
+            profiling.run_profiled(f"menu_{choice}", handle_choice, choice)
+        else:
+            handle_choice(choice)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,351 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+import config
+import metrics
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# ------------------------------------------------------------------------------------
+# Motor de alertas indexado, evaluado en lote sobre el panel de indicadores
+# ------------------------------------------------------------------------------------
+# Cada alerta compara un indicador de un ticker contra un umbral fijo. Las alertas se
+# agrupan por (ticker, indicador, operador) y sus umbrales se guardan en un array
+# ordenado: con el valor nuevo del indicador, una búsqueda binaria devuelve todas las
+# alertas disparadas sin recorrerlas una por una. Las comparaciones contra otro
+# indicador ("Close > UpperBand", "Volume > 2x AvgVolume") se guardan como un
+# cociente contra un umbral ("Close/UpperBand > 1").
+#
+# Una alerta disparada queda desarmada y no vuelve a avisar hasta que el valor se
+# aleja del umbral en más de ALERT_HYSTERESIS (histéresis), así un indicador que
+# oscila alrededor del umbral no genera un aviso por vela. Se desarma recién cuando el
+# aviso llegó a Telegram: si el envío falla, sigue armada y se reintenta en la próxima
+# evaluación.
+
+INDICATORS = ('Close', 'SMA20', 'SMA50', 'RSI', 'MACD', 'Signal', 'UpperBand', 'LowerBand',
+              'BB_Percent', 'Volume', 'AvgVolume')
+ALIASES = {'PRICE': 'Close', 'PRECIO': 'Close', 'VOLUMEN': 'Volume', 'BB%': 'BB_Percent'}
+
+_SPEC = re.compile(
+    r'^\s*(?P<ind>[\w%]+)\s*\(\s*(?P<ticker>[\w.^=-]+)\s*\)\s*(?P<op><=?|>=?)\s*'
+    r'(?:(?P<num>-?\d+(?:\.\d+)?)\s*(?P<times>[x×*])?\s*)?(?P<ref>[A-Za-z][\w%]*)?\s*$'
+)
+
+
+def _indicator_name(name):
+    name = ALIASES.get(name.upper(), name)
+    for known in INDICATORS:
+        if known.upper() == name.upper():
+            return known
+    raise ValueError(f"Indicador desconocido: {name} (disponibles: {', '.join(INDICATORS)})")
+
+
+def parse_alert(spec):
+    """Convierte un texto como "RSI(AAPL) < 30" o "Close(AAPL) > UpperBand" en una alerta."""
+    match = _SPEC.match(spec)
+    if not match or (match['num'] is None and match['ref'] is None) or (match['times'] and not match['ref']):
+        raise ValueError(f"Alerta inválida: '{spec}'. Ejemplos: 'RSI(AAPL) < 30', "
+                         f"'Close(AAPL) > UpperBand', 'Volume(AAPL) > 2x AvgVolume'")
+    indicator = _indicator_name(match['ind'])
+    threshold = float(match['num']) if match['num'] is not None else 1.0
+    if match['ref']:
+        indicator = f"{indicator}/{_indicator_name(match['ref'])}"
+    return {
+        'id': uuid.uuid4().hex[:8],
+        'spec': spec.strip(),
+        'ticker': match['ticker'].upper(),
+        'indicator': indicator,
+        'op': match['op'],
+        'threshold': threshold,
+        'armed': True,
+        'last_fired': None,
+    }
+
+
+class AlertIndex:
+    """Umbrales ordenados por (ticker, indicador, operador)."""
+
+    def __init__(self, alerts):
+        groups = {}
+        for alert in alerts:
+            key = (alert['ticker'], alert['indicator'])
+            groups.setdefault(key, {}).setdefault(alert['op'], []).append(
+                (alert['threshold'], alert['id']))
+        self.index = {}
+        for key, by_op in groups.items():
+            self.index[key] = {}
+            for op, entries in by_op.items():
+                entries.sort()
+                self.index[key][op] = (np.array([t for t, _ in entries], dtype='float64'),
+                                       [alert_id for _, alert_id in entries])
+
+    def keys(self):
+        return self.index.keys()
+
+    def matching(self, key, value):
+        """Ids de las alertas cuya condición se cumple con `value`."""
+        found = []
+        by_op = self.index.get(key, {})
+        if '<' in by_op:    # value < umbral
+            thresholds, ids = by_op['<']
+            found += ids[np.searchsorted(thresholds, value, side='right'):]
+        if '<=' in by_op:   # value <= umbral
+            thresholds, ids = by_op['<=']
+            found += ids[np.searchsorted(thresholds, value, side='left'):]
+        if '>' in by_op:    # value > umbral
+            thresholds, ids = by_op['>']
+            found += ids[:np.searchsorted(thresholds, value, side='left')]
+        if '>=' in by_op:   # value >= umbral
+            thresholds, ids = by_op['>=']
+            found += ids[:np.searchsorted(thresholds, value, side='right')]
+        return found
+
+
+def latest_values(panel, keys, params=None):
+    """Último valor de cada (ticker, indicador) pedido, calculado sobre todo el panel."""
+    import backtest
+    from panel import PricePanel, last_valid_rows
+
+    # Solo se calculan los indicadores de los tickers que tienen alertas
+    tickers = sorted({t for t, _ in keys if panel.column(t) is not None})
+    if not tickers:
+        return {}, {}
+    cols = [panel.column(t) for t in tickers]
+    panel = PricePanel(panel.dates, tickers, {f: panel[f][:, cols] for f in ('Close', 'Volume')})
+    ind = backtest.compute_indicators(panel, params)
+    # Última fila con cierre de cada ticker (los que no cotizaron hoy usan su última vela)
+    last_row, has_data = last_valid_rows(ind['Close'].to_numpy())
+    columns = np.arange(len(tickers))
+
+    rows = {}
+    for name in {part for _, indicator in keys for part in indicator.split('/')}:
+        rows[name] = ind[name].to_numpy()[last_row, columns]
+
+    values, dates = {}, {}
+    for ticker, indicator in keys:
+        col = panel.column(ticker)
+        if col is None or not has_data[col]:
+            continue
+        parts = indicator.split('/')
+        value = rows[parts[0]][col]
+        if len(parts) == 2:
+            value = value / rows[parts[1]][col] if rows[parts[1]][col] else np.nan
+        if not np.isnan(value):
+            values[(ticker, indicator)] = float(value)
+            dates[(ticker, indicator)] = panel.dates[last_row[col]].strftime('%Y-%m-%d')
+    return values, dates
+
+
+class AlertEngine:
+    """Alertas registradas, su índice y el estado de histéresis, persistidos en JSON."""
+
+    def __init__(self, path=None):
+        self.path = path or config.ALERTS_PATH
+        self._lock = threading.Lock()
+        self.alerts = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.alerts = {a['id']: a for a in json.load(f)}
+        for alert in self.alerts.values():
+            # Las alertas guardadas antes conservaban solo '<' o '>': se toma el
+            # operador completo del texto original
+            match = _SPEC.match(alert['spec'])
+            if match:
+                alert['op'] = match['op']
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = AlertIndex(self.alerts.values())
+        return self._index
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self.alerts.values()), f)
+        os.replace(tmp_path, self.path)
+
+    def add(self, spec):
+        alert = parse_alert(spec)
+        with self._lock:
+            self.alerts[alert['id']] = alert
+            self._index = None
+            self.save()
+        return alert
+
+    def remove(self, alert_id):
+        with self._lock:
+            removed = self.alerts.pop(alert_id, None)
+            self._index = None
+            self.save()
+        return removed
+
+    def tickers(self):
+        return sorted({a['ticker'] for a in self.alerts.values()})
+
+    def evaluate(self, values, dates):
+        """Aplica los valores nuevos: devuelve las alertas armadas cuya condición se
+        cumple y re-arma las que salieron de la banda. Las disparadas siguen armadas
+        hasta que `mark_fired` confirma el aviso."""
+        fired = []
+        band = config.ALERT_HYSTERESIS
+        with self._lock, metrics.span('alerts'):
+            matched = set()
+            rearmed = 0
+            for key in self.index.keys():
+                value = values.get(key)
+                if value is None:
+                    continue
+                for alert_id in self.index.matching(key, value):
+                    matched.add(alert_id)
+                    alert = self.alerts[alert_id]
+                    if alert['armed']:
+                        fired.append({**alert, 'value': value, 'last_fired': dates[key]})
+
+            # Re-armar solo las desarmadas cuyo valor se alejó del umbral más que la banda
+            for alert in self.alerts.values():
+                if alert['armed'] or alert['id'] in matched:
+                    continue
+                value = values.get((alert['ticker'], alert['indicator']))
+                if value is None:
+                    continue
+                margin = abs(alert['threshold']) * band
+                if (alert['op'].startswith('<') and value >= alert['threshold'] + margin) or \
+                        (alert['op'].startswith('>') and value <= alert['threshold'] - margin):
+                    alert['armed'] = True
+                    rearmed += 1
+
+            if rearmed:
+                self.save()
+        return fired
+
+    def mark_fired(self, fired):
+        """Desarma las alertas cuyo aviso se envió y guarda el estado."""
+        if not fired:
+            return
+        with self._lock:
+            for entry in fired:
+                alert = self.alerts.get(entry['id'])
+                if alert is not None:  # Pudo borrarse mientras se enviaba
+                    alert['armed'] = False
+                    alert['last_fired'] = entry['last_fired']
+            metrics.inc('alerts_fired_total', value=len(fired))
+            self.save()
+
+    def check(self, panel, send=None):
+        """Evalúa todas las alertas contra el panel, envía las disparadas por Telegram y
+        devuelve las que se avisaron; las que no se pudieron enviar quedan armadas."""
+        values, dates = latest_values(panel, list(self.index.keys()))
+        fired = self.evaluate(values, dates)
+        if not fired:
+            return []
+        delivered = deliver(fired, send)
+        self.mark_fired(delivered)
+        if len(delivered) < len(fired):
+            print(f"{len(fired) - len(delivered)} alertas no se pudieron enviar; quedan armadas")
+        return delivered
+
+
+def format_alert(alert):
+    return f"🔔 *{alert['ticker']}* · {alert['spec']} (valor {alert['value']:.2f}, {alert['last_fired']})"
+
+
+def deliver(fired, send=None, max_length=3500):
+    """Agrupa las alertas en pocos mensajes (Telegram limita el largo de cada uno) y
+    devuelve las que se enviaron. `send` indica un fallo devolviendo False o levantando
+    una excepción."""
+    if send is None:
+        from notify import send_telegram_message as send
+    batches = [[]]
+    length = 0
+    for alert in fired:
+        line = format_alert(alert) + "\n"
+        if batches[-1] and length + len(line) > max_length:
+            batches.append([])
+            length = 0
+        batches[-1].append((alert, line))
+        length += len(line)
+
+    delivered = []
+    for batch in batches:
+        try:
+            ok = send("".join(line for _, line in batch))
+        except Exception as e:
+            print(f"Error enviando alertas por Telegram: {e}")
+            ok = False
+        if ok is not False:
+            delivered += [alert for alert, _ in batch]
+    return delivered
+
+
+def _panel_for(tickers, period='1y'):
+    """Usa el panel compartido si cubre todos los tickers; si no, el panel cacheado."""
+    import panel as panel_module
+    import shared_panel
+
+    shared = shared_panel.get_shared_panel()
+    if shared is not None and all(shared.column(t) is not None for t in tickers):
+        return shared
+    return panel_module.load_price_panel(tickers, period=period)
+
+
+def watch(engine, interval_seconds=300):
+    """Evalúa las alertas cada vez que cambia el panel (nueva versión o nueva vela)."""
+    last_seen = None
+    while True:
+        prices = _panel_for(engine.tickers())
+        if prices is not None:
+            stamp = (id(prices), prices.dates[-1])
+            if stamp != last_seen:
+                last_seen = stamp
+                fired = engine.check(prices)
+                print(f"{time.strftime('%H:%M:%S')} · {len(engine.alerts)} alertas · {len(fired)} disparadas")
+        time.sleep(interval_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alertas de indicadores con aviso por Telegram")
+    sub = parser.add_subparsers(dest='command', required=True)
+    add = sub.add_parser('add', help="Registrar una alerta, ej: \"RSI(AAPL) < 30\"")
+    add.add_argument('spec', nargs='+')
+    sub.add_parser('list', help="Listar alertas")
+    remove = sub.add_parser('remove', help="Borrar una alerta por id")
+    remove.add_argument('id')
+    sub.add_parser('check', help="Evaluar una vez contra el panel")
+    watch_parser = sub.add_parser('watch', help="Evaluar en cada actualización del panel")
+    watch_parser.add_argument('--interval', type=int, default=300)
+    args = parser.parse_args()
+
+    engine = AlertEngine()
+    if args.command == 'add':
+        for spec in args.spec:
+            alert = engine.add(spec)
+            print(f"{alert['id']}  {alert['ticker']}  {alert['indicator']} {alert['op']} {alert['threshold']:g}")
+    elif args.command == 'list':
+        for alert in engine.alerts.values():
+            state = 'armada' if alert['armed'] else f"disparada {alert['last_fired']}"
+            print(f"{alert['id']}  {alert['spec']:<40} {state}")
+    elif args.command == 'remove':
+        print("Borrada" if engine.remove(args.id) else "No existe esa alerta")
+    elif args.command == 'check':
+        prices = _panel_for(engine.tickers())
+        if prices is None:
+            print("No se pudo obtener el panel de precios.")
+            return 1
+        for alert in engine.check(prices):
+            print(format_alert(alert))
+    else:
+        watch(engine, args.interval)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+import json
+import math
+
+from flask import Response, request
+
+from lazy import lazy_import
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la librería estándar
+    orjson = None
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Utilidades de la API JSON (/api/v1)
+# ------------------------------------------------------------------------------------
+# Serialización rápida con orjson (entiende numpy de forma nativa), selección de
+# campos con ?fields=a,b.c y paginación con ?limit=&offset=. Las rutas están en app.py.
+
+API_PREFIX = '/api/v1'
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def _default(obj):
+    # Tipos que orjson no serializa solo: Timestamp de pandas, escalares numpy sueltos, Series
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def _clean_nan(obj):
+    # json de la librería estándar escribiría NaN (JSON inválido); orjson ya usa null
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return {k: _clean_nan(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_clean_nan(v) for v in obj]
+    return obj
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_clean_nan(obj), default=_default, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def select_fields(data, fields):
+    """Deja solo los campos pedidos; "a.b" selecciona dentro de objetos anidados."""
+    if not fields:
+        return data
+    if isinstance(data, list):
+        return [select_fields(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    nested = {}
+    for field in fields:
+        head, _, rest = field.partition('.')
+        if head in data:
+            nested.setdefault(head, []).append(rest)
+    result = {}
+    for head, rests in nested.items():
+        # "a" pide el campo completo aunque también se haya pedido "a.b"
+        result[head] = data[head] if '' in rests else select_fields(data[head], rests)
+    return result
+
+
+def requested_fields():
+    fields = request.args.get('fields', '')
+    return [f.strip() for f in fields.split(',') if f.strip()]
+
+
+def paginate(items):
+    """Recorta una lista según ?limit y ?offset y agrega los datos de paginación."""
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        raise ApiError("limit y offset deben ser enteros", 400)
+    page = items[offset:offset + limit]
+    return {
+        'items': page,
+        'total': len(items),
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if offset + limit < len(items) else None,
+    }
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(data, status=200, apply_fields=True):
+    """Respuesta JSON con la selección de campos del request aplicada."""
+    fields = requested_fields() if apply_fields else None
+    if fields:
+        if isinstance(data, dict) and 'items' in data:
+            data = {**data, 'items': select_fields(data['items'], fields)}
+        else:
+            data = select_fields(data, fields)
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def error_response(error):
+    return Response(dumps({'error': str(error)}), status=getattr(error, 'status', 500),
+                    mimetype='application/json')
+
+
+def series_row(row):
+    """Convierte la última fila de indicadores (Series) en un dict JSON."""
+    return {str(k): v for k, v in row.items()}
@@ -1,13 +1,40 @@
+import atexit
 import os
-from flask import Flask, render_template, request
-import requests
-import yfinance as yf
-import pandas as pd
-from datetime import datetime
+import threading
+import time
+import concurrent.futures
+import functools
+from flask import Flask, render_template, request, g, Response, make_response
+from datetime import datetime, timedelta
 import config
+import metrics
+import profiling
+import shared_panel
+import resample
+import positions
+import risk
+import correlation
+import api
+import panel
+import backtest
+import market_data
+import scan_plan
+import throttle
+import scan_log
+import checkpoint
+import snapshot
+import fragments
+from lazy import lazy_import
+from notify import send_telegram_message
+
+# Dependencias pesadas: se importan en el primer uso para acelerar el arranque
+requests = lazy_import('requests')
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 
 app = Flask(__name__)
+profiling.init_app(app)  # Solo registra hooks si FINANCEBOT_PROFILE=1
 
 # Funciones existentes (get_technical_analysis, get_fundamental_analysis, generate_recommendation, get_investment_recommendations)
 # ... [Pega aquí todas las funciones que proporcionaste] ...
@@ -15,65 +42,94 @@ app = Flask(__name__)
 # Sección 1: Análisis Técnico Mejorado
 # ------------------------------------------------------------------------------------
 
-def get_technical_analysis(ticker):
+def _shared_history(ticker):
+    """Últimos 6 meses del ticker desde el panel compartido, si hay un cargador activo."""
+    prices = shared_panel.get_shared_panel()
+    if prices is None or prices.column(ticker) is None:
+        return None
+    hist = prices.history(ticker)
+    if hist.empty:
+        return None
+    metrics.inc('cache_hits_total', cache='shared_panel')
+    return hist[hist.index > hist.index[-1] - pd.DateOffset(months=6)].copy()
+
+THROTTLED_MESSAGE = "Yahoo está limitando los pedidos; intentá de nuevo en unos segundos."
+
+def get_technical_analysis(ticker, params=None):
+    p = {**config.INDICATOR_PARAMS, **(params or {})}
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="6mo")
+        with metrics.span('fetch'):
+            hist = _shared_history(ticker)
+            if hist is None:
+                hist = resample.get_bars(ticker, '1d', '6mo')
         
         if hist.empty:
             return None, "No hay datos suficientes para este ticker."
         
+        return compute_technical(hist, p)
+    
+    except throttle.ThrottledError:
+        raise  # El escaneo reintenta el ticker más tarde
+    except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
+        return None, f"Error: {str(e)}"
+
+def compute_technical(hist, p):
+    """Agrega los indicadores a `hist` y devuelve (hist, última fila con los extras)."""
+    with metrics.span('indicators'):
         # Media Móvil Simple (SMA)
-        hist['SMA20'] = hist['Close'].rolling(window=20).mean()
-        hist['SMA50'] = hist['Close'].rolling(window=50).mean()
+        hist['SMA20'] = hist['Close'].rolling(window=p['sma_fast']).mean()
+        hist['SMA50'] = hist['Close'].rolling(window=p['sma_slow']).mean()
         
         # RSI
         delta = hist['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        gain = (delta.where(delta > 0, 0)).rolling(window=p['rsi_window']).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=p['rsi_window']).mean()
         rs = gain / loss
         hist['RSI'] = 100 - (100 / (1 + rs))
         
         # MACD
-        hist['EMA12'] = hist['Close'].ewm(span=12, adjust=False).mean()
-        hist['EMA26'] = hist['Close'].ewm(span=26, adjust=False).mean()
+        hist['EMA12'] = hist['Close'].ewm(span=p['macd_fast'], adjust=False).mean()
+        hist['EMA26'] = hist['Close'].ewm(span=p['macd_slow'], adjust=False).mean()
         hist['MACD'] = hist['EMA12'] - hist['EMA26']
-        hist['Signal'] = hist['MACD'].ewm(span=9, adjust=False).mean()
+        hist['Signal'] = hist['MACD'].ewm(span=p['macd_signal'], adjust=False).mean()
         
         # Bollinger Bands (SMA20 ± 2 desviaciones estándar)
-        hist['STD'] = hist['Close'].rolling(window=20).std()
-        hist['UpperBand'] = hist['SMA20'] + (2 * hist['STD'])
-        hist['LowerBand'] = hist['SMA20'] - (2 * hist['STD'])
+        bb_mid = hist['SMA20'] if p['bb_window'] == p['sma_fast'] else hist['Close'].rolling(window=p['bb_window']).mean()
+        hist['STD'] = hist['Close'].rolling(window=p['bb_window']).std()
+        hist['UpperBand'] = bb_mid + (p['bb_std'] * hist['STD'])
+        hist['LowerBand'] = bb_mid - (p['bb_std'] * hist['STD'])
         latest = hist.iloc[-1].copy()
 
-        # Porcentaje respecto a Bollinger Bands
-        price = latest['Close']
-        upper = latest['UpperBand']
-        lower = latest['LowerBand']
-        latest['BB_Percent'] = ((price - lower) / (upper - lower)) * 100
-        
-        # Volumen promedio (últimos 5 días)
-        latest['AvgVolume'] = hist['Volume'].tail(5).mean()
-        
-        return hist, latest
+    # Porcentaje respecto a Bollinger Bands
+    price = latest['Close']
+    upper = latest['UpperBand']
+    lower = latest['LowerBand']
+    latest['BB_Percent'] = ((price - lower) / (upper - lower)) * 100
     
-    except Exception as e:
-        return None, f"Error: {str(e)}"
+    # Volumen promedio (últimos 5 días)
+    latest['AvgVolume'] = hist['Volume'].tail(p['volume_window']).mean()
+    
+    return hist, latest
+
+def get_fundamentals(ticker):
+    """Ratios fundamentales crudos de Yahoo ('N/A' si no hay dato)."""
+    with metrics.span('fundamentals'):
+        info = market_data.info(ticker)
+    
+    return {
+        'P/E Ratio': info.get('trailingPE', 'N/A'),
+        'P/B Ratio': info.get('priceToBook', 'N/A'),
+        'ROE': info.get('returnOnEquity', 'N/A'),
+        'EPS': info.get('trailingEps', 'N/A'),
+        'Market Cap': info.get('marketCap', 'N/A'),
+        'Dividend Yield': info.get('dividendYield', 'N/A'),
+        'Debt/Equity': info.get('debtToEquity', 'N/A')
+    }
 
 def get_fundamental_analysis(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        
-        fundamental = {
-            'P/E Ratio': info.get('trailingPE', 'N/A'),
-            'P/B Ratio': info.get('priceToBook', 'N/A'),
-            'ROE': info.get('returnOnEquity', 'N/A'),
-            'EPS': info.get('trailingEps', 'N/A'),
-            'Market Cap': info.get('marketCap', 'N/A'),
-            'Dividend Yield': info.get('dividendYield', 'N/A'),
-            'Debt/Equity': info.get('debtToEquity', 'N/A')
-        }
+        fundamental = get_fundamentals(ticker)
         
         # Formatear valores numéricos
         if isinstance(fundamental['Market Cap'], float):
@@ -93,9 +149,20 @@ def get_fundamental_analysis(ticker):
         return "\n".join(analysis)
     
     except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
         return f"Error en análisis fundamental: {str(e)}"
 
-def generate_recommendation(hist, latest_data):
+# Valores rezagados que usa el horizonte temporal: (columna, velas hacia atrás)
+LAGS = (('SMA20', 10), ('SMA50', 20), ('SMA50', 60))
+
+def lagged_values(hist):
+    return {(column, n): float(hist[column].iloc[-n]) for column, n in LAGS}
+
+def generate_recommendation(hist, latest_data, params=None):
+    with metrics.span('scoring'):
+        return _generate_recommendation(lagged_values(hist), latest_data, {**config.INDICATOR_PARAMS, **(params or {})})
+
+def _generate_recommendation(lags, latest_data, p):
     reasons = []
     price = latest_data['Close']
     
@@ -107,10 +174,10 @@ def generate_recommendation(hist, latest_data):
     
      # 2. RSI
     rsi = latest_data['RSI']
-    if rsi < 30:
-        reasons.append(f" RSI: {rsi:.2f} (Sobreventa, <30)")
-    elif rsi > 70:
-        reasons.append(f" RSI: {rsi:.2f} (Sobrecompra, >70)")
+    if rsi < p['rsi_low']:
+        reasons.append(f" RSI: {rsi:.2f} (Sobreventa, <{p['rsi_low']})")
+    elif rsi > p['rsi_high']:
+        reasons.append(f" RSI: {rsi:.2f} (Sobrecompra, >{p['rsi_high']})")
     else:
         reasons.append(f" RSI: {rsi:.2f} (Neutral)")
     
@@ -135,7 +202,7 @@ def generate_recommendation(hist, latest_data):
     # 5. Volumen
     avg_volume = latest_data['AvgVolume']
     latest_volume = latest_data['Volume']
-    if latest_volume > avg_volume * 1.5:
+    if latest_volume > avg_volume * p['volume_spike']:
         reasons.append(f"Volumen actual ({latest_volume:.0f}) > Promedio ({avg_volume:.0f}) → Alta actividad")
     
     # Decisión final
@@ -150,17 +217,17 @@ def generate_recommendation(hist, latest_data):
     time_reasons = []
     
     # Corto plazo (1-4 semanas)
-    if (macd > signal) and (30 < rsi < 70) and (price > sma20):
+    if (macd > signal) and (p['rsi_low'] < rsi < p['rsi_high']) and (price > sma20):
         time_horizon.append("corto plazo")
         time_reasons.append("Momentum positivo con indicadores técnicos favorables para movimientos recientes")
     
     # Mediano plazo (1-6 meses)
-    if (sma20 > sma50) and (hist['SMA20'].iloc[-10] < sma20) and (hist['SMA50'].iloc[-20] < sma50):
+    if (sma20 > sma50) and (lags[('SMA20', 10)] < sma20) and (lags[('SMA50', 20)] < sma50):
         time_horizon.append("mediano plazo") 
         time_reasons.append("Tendencia intermedia positiva con cruce alcista de medias móviles")
     
     # Largo plazo (>6 meses)
-    if (sma50 > hist['SMA50'].iloc[-60]) and (price > sma50):
+    if (sma50 > lags[('SMA50', 60)]) and (price > sma50):
         time_horizon.append("largo plazo")
         time_reasons.append("Tendencia secular alcista y fundamentos sólidos para crecimiento sostenido")
     
@@ -183,16 +250,7 @@ def generate_recommendation(hist, latest_data):
 # ------------------------------------------------------------------------------------
 # Sección 2: Notificaciones por Telegram
 # ------------------------------------------------------------------------------------
-
-def send_telegram_message(message):
-    url = f"https://api.telegram.org/bot{config.TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": config.TELEGRAM_CHAT_ID,
-        "text": message,
-        "parse_mode": "Markdown"
-    }
-    response = requests.post(url, json=payload)
-    return response.ok
+# send_telegram_message está en notify.py (lo usa también alerts.py sin importar la app)
 
 def load_sp500_tickers(csv_path=config.CSV_PATH):
     """Carga los tickers del S&P 500 desde un archivo CSV."""
@@ -208,52 +266,160 @@ def load_sp500_tickers(csv_path=config.CSV_PATH):
         return []
 
 
-def get_investment_recommendations():
+# Escaneo del universo: cada ticker se reduce a un registro de tamaño fijo (última fila
+# + valores rezagados) apenas se calcula y su historial se descarta, así la memoria no
+# depende de cuántos tickers tenga el universo.
+FEATURE_FIELDS = ('Close', 'Volume', 'SMA20', 'SMA50', 'RSI', 'MACD', 'Signal', 'UpperBand', 'LowerBand',
+                  'BB_Percent', 'AvgVolume')
+
+def feature_record(ticker, hist, latest):
+    return {
+        'ticker': ticker,
+        'date': int(panel.session_dates(hist.index[-1:])[0]),
+        'latest': {field: float(latest[field]) for field in FEATURE_FIELDS},
+        'lags': lagged_values(hist),
+    }
+
+# Estado de indicadores por ticker que sobrevive a reinicios (ver checkpoint.py): los
+# tickers al día no se vuelven a pedir y los atrasados se ponen al día en lote
+_checkpoint = checkpoint.Checkpointer(config.INDICATOR_PARAMS)
+atexit.register(_checkpoint.maybe_save, True)
+
+def checkpoint_features(record):
+    # Los rezagos se guardan como columnas "SMA50@60"
+    return {**record['latest'], **{f"{c}@{n}": v for (c, n), v in record['lags'].items()}}
+
+def warm_feature_record(ticker, state, p):
+    """Registro del escaneo desde el estado guardado, sin pedir datos."""
+    if not state.features:
+        hist, latest = compute_technical(state.history(), p)
+        # Las EMAs de las velas guardadas arrancan tarde: MACD y señal salen del estado
+        latest['MACD'], latest['Signal'] = state.macd_signal(p)
+        state.features = checkpoint_features(feature_record(ticker, hist, latest))
+        _checkpoint.mark_dirty()
+    return {
+        'ticker': ticker,
+        'date': state.last_date,
+        'latest': {field: state.features[field] for field in FEATURE_FIELDS},
+        'lags': {(c, n): state.features[f"{c}@{n}"] for c, n in LAGS},
+    }
+
+def scan_features(ticker, states, p):
+    """Registro de un ticker del escaneo: desde el checkpoint si está al día, si no con
+    su historial. Devuelve None si no hay datos. ThrottledError se propaga para que
+    throttle.run_scan reintente el ticker en lugar de darlo por vacío."""
+    metrics.inc('scanned_tickers_total', scan='daily')
+    state = states.get(ticker)
+    if state is not None and state.is_fresh():
+        metrics.inc('cache_hits_total', cache='checkpoint')
+        return warm_feature_record(ticker, state, p)
+    data, latest = get_technical_analysis(ticker)
+    if data is None:
+        return None
+    record = feature_record(ticker, data, latest)
+    state = checkpoint.TickerState.from_history(data, p)
+    state.features = checkpoint_features(record)
+    _checkpoint.put(ticker, state)
+    return record
+
+def iter_short_term_buys(records, params=None):
+    """Filtra los registros con recomendación COMPRAR de corto plazo."""
+    p = {**config.INDICATOR_PARAMS, **(params or {})}
+    for record in records:
+        latest = record['latest']
+        with metrics.span('scoring'):
+            recommendation, reasons, time_analysis = _generate_recommendation(record['lags'], latest, p)
+        
+        # Filtrar solo recomendaciones COMPRAR con horizonte corto plazo
+        if recommendation == "COMPRAR" and "corto plazo" in time_analysis:
+            price = latest['Close']
+            entry_price = latest['LowerBand'] if latest['BB_Percent'] < 30 else latest['SMA20']
+            
+            reasons_filtered = [
+                r for r in reasons 
+                if any(keyword in r for keyword in ['SMA20', 'RSI', 'MACD', 'Bollinger', 'Volumen'])
+            ][:3]  # Mostrar solo las 3 señales más fuertes
+            
+            yield {
+                'ticker': record['ticker'],
+                'price': f"${price:.2f}",
+                'entry': f"${entry_price:.2f}",
+                'target': f"${latest['UpperBand']:.2f}",
+                'reasons': reasons_filtered
+            }
+
+
+def get_investment_recommendations(user=None):
     tickers = load_sp500_tickers()
     
     if not tickers:
         print("No se pudieron cargar los tickers. Usando lista por defecto.")
         tickers = ['NVDA', 'TSLA', 'AAPL', 'AMD', 'META', 'AMZN', 'GOOG', 'MSFT', 'BTC-USD', 'ETH-USD']
-    recommendations = []
+    # Posiciones, watchlist y los más líquidos primero, por si se agota el tiempo
+    tracker = scan_plan.ScanTracker(scan_plan.build_plan(tickers))
+    p = config.INDICATOR_PARAMS
+    states = _checkpoint.get_states()
+    # Los tickers del checkpoint que quedaron atrás se ponen al día con un pedido en lote
+    if checkpoint.catch_up(states, tracker.tickers, p):
+        _checkpoint.mark_dirty()
+
+    records = []
+    def scan(ticker):
+        record = scan_features(ticker, states, p)
+        if record is None:
+            return None
+        records.append(record)
+        return next(iter_short_term_buys([record]), None)
+
+    # Los tickers limitados por Yahoo (429) se reintentan en rondas posteriores en lugar
+    # de contarse como "sin datos"
+    recommendations = throttle.run_scan(
+        tracker.tickers, lambda ticker: tracker.run(scan, ticker),
+        stop=lambda results: len(results) >= 5, deadline=tracker.deadline)[:5]
+    # En paralelo llegan en cualquier orden: se muestran en el orden de prioridad del plan
+    order = {ticker: i for i, ticker in enumerate(tracker.tickers)}
+    recommendations.sort(key=lambda rec: order[rec['ticker']])
     
-    for ticker in tickers:
-        try:
-            data, latest = get_technical_analysis(ticker)
-            if data is None:
-                continue
-                
-            recommendation, reasons, time_analysis = generate_recommendation(data, latest)
-            
-            # Filtrar solo recomendaciones COMPRAR con horizonte corto plazo
-            if recommendation == "COMPRAR" and "corto plazo" in time_analysis:
-                price = latest['Close']
-                entry_price = latest['LowerBand'] if latest['BB_Percent'] < 30 else latest['SMA20']
-                
-                reasons_filtered = [
-                    r for r in reasons 
-                    if any(keyword in r for keyword in ['SMA20', 'RSI', 'MACD', 'Bollinger', 'Volumen'])
-                ][:3]  # Mostrar solo las 3 señales más fuertes
-                
-                recommendations.append({
-                    'ticker': ticker,
-                    'price': f"${price:.2f}",
-                    'entry': f"${entry_price:.2f}",
-                    'target': f"${latest['UpperBand']:.2f}",
-                    'reasons': reasons_filtered
-                })
-                
-                if len(recommendations) >= 5:
-                    break
-                    
-        except Exception as e:
-            continue
+    # Marcar las recomendaciones que son casi un clon de una posición existente
+    try:
+        holdings = get_holdings(user)
+        universe = get_universe_correlation() if holdings else None
+        for rec in recommendations:
+            rec['clones'] = universe.similar(rec['ticker'], holdings) if universe else []
+    except Exception as e:
+        print(f"Error calculando correlaciones: {str(e)}")
     
-    return recommendations
+    scan_plan.record_flagged([rec['ticker'] for rec in recommendations])
+    result = tracker.result(recommendations, target=5)
+    scan_log.append('daily', result, partial=result.partial)
+    _checkpoint.maybe_save()
+    # Los indicadores calculados quedan disponibles para otras herramientas (snapshot.py)
+    try:
+        snapshot.publish_records(list(records), config.INDICATOR_PARAMS)
+    except Exception as e:
+        print(f"Error publicando el snapshot de indicadores: {str(e)}")
+    print(f"Escaneo diario: {scan_plan.describe(result.coverage)}")
+    return result
+
+
+def get_holdings(user=None):
+    return [p.ticker for p in positions.get_book(user).open_positions()]
+
 
+def get_universe_correlation():
+    """Correlaciones del universo de stocks.csv. El estado depende solo del universo, así
+    /recommendations y /portfolio (con posiciones distintas) comparten las mismas sumas
+    sin forzar reconstrucciones; una posición fuera del universo queda sin correlación."""
+    return correlation.get_universe_correlation(load_sp500_tickers())
+
+
+_top_movers = {'updated': 0.0, 'rows': []}
 
 def get_top_movers():
+    """Top movers del screener; se refresca cada BAR_CACHE_TTL_SECONDS['5m'] segundos."""
+    if time.time() - _top_movers['updated'] <= config.BAR_CACHE_TTL_SECONDS['5m']:
+        return _top_movers['rows']
     try:
-        url = "https://query2.finance.yahoo.com/v1/finance/screener"
         params = {
             "count": 10,
             "sortField": "percentchange",
@@ -261,18 +427,22 @@ def get_top_movers():
             "quoteType": "EQUITY"
         }
         
-        response = requests.get(url, params=params)
-        data = response.json()['finance']['result'][0]['quotes']
+        with metrics.span('fetch', source='screener'):
+            data = market_data.screener(params)['finance']['result'][0]['quotes']
         
-        return [{
+        rows = [{
             'symbol': item['symbol'],
             'name': item.get('shortName', item['symbol']),
             'price': round(item['regularMarketPrice'], 2),
             'change': round(item['regularMarketChange'], 2),
             'percent_change': round(item['regularMarketChangePercent'], 2)
         } for item in data]
+        _top_movers.update(updated=time.time(), rows=rows)
+        fragments.bump('movers')
+        return rows
         
     except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
         print(f"Error obteniendo top movers: {str(e)}")
         return []
 
@@ -317,16 +487,19 @@ def get_ai_analysis(ticker, technical_data, fundamental_analysis):
             "temperature": 0.3
         }
         
-        response = requests.post("https://api.deepseek.com/v1/chat/completions", 
-                               headers=headers, 
-                               json=payload)
+        with metrics.span('ai'):
+            response = requests.post("https://api.deepseek.com/v1/chat/completions", 
+                                   headers=headers, 
+                                   json=payload)
         
         if response.status_code == 200:
             return response.json()['choices'][0]['message']['content']
         else:
+            metrics.inc('upstream_errors_total', service='deepseek')
             return "⚠️ Error en el análisis de IA"
             
     except Exception as e:
+        metrics.inc('upstream_errors_total', service='deepseek')
         print(f"Error en IA: {str(e)}")
         return "No se pudo obtener análisis de IA"
     
@@ -335,61 +508,121 @@ def get_ai_analysis(ticker, technical_data, fundamental_analysis):
 # Sección 4: Gestión de Portfolio
 # ------------------------------------------------------------------------------------
 
-PORTFOLIO_CSV = 'db/portfolio.csv'
+def current_user():
+    """Usuario del pedido: ?user=, encabezado X-User o la cookie que deja /portfolio?user=.
 
-def get_portfolio():
+    No hay autenticación: el usuario es solo un nombre que elige el cliente, así que
+    cualquiera que llegue a la app puede leer y cargar operaciones en el portfolio de
+    cualquier usuario. Sirve para separar portfolios en una instalación de confianza
+    (red local, un solo equipo); para exponerla hay que ponerla detrás de un proxy que
+    autentique y fije X-User.
+    """
     try:
-        df = pd.read_csv(PORTFOLIO_CSV, parse_dates=['purchase_date'])
-        return df.to_dict('records')
-    except FileNotFoundError:
-        return []
+        return positions.normalize_user(
+            request.args.get('user') or request.headers.get('X-User') or request.cookies.get('user'))
+    except ValueError as e:
+        raise api.ApiError(str(e), 400)
 
-def save_to_portfolio(data):
-    df = pd.DataFrame([data])
-    df.to_csv(PORTFOLIO_CSV, mode='a', header=not os.path.exists(PORTFOLIO_CSV), index=False)
+def get_portfolio(user=None):
+    return positions.read_ledger(positions.ledger_path(user))
 
-def calculate_portfolio_performance():
-    portfolio = get_portfolio()
-    if not portfolio:
-        return []
+def save_to_portfolio(data, user=None):
+    # Valida (ej: no vender más de lo que hay) y actualiza los agregados FIFO
+    positions.record_trade(data, user)
+    fragments.bump(f"portfolio:{positions.normalize_user(user)}")
+
+def latest_price(ticker):
+    """Último precio desde la caché de velas de 5m (las diarias si no hay intradía)."""
+    bars = resample.get_bars(ticker, '5m', '1d')
+    if bars.empty:
+        bars = resample.get_bars(ticker, '1d', '5d')
+    return bars['Close'].iloc[-1]
+
+# Precios para valuar posiciones, compartidos por todos los usuarios: se piden en lote
+# para los tickers abiertos de todos los portfolios, una vez cada
+# BAR_CACHE_TTL_SECONDS['5m']. Un refresco sirve a todos y cada pedido solo recorre las
+# posiciones de su usuario.
+#
+# Los pedidos a Yahoo se hacen fuera del lock: mientras un hilo refresca, los demás
+# siguen con los precios anteriores. Un ticker sin precio (ej: deslistado) se recuerda
+# durante el mismo TTL para no volver a pedirlo en cada vista.
+_quotes = {'updated': 0.0, 'prices': {}, 'misses': {}, 'refreshing': False}
+_quotes_lock = threading.Lock()
+
+def fetch_quotes(tickers):
+    """Último precio de cada ticker con un solo pedido de velas de 5m; los que no vengan
+    en el lote se buscan en la caché de velas."""
+    prices = {}
+    if not tickers:
+        return prices
+    try:
+        bars = panel.download_panel(list(tickers), period='1d', interval='5m')
+        if bars is not None:
+            close = bars['Close']
+            last, has_data = panel.last_valid_rows(close)
+            prices = {t: float(close[last[i], i]) for i, t in enumerate(bars.tickers) if has_data[i]}
+    except Exception as e:
+        metrics.inc('upstream_errors_total', service='yahoo')
+        print(f"Error descargando precios del portfolio: {str(e)}")
+    for ticker in tickers:
+        if ticker not in prices:
+            try:
+                prices[ticker] = latest_price(ticker)
+            except Exception as e:
+                metrics.inc('upstream_errors_total', service='yahoo')
+                print(f"Error calculando {ticker}: {str(e)}")
+    return prices
+
+def refresh_quotes():
+    """Renueva los precios compartidos si vencieron y avisa a los fragmentos ('quotes')."""
+    with _quotes_lock:
+        if _quotes['refreshing'] or time.time() - _quotes['updated'] <= config.BAR_CACHE_TTL_SECONDS['5m']:
+            return
+        _quotes['refreshing'] = True
+    try:
+        tickers = positions.open_tickers()
+        prices = fetch_quotes(tickers)
+    except Exception as e:
+        print(f"Error actualizando precios del portfolio: {str(e)}")
+        tickers, prices = [], None
+    now = time.time()
+    with _quotes_lock:
+        if prices is not None:
+            _quotes['prices'] = prices
+            _quotes['misses'] = {t: now for t in tickers if t not in prices}
+        _quotes.update(updated=now, refreshing=False)
+    fragments.bump('quotes')
+
+def portfolio_prices(tickers):
+    """Precios actuales de `tickers` desde el refresco compartido; los que no estén (una
+    compra recién cargada) se piden aparte."""
+    refresh_quotes()
+    now = time.time()
+    with _quotes_lock:
+        missing = [t for t in tickers if t not in _quotes['prices']
+                   and now - _quotes['misses'].get(t, 0) > config.BAR_CACHE_TTL_SECONDS['5m']]
+    if missing:
+        found = fetch_quotes(missing)
+        with _quotes_lock:
+            _quotes['prices'].update(found)
+            _quotes['misses'].update({t: now for t in missing if t not in found})
+    with _quotes_lock:
+        prices = _quotes['prices']
+        return {t: prices[t] for t in tickers if t in prices}
+
+def calculate_portfolio_performance(user=None):
+    book = positions.get_book(user)
     
-    # Agrupar por ticker
-    grouped = {}
-    for entry in portfolio:
-        ticker = entry['ticker']
-        if ticker not in grouped:
-            grouped[ticker] = []
-        grouped[ticker].append(entry)
-    
-    # Calcular rendimiento
-    performance = []
-    for ticker, entries in grouped.items():
-        try:
-            stock = yf.Ticker(ticker)
-            current_price = stock.history(period='1d')['Close'].iloc[-1]
-            
-            total_quantity = sum([e['quantity'] for e in entries])
-            total_cost = sum([e['quantity'] * e['purchase_price'] for e in entries])
-            current_value = total_quantity * current_price
-            pnl = current_value - total_cost
-            pnl_percent = (pnl / total_cost) * 100 if total_cost != 0 else 0
-            
-            performance.append({
-                'ticker': ticker,
-                'entries': entries,
-                'total_quantity': total_quantity,
-                'avg_cost': total_cost / total_quantity,
-                'current_price': current_price,
-                'pnl': pnl,
-                'pnl_percent': pnl_percent
-            })
-        except Exception as e:
-            print(f"Error calculando {ticker}: {str(e)}")
+    # Precio actual de cada posición abierta (los lotes ya están agregados en el libro)
+    prices = portfolio_prices([position.ticker for position in book.open_positions()])
     
+    performance = book.valuation(prices)
+    for asset in performance:
+        asset['entries'] = book.positions[asset['ticker']].open_lots()
     return performance
 
 
-def calculate_total_values(performance):
+def calculate_total_values(performance, user=None):
     total_current = sum([p['current_price'] * p['total_quantity'] for p in performance])
     total_cost = sum([p['avg_cost'] * p['total_quantity'] for p in performance])
     total_pnl = total_current - total_cost
@@ -397,11 +630,12 @@ def calculate_total_values(performance):
         'total_current': round(total_current, 2),
         'total_cost': round(total_cost, 2),
         'total_pnl': round(total_pnl, 2),
-        'total_pnl_percent': round((total_pnl / total_cost) * 100, 2) if total_cost != 0 else 0
+        'total_pnl_percent': round((total_pnl / total_cost) * 100, 2) if total_cost != 0 else 0,
+        'total_realized': round(positions.get_book(user).realized_pnl(), 2)
     }
 
-def get_portfolio_history(period='1mo'):
-    portfolio = get_portfolio()
+def get_portfolio_history(period='1mo', user=None):
+    portfolio = get_portfolio(user)
     if not portfolio:
         return []
     
@@ -415,10 +649,11 @@ def get_portfolio_history(period='1mo'):
     history = {}
     for ticker in tickers:
         try:
-            stock = yf.Ticker(ticker)
-            hist = stock.history(start=min_date, period=period)
+            with metrics.span('fetch'):
+                hist = market_data.history(ticker, start=min_date, period=period)
             history[ticker] = hist[['Close']]
         except:
+            metrics.inc('upstream_errors_total', service='yahoo')
             continue
     
     # Calcular valor diario del portfolio
@@ -429,11 +664,15 @@ def get_portfolio_history(period='1mo'):
         daily_value = 0
         for entry in portfolio:
             ticker = entry['ticker']
+            if pd.to_datetime(entry['purchase_date']) > date:
+                continue
+            # Las ventas restan la cantidad vendida desde su fecha
+            sign = -1 if entry.get('side') == 'sell' else 1
             if ticker in history:
                 # Encontrar el precio más cercano a la fecha
                 try:
                     price = history[ticker].loc[:date.strftime('%Y-%m-%d')]['Close'].iloc[-1]
-                    daily_value += entry['quantity'] * price
+                    daily_value += sign * entry['quantity'] * price
                 except:
                     continue
         portfolio_value.append({
@@ -445,47 +684,90 @@ def get_portfolio_history(period='1mo'):
 
 
 
-# Rutas Flask
-@app.route('/')
-def index():
-    # Obtener datos del mercado (Índices principales)
-    indices = ['^GSPC', '^DJI', '^IXIC', '^FTSE', 'CL=F', 'GC=F', 'BTC-USD']
-    
-    market_data = []
+def render_page(template, **context):
+    with metrics.span('render'):
+        return render_template(template, **context)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        metrics.observe('request_duration_seconds', time.perf_counter() - start,
+                        endpoint=request.endpoint or 'unknown')
+    return response
+
+
+# Índices principales de la portada
+MARKET_INDICES = ['^GSPC', '^DJI', '^IXIC', '^FTSE', 'CL=F', 'GC=F', 'BTC-USD']
+
+@functools.lru_cache(maxsize=None)
+def _quote_name(symbol):
+    with metrics.span('fetch'):
+        return market_data.info(symbol).get('shortName', symbol)
+
+def get_market_rows(indices):
+    market_rows = []
     for symbol in indices:
         try:
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period='1d')
-            info = ticker.info
+            data = resample.get_bars(symbol, '5m', '1d')
+            # Variación del día, como la vela diaria: contra la apertura de la primera
+            # vela de 5m de la última sesión, no contra la de la última vela
+            session = data[data.index.normalize() == data.index[-1].normalize()]
+            close = session['Close'].iloc[-1]
+            day_open = session['Open'].iloc[0]
             
-            market_data.append({
+            market_rows.append({
                 'symbol': symbol,
-                'name': info.get('shortName', symbol),
-                'price': round(data['Close'].iloc[-1], 2),
-                'change': round(data['Close'].iloc[-1] - data['Open'].iloc[-1], 2),
-                'percent_change': round(((data['Close'].iloc[-1] - data['Open'].iloc[-1]) / data['Open'].iloc[-1]) * 100, 2)
+                'name': _quote_name(symbol),
+                'price': round(close, 2),
+                'change': round(close - day_open, 2),
+                'percent_change': round(((close - day_open) / day_open) * 100, 2)
             })
         except Exception as e:
+            metrics.inc('upstream_errors_total', service='yahoo')
             print(f"Error obteniendo datos para {symbol}: {str(e)}")
             continue
+    return market_rows
+
+
+# Rutas Flask
+@app.route('/')
+def index():
+    # Solo se renderizan de nuevo las tablas cuyos datos cambiaron (ver fragments.py)
+    resample.refresh(MARKET_INDICES, '5m', '1d')
+    market_html = fragments.cached(
+        'market', fragments.versions(f"prices:{s}" for s in MARKET_INDICES),
+        lambda: render_template('_market.html', market_data=get_market_rows(MARKET_INDICES)))
     
     # Obtener acciones más activas
     top_movers = get_top_movers()
+    movers_html = fragments.cached(
+        'top_movers', (fragments.version('movers'),),
+        lambda: render_template('_top_movers.html', top_movers=top_movers))
     
-    return render_template('index.html', 
-                         market_data=market_data,
-                         top_movers=top_movers)
+    return render_page('index.html', market_html=market_html, movers_html=movers_html)
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
     ticker = request.form['ticker'].upper()
-    data, latest = get_technical_analysis(ticker)
+    try:
+        data, latest = get_technical_analysis(ticker)
+    except throttle.ThrottledError:
+        return render_page('error.html', message=THROTTLED_MESSAGE)
     
     if data is None:
-        return render_template('error.html', message=latest)
+        return render_page('error.html', message=latest)
     
     recommendation, reasons, time_analysis = generate_recommendation(data, latest)
     fundamental = get_fundamental_analysis(ticker)
+    # Confirmación semanal derivada de las mismas velas diarias (sin otra descarga)
+    weekly_trend = resample.weekly_trend(data)
     
     # Nueva sección: Análisis con IA
     ai_analysis = get_ai_analysis(ticker, reasons, fundamental)
@@ -494,7 +776,7 @@ def analyze():
     entry_price = latest['LowerBand'] if latest['BB_Percent'] < 30 else latest['SMA20']
     target_price = latest['UpperBand']
     
-    return render_template('analysis.html',
+    return render_page('analysis.html',
                           ticker=ticker,
                           price=price,
                           recommendation=recommendation,
@@ -502,19 +784,20 @@ def analyze():
                           target_price=target_price,
                           reasons=reasons,
                           time_analysis=time_analysis,
+                          weekly_trend=weekly_trend,
                           fundamental=fundamental,
                           ai_analysis=ai_analysis)
 
 @app.route('/recommendations')
 def recommendations():
-    recs = get_investment_recommendations()
-    return render_template('recommendations.html', recommendations=recs)
+    recs = get_investment_recommendations(current_user())
+    return render_page('recommendations.html', recommendations=recs, coverage=recs.coverage)
 
 # Nueva ruta para datos del gráfico
 @app.route('/sp500-data')
 def sp500_data():
-    ticker = yf.Ticker("^GSPC")
-    hist = ticker.history(period="1mo")
+    with metrics.span('fetch'):
+        hist = market_data.history("^GSPC", period="1mo")
     
     return {
         'dates': hist.index.strftime('%Y-%m-%d').tolist(),
@@ -523,18 +806,21 @@ def sp500_data():
 
 @app.route('/portfolio', methods=['GET', 'POST'])
 def portfolio():
+    user = current_user()
     if request.method == 'POST':
         try:
             ticker = request.form['ticker'].upper()
             quantity = float(request.form['quantity'])
             purchase_date = datetime.strptime(request.form['purchase_date'], '%Y-%m-%d')
             custom_price = request.form.get('custom_price', None)
+            side = 'sell' if request.form.get('side') == 'sell' else 'buy'
             
             if custom_price:  # Si el usuario ingresó precio manual
                 purchase_price = float(custom_price)
             else:  # Lógica original con Yahoo Finance
-                stock = yf.Ticker(ticker)
-                hist = stock.history(start=purchase_date, end=purchase_date + pd.Timedelta(days=1))
+                with metrics.span('fetch'):
+                    hist = market_data.history(ticker, start=purchase_date,
+                                               end=purchase_date + pd.Timedelta(days=1))
                 
                 if hist.empty:
                     raise ValueError("No hay datos para esta fecha")
@@ -544,34 +830,315 @@ def portfolio():
                 'ticker': ticker,
                 'quantity': quantity,
                 'purchase_date': purchase_date.strftime('%Y-%m-%d'),
-                'purchase_price': round(purchase_price, 2)
+                'purchase_price': round(purchase_price, 2),
+                'side': side
             }
             
-            save_to_portfolio(new_entry)
-            perfo=calculate_portfolio_performance()
-            for asset in perfo:
-                for entry in asset['entries']:
-                    if isinstance(entry['purchase_date'], str):
-                        entry['purchase_date'] = datetime.strptime(entry['purchase_date'], '%Y-%m-%d')
-
-        
+            save_to_portfolio(new_entry, user)
              
         except Exception as e:
-            return render_template('portfolio.html', 
-                                performance=calculate_portfolio_performance(),
-                                error=str(e))
+            positions_html, risk_html = portfolio_fragments(user, with_risk=False)
+            return render_page('portfolio.html', positions_html=positions_html, user=user, error=str(e))
    
-    return render_template('portfolio.html',
-                         performance=calculate_portfolio_performance(),
-                         totals=calculate_total_values(calculate_portfolio_performance()))
+    positions_html, risk_html = portfolio_fragments(user)
+    response = make_response(render_page('portfolio.html', positions_html=positions_html,
+                                         risk_html=risk_html, user=user))
+    if request.args.get('user'):
+        response.set_cookie('user', user, samesite='Lax')  # El resto de las páginas lo recuerdan
+    return response
+
+
+def portfolio_fragments(user=None, with_risk=True):
+    """HTML del listado de posiciones y del bloque de riesgo del usuario. Se recalculan
+    solo si cambió su ledger o hubo un refresco de precios (ver fragments.py)."""
+    user = positions.normalize_user(user)
+    # El refresco de precios va antes de armar la clave: si no, una vez cacheado el
+    # fragmento nunca se volvería a valuar y los precios quedarían congelados
+    refresh_quotes()
+    key = (user, fragments.version(f"portfolio:{user}"), positions.ledger_version(user),
+           fragments.version('quotes'))
+    
+    computed = {}
+    def performance():
+        if 'performance' not in computed:
+            computed['performance'] = calculate_portfolio_performance(user)
+        return computed['performance']
+    
+    positions_html = fragments.cached(
+        'portfolio_positions', key,
+        lambda: render_template('_portfolio_positions.html', performance=performance()))
+    risk_html = fragments.cached('portfolio_risk', key, lambda: render_portfolio_risk(performance())) \
+        if with_risk else None
+    return positions_html, risk_html
+
+
+def render_portfolio_risk(performance):
+    try:
+        risk_report = risk.portfolio_risk(performance)
+    except Exception as e:
+        print(f"Error calculando el riesgo del portfolio: {str(e)}")
+        risk_report = None
+    
+    # Posiciones que caen en el mismo cluster del universo (poca diversificación)
+    try:
+        holdings = [p['ticker'] for p in performance]
+        universe = get_universe_correlation() if len(holdings) > 1 else None
+        correlated_groups = universe.groups_for(holdings) if universe else []
+    except Exception as e:
+        print(f"Error calculando correlaciones: {str(e)}")
+        correlated_groups = []
+    return render_template('_portfolio_risk.html', risk=risk_report, correlated_groups=correlated_groups)
+
+
+
+
+@app.route('/history')
+def scan_history():
+    """Cuántas veces salió cada ticker en los escaneos de los últimos ?days días y, con
+    ?ticker=, cada aparición con sus señales (ver scan_log.py)."""
+    ticker = request.args.get('ticker', '').strip().upper() or None
+    days = request.args.get('days', 90, type=int)
+    start = datetime.now() - timedelta(days=days)
+    counts = scan_log.flag_counts(start=start)
+    records = scan_log.query(ticker, start=start, limit=200) if ticker else []
+    return render_page('history.html', counts=counts[:50], records=records, ticker=ticker, days=days)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+# ------------------------------------------------------------------------------------
+# API JSON versionada (ver api.py)
+# ------------------------------------------------------------------------------------
+# ?fields=a,b.c devuelve solo esos campos y evita calcular las partes no pedidas
+# (fundamentales, riesgo). La historia del portfolio se pagina con ?limit=&offset=.
+
+def _wants(name):
+    fields = api.requested_fields()
+    return not fields or any(f.split('.')[0] == name for f in fields)
+
+
+@app.errorhandler(api.ApiError)
+def api_error(error):
+    return api.error_response(error)
+
+
+def _analysis_payload(ticker, data, latest):
+    recommendation, reasons, time_analysis = generate_recommendation(data, latest)
+    return {
+        'ticker': ticker,
+        'date': data.index[-1].strftime('%Y-%m-%d'),
+        'price': latest['Close'],
+        'recommendation': recommendation,
+        'entry_price': latest['LowerBand'] if latest['BB_Percent'] < 30 else latest['SMA20'],
+        'target_price': latest['UpperBand'],
+        'reasons': reasons,
+        'time_analysis': time_analysis,
+        'technical': api.series_row(latest),
+    }
+
+
+@app.route(f'{api.API_PREFIX}/analysis/<ticker>')
+def api_analysis(ticker):
+    ticker = ticker.upper()
+    try:
+        data, latest = get_technical_analysis(ticker)
+    except throttle.ThrottledError:
+        raise api.ApiError(THROTTLED_MESSAGE, 503)
+    if data is None:
+        raise api.ApiError(latest, 404)
+    
+    result = _analysis_payload(ticker, data, latest)
+    if _wants('weekly_trend'):
+        result['weekly_trend'] = resample.weekly_trend(data)
+    if _wants('fundamental'):
+        try:
+            result['fundamental'] = get_fundamentals(ticker)
+        except Exception as e:
+            metrics.inc('upstream_errors_total', service='yahoo')
+            result['fundamental'] = None
+            print(f"Error en análisis fundamental de {ticker}: {str(e)}")
+    # El análisis con IA es una llamada externa lenta: solo si se pide explícitamente
+    if request.args.get('ai') == '1':
+        result['ai_analysis'] = get_ai_analysis(ticker, result['reasons'], get_fundamental_analysis(ticker))
+    return api.json_response(result)
+
+
+def _batch_technical(tickers, p):
+    """Indicadores de muchos tickers con una sola descarga y cálculo matricial.
+
+    Devuelve {ticker: (hist, latest)} o {ticker: (None, mensaje de error)}.
+    """
+    prices = panel.load_price_panel(tickers, period='6mo',
+                                    max_age_hours=config.BAR_CACHE_TTL_SECONDS['1d'] / 3600,
+                                    cache_dir=os.path.join(config.CACHE_DIR, 'batch'),
+                                    max_files=config.BATCH_PANEL_CACHE_MAX_FILES)
+    if prices is None:
+        return {t: (None, "No se pudieron descargar los precios.") for t in tickers}
+    
+    close = prices['Close']
+    valid = ~pd.isna(close)
+    # Un hueco interior (ej: una acción junto a BTC-USD, que cotiza los fines de semana)
+    # cambiaría las medias móviles: esos tickers se calculan aparte con su propia historia
+    after_first = valid.cumsum(axis=0) > 0
+    before_last = valid[::-1].cumsum(axis=0)[::-1] > 0
+    has_gaps = (after_first & before_last & ~valid).any(axis=0)
+    
+    results = {}
+    vector_tickers = []
+    for ticker in tickers:
+        col = prices.column(ticker)
+        if col is None or not valid[:, col].any():
+            results[ticker] = (None, "No hay datos suficientes para este ticker.")
+        elif has_gaps[col]:
+            results[ticker] = compute_technical(prices.history(ticker), p)
+        else:
+            vector_tickers.append(ticker)
+    if not vector_tickers:
+        return results
+    
+    cols = [prices.column(t) for t in vector_tickers]
+    sub = panel.PricePanel(prices.dates, vector_tickers, {f: prices[f][:, cols] for f in prices.fields})
+    ind = backtest.compute_indicators(sub, p)
+    # compute_indicators no devuelve las EMAs ni el desvío: se calculan acá para que cada
+    # fila tenga las mismas columnas, en el mismo orden, que compute_technical
+    close = ind['Close']
+    ind['EMA12'] = close.ewm(span=p['macd_fast'], adjust=False).mean()
+    ind['EMA26'] = close.ewm(span=p['macd_slow'], adjust=False).mean()
+    ind['STD'] = close.rolling(window=p['bb_window']).std()
+    frames = {name: ind[name].to_numpy() for name in
+              ('SMA20', 'SMA50', 'RSI', 'EMA12', 'EMA26', 'MACD', 'Signal', 'STD', 'UpperBand', 'LowerBand',
+               'BB_Percent', 'AvgVolume')}
+    for i, ticker in enumerate(vector_tickers):
+        rows = valid[:, cols[i]]
+        hist = pd.DataFrame({f: np.asarray(sub[f][rows, i], dtype='float64') for f in sub.fields},
+                            index=prices.dates[rows])
+        for name, values in frames.items():
+            if name not in ('BB_Percent', 'AvgVolume'):
+                hist[name] = values[rows, i]
+        latest = hist.iloc[-1].copy()
+        latest['BB_Percent'] = frames['BB_Percent'][rows, i][-1]
+        latest['AvgVolume'] = frames['AvgVolume'][rows, i][-1]
+        results[ticker] = (hist, latest)
+    return results
+
+
+@app.route(f'{api.API_PREFIX}/analysis', methods=['POST'])
+def api_analysis_batch():
+    """Análisis de varios tickers en un pedido: {"tickers": [...], "fundamental": true}."""
+    body = request.get_json(silent=True)
+    body = body if isinstance(body, dict) else {}
+    raw = body.get('tickers') or request.form.get('tickers', '')
+    # "AAPL,MSFT" se acepta igual que ["AAPL", "MSFT"]
+    if isinstance(raw, str):
+        raw = raw.split(',')
+    elif not isinstance(raw, list):
+        raise api.ApiError("'tickers' debe ser una lista o un texto separado por comas", 400)
+    # Los ítems que no son texto se informan en la respuesta como cualquier otro error
+    invalid = [{'ticker': str(t), 'error': "Ticker inválido: debe ser texto"}
+               for t in raw if t is not None and not isinstance(t, str)]
+    tickers = list(dict.fromkeys(t.strip().upper() for t in raw if isinstance(t, str) and t.strip()))
+    if not tickers and not invalid:
+        raise api.ApiError("Indicá al menos un ticker en 'tickers'", 400)
+    if len(tickers) > config.BATCH_MAX_TICKERS:
+        raise api.ApiError(f"Máximo {config.BATCH_MAX_TICKERS} tickers por pedido", 400)
+    with_fundamental = body.get('fundamental', True) and _wants('fundamental')
+    
+    p = config.INDICATOR_PARAMS
+    technical = _batch_technical(tickers, p) if tickers else {}
+    
+    # Los fundamentales son un pedido por ticker a Yahoo: se hacen en paralelo
+    fundamentals = {}
+    if with_fundamental:
+        ok = [t for t in tickers if technical[t][0] is not None]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=config.BATCH_FUNDAMENTAL_WORKERS) as executor:
+            futures = {executor.submit(get_fundamentals, t): t for t in ok}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    fundamentals[futures[future]] = future.result()
+                except Exception as e:
+                    metrics.inc('upstream_errors_total', service='yahoo')
+                    fundamentals[futures[future]] = None
+    
+    fields = api.requested_fields()
+    items = []
+    for ticker in tickers:
+        metrics.inc('scanned_tickers_total', scan='batch')
+        data, latest = technical[ticker]
+        if data is None:
+            items.append({'ticker': ticker, 'error': latest})
+            continue
+        try:
+            result = _analysis_payload(ticker, data, latest)
+            if _wants('weekly_trend'):
+                result['weekly_trend'] = resample.weekly_trend(data)
+            if with_fundamental:
+                result['fundamental'] = fundamentals.get(ticker)
+            items.append({'ticker': ticker, **api.select_fields(result, fields)})
+        except Exception as e:
+            items.append({'ticker': ticker, 'error': f"Error: {str(e)}"})
+    items += invalid
+    
+    return api.json_response({
+        'items': items,
+        'total': len(items),
+        'errors': sum(1 for item in items if 'error' in item),
+    }, apply_fields=False)
+
+
+@app.route(f'{api.API_PREFIX}/recommendations')
+def api_recommendations():
+    recs = get_investment_recommendations(current_user())
+    return api.json_response({**api.paginate(recs), 'coverage': recs.coverage})
+
+
+def _scan_log_range():
+    try:
+        return scan_log.parse_time(request.args.get('start')), scan_log.parse_time(request.args.get('end'))
+    except ValueError:
+        raise api.ApiError("start y end deben ser fechas ISO (ej: 2025-07-01)", 400)
+
+@app.route(f'{api.API_PREFIX}/scans')
+def api_scans():
+    start, end = _scan_log_range()
+    records = scan_log.query(request.args.get('ticker'), start, end, request.args.get('scan'))
+    return api.json_response(api.paginate(records))
+
+
+@app.route(f'{api.API_PREFIX}/scans/counts')
+def api_scan_counts():
+    start, end = _scan_log_range()
+    return api.json_response(api.paginate(scan_log.flag_counts(start, end, request.args.get('scan'))))
+
+
+@app.route(f'{api.API_PREFIX}/portfolio')
+def api_portfolio():
+    user = current_user()
+    performance = calculate_portfolio_performance(user)
+    result = {
+        'user': user,
+        'positions': performance,
+        'totals': calculate_total_values(performance, user),
+    }
+    if request.args.get('risk') == '1':
+        result['risk'] = risk.portfolio_risk(performance)
+    return api.json_response(result)
 
 
+@app.route(f'{api.API_PREFIX}/portfolio/history')
+def api_portfolio_history():
+    period = request.args.get('period', '1mo')
+    return api.json_response(api.paginate(get_portfolio_history(period, current_user())))
 
 
 @app.template_filter('datetimeformat')
 def datetimeformat(value, format='%d %b %Y'):
     if isinstance(value, str):
         value = datetime.strptime(value, '%Y-%m-%d')
+    elif isinstance(value, (int, float)):
+        value = datetime.fromtimestamp(value)
     return value.strftime(format)
 
 
@@ -0,0 +1,271 @@
+import argparse
+import time
+
+import config
+import metrics
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Backtesting vectorizado de las reglas de generate_recommendation
+# ------------------------------------------------------------------------------------
+# Evalúa las mismas reglas que app.generate_recommendation para todas las fechas y
+# todos los tickers a la vez, operando sobre matrices fechas × tickers del panel.
+
+DEFAULT_PARAMS = config.INDICATOR_PARAMS
+
+HORIZONS = (5, 20, 60)
+FILL_WINDOW = 20
+
+
+def _by_valid_rows(close, func):
+    """Aplica `func(select)` a cada grupo de tickers que cotiza en las mismas fechas,
+    solo sobre esas fechas, y devuelve sus frames sobre el eje del panel (NaN donde el
+    ticker no cotiza). `select(frame)` recorta un frame a las filas y columnas del grupo.
+
+    Con cripto en el panel el eje incluye los fines de semana: una media móvil de 20
+    filas de una acción tendría siempre algún sábado sin dato y daría NaN.
+    """
+    from panel import valid_row_groups
+
+    groups = valid_row_groups(close.to_numpy())
+    if len(groups) == 1 and len(groups[0][0]) == len(close):
+        return func(lambda frame: frame)
+    out = {}
+    for rows, cols in groups:
+        part = func(lambda frame: frame.iloc[rows, cols])
+        for name, values in part.items():
+            if name not in out:
+                out[name] = np.full(close.shape, np.nan)
+            out[name][np.ix_(rows, cols)] = np.asarray(values, dtype='float64')
+    return {name: pd.DataFrame(values, index=close.index, columns=close.columns)
+            for name, values in out.items()}
+
+
+def _indicators(close, volume, p):
+    ind = {}
+    ind['SMA20'] = close.rolling(window=p['sma_fast']).mean()
+    ind['SMA50'] = close.rolling(window=p['sma_slow']).mean()
+
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=p['rsi_window']).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=p['rsi_window']).mean()
+    ind['RSI'] = 100 - (100 / (1 + gain / loss))
+
+    ema_fast = close.ewm(span=p['macd_fast'], adjust=False).mean()
+    ema_slow = close.ewm(span=p['macd_slow'], adjust=False).mean()
+    ind['MACD'] = ema_fast - ema_slow
+    ind['Signal'] = ind['MACD'].ewm(span=p['macd_signal'], adjust=False).mean()
+
+    bb_mid = ind['SMA20'] if p['bb_window'] == p['sma_fast'] else close.rolling(window=p['bb_window']).mean()
+    std = close.rolling(window=p['bb_window']).std()
+    ind['UpperBand'] = bb_mid + p['bb_std'] * std
+    ind['LowerBand'] = bb_mid - p['bb_std'] * std
+    ind['BB_Percent'] = (close - ind['LowerBand']) / (ind['UpperBand'] - ind['LowerBand']) * 100
+
+    ind['AvgVolume'] = volume.rolling(window=p['volume_window']).mean()
+    return ind
+
+
+def compute_indicators(panel, params=None):
+    """Calcula SMA, RSI, MACD, Bollinger y volumen promedio para todo el panel, cada
+    ticker sobre sus propias fechas de cotización."""
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    close = panel.frame('Close')
+    volume = panel.frame('Volume')
+
+    with metrics.span('indicators', source='panel'):
+        ind = {'Close': close, 'Volume': volume}
+        ind.update(_by_valid_rows(close, lambda select: _indicators(select(close), select(volume), p)))
+
+    if panel.compact:
+        # Calculado en float64, guardado en float32 (ver "Modo compacto" en panel.py)
+        ind = {name: frame if name == 'Volume' else frame.astype('float32') for name, frame in ind.items()}
+    return ind
+
+
+def evaluate_rules(ind, params=None):
+    """Aplica las reglas de recomendación a cada fecha; devuelve matrices booleanas."""
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    price, sma20, sma50 = ind['Close'], ind['SMA20'], ind['SMA50']
+    rsi, macd, signal = ind['RSI'], ind['MACD'], ind['Signal']
+
+    with metrics.span('scoring', source='panel'):
+        # Los rezagos se cuentan en velas de cada ticker, no en filas del eje de fechas
+        lag = _by_valid_rows(price, lambda select: {
+            'sma20_9': select(sma20).shift(9),
+            'sma50_19': select(sma50).shift(19),
+            'sma50_59': select(sma50).shift(59),
+        })
+        trend_up = sma20 > sma50
+        macd_up = macd > signal
+        # Igual que en generate_recommendation: cada regla suma +1 (alcista) o -1 (bajista)
+        buy_score = np.where(trend_up, 1, -1) + np.where(macd_up, 1, -1)
+
+        rules = {
+            'trend_up': trend_up,
+            'macd_up': macd_up,
+            'oversold': rsi < p['rsi_low'],
+            'overbought': rsi > p['rsi_high'],
+            'volume_spike': ind['Volume'] > ind['AvgVolume'] * p['volume_spike'],
+            'comprar': pd.DataFrame(buy_score > 1, index=price.index, columns=price.columns),
+            'no_comprar': pd.DataFrame(buy_score < -1, index=price.index, columns=price.columns),
+            'corto': macd_up & (rsi > p['rsi_low']) & (rsi < p['rsi_high']) & (price > sma20),
+            'mediano': trend_up & (lag['sma20_9'] < sma20) & (lag['sma50_19'] < sma50),
+            'largo': (sma50 > lag['sma50_59']) & (price > sma50),
+        }
+        # Solo cuentan las fechas donde generate_recommendation tendría datos suficientes
+        valid = lag['sma50_59'].notna() & rsi.notna() & signal.notna() & ind['UpperBand'].notna()
+        rules['valid'] = valid
+        rules['signal'] = rules['comprar'] & rules['corto'] & valid
+
+        rules['entry'] = ind['LowerBand'].where(ind['BB_Percent'] < 30, sma20)
+        rules['target'] = ind['UpperBand']
+    return rules
+
+
+def forward_returns(close, horizons=HORIZONS):
+    return _by_valid_rows(close, lambda select: {h: select(close).shift(-h) / select(close) - 1
+                                                 for h in horizons})
+
+
+def _fill_days(low, high, entry, target, window):
+    n_dates = low.shape[0]
+    entry_day = np.full(low.shape, np.nan)
+    target_day = np.full(low.shape, np.nan)
+    for k in range(1, window + 1):
+        if k >= n_dates:
+            break
+        future_low = np.full(low.shape, np.nan)
+        future_high = np.full(high.shape, np.nan)
+        future_low[:-k] = low[k:]
+        future_high[:-k] = high[k:]
+        with np.errstate(invalid='ignore'):
+            newly_filled = np.isnan(entry_day) & (future_low <= entry)
+            entry_day[newly_filled] = k
+            reached = np.isnan(target_day) & ~np.isnan(entry_day) & (future_high >= target)
+            target_day[reached] = k
+    return {'entry_day': entry_day, 'target_day': target_day}
+
+
+def fill_statistics(panel, entry, target, mask, window=FILL_WINDOW):
+    """Para cada señal, busca si en las próximas `window` ruedas del ticker se llena la
+    entrada (Low <= entrada) y luego se alcanza el objetivo (High >= objetivo)."""
+    close, low, high = panel.frame('Close'), panel.frame('Low'), panel.frame('High')
+    days = _by_valid_rows(close, lambda select: _fill_days(
+        select(low).to_numpy(), select(high).to_numpy(),
+        select(entry).to_numpy(), select(target).to_numpy(), window))
+    entry_day = np.asarray(days['entry_day'], dtype='float64')
+    target_day = np.asarray(days['target_day'], dtype='float64')
+
+    mask = mask.to_numpy()
+    signals = int(mask.sum())
+    filled = mask & ~np.isnan(entry_day)
+    hit = mask & ~np.isnan(target_day)
+    return {
+        'signals': signals,
+        'entry_fill_rate': filled.sum() / signals if signals else float('nan'),
+        'target_hit_rate': hit.sum() / filled.sum() if filled.sum() else float('nan'),
+        'avg_days_to_fill': float(np.nanmean(entry_day[filled])) if filled.any() else float('nan'),
+        'avg_days_to_target': float(np.nanmean(target_day[hit])) if hit.any() else float('nan'),
+    }
+
+
+def _return_stats(returns, mask):
+    values = returns.to_numpy()[mask.to_numpy()]
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {'n': 0, 'hit_rate': float('nan'), 'mean': float('nan'), 'median': float('nan')}
+    return {
+        'n': int(len(values)),
+        'hit_rate': float((values > 0).mean()),
+        'mean': float(values.mean()),
+        'median': float(np.median(values)),
+    }
+
+
+def run_backtest(panel, params=None, horizons=HORIZONS, fill_window=FILL_WINDOW):
+    """Backtest completo de la regla COMPRAR + corto plazo sobre el panel."""
+    start = time.perf_counter()
+    ind = compute_indicators(panel, params)
+    rules = evaluate_rules(ind, params)
+    fwd = forward_returns(ind['Close'], horizons)
+
+    valid = rules['valid']
+    groups = {
+        'COMPRAR + corto plazo': rules['signal'],
+        'COMPRAR': rules['comprar'] & valid,
+        'mediano plazo': rules['mediano'] & valid,
+        'largo plazo': rules['largo'] & valid,
+        'volumen alto': rules['volume_spike'] & valid,
+        'todas las fechas': valid,
+    }
+    returns = {name: {h: _return_stats(fwd[h], mask) for h in horizons}
+               for name, mask in groups.items()}
+
+    signals_per_ticker = rules['signal'].sum()
+    return {
+        'params': {**DEFAULT_PARAMS, **(params or {})},
+        'dates': (panel.dates[0], panel.dates[-1]),
+        'tickers': len(panel.tickers),
+        'horizons': horizons,
+        'returns': returns,
+        'fills': fill_statistics(panel, rules['entry'], rules['target'], rules['signal'], fill_window),
+        'top_tickers': signals_per_ticker[signals_per_ticker > 0].sort_values(ascending=False).head(10).to_dict(),
+        'elapsed': time.perf_counter() - start,
+    }
+
+
+def format_report(report):
+    lines = [
+        f"Backtest {report['dates'][0]:%Y-%m-%d} → {report['dates'][1]:%Y-%m-%d} · "
+        f"{report['tickers']} tickers · {report['elapsed']:.2f}s",
+        "",
+        f"{'Regla':<24}" + ''.join(f"{f'{h}d hit':>10}{f'{h}d prom':>10}" for h in report['horizons']) + f"{'N':>9}",
+    ]
+    for name, by_horizon in report['returns'].items():
+        row = f"{name:<24}"
+        for h in report['horizons']:
+            stats = by_horizon[h]
+            row += f"{stats['hit_rate'] * 100:>9.1f}%{stats['mean'] * 100:>9.2f}%"
+        row += f"{by_horizon[report['horizons'][0]]['n']:>9}"
+        lines.append(row)
+
+    fills = report['fills']
+    lines += [
+        "",
+        f"Señales COMPRAR + corto plazo: {fills['signals']}",
+        f"- Entrada alcanzada: {fills['entry_fill_rate'] * 100:.1f}% (prom. {fills['avg_days_to_fill']:.1f} ruedas)",
+        f"- Objetivo alcanzado tras la entrada: {fills['target_hit_rate'] * 100:.1f}% "
+        f"(prom. {fills['avg_days_to_target']:.1f} ruedas)",
+    ]
+    if report['top_tickers']:
+        lines.append("- Tickers con más señales: " +
+                     ", ".join(f"{t} ({n})" for t, n in report['top_tickers'].items()))
+    return lines
+
+
+def main():
+    import panel as panel_module
+    from app import load_sp500_tickers
+
+    parser = argparse.ArgumentParser(description="Backtest vectorizado de la regla COMPRAR + corto plazo")
+    parser.add_argument('--period', default='5y', help="Historia a evaluar (ej: 2y, 5y, max)")
+    parser.add_argument('--csv', default=config.CSV_PATH, help="CSV con la columna Symbol")
+    parser.add_argument('--refresh', action='store_true', help="Ignorar la caché del panel")
+    args = parser.parse_args()
+
+    tickers = load_sp500_tickers(args.csv)
+    prices = panel_module.load_price_panel(tickers, period=args.period, refresh=args.refresh)
+    if prices is None:
+        print("No se pudo obtener el panel de precios.")
+        return 1
+    for line in format_report(run_backtest(prices)):
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import config
+import metrics
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Checkpoint del estado de indicadores para arrancar en caliente
+# ------------------------------------------------------------------------------------
+# Después de un deploy o una caída, el escaneo diario tenía que volver a bajar 6 meses
+# de velas de cada ticker. Ahora se guarda periódicamente, por ticker:
+#
+# - las últimas TAIL_BARS velas diarias (cierre, volumen y fecha), suficientes para
+#   las medias, el RSI, Bollinger y los valores rezagados del horizonte temporal;
+# - el estado de las EMAs del MACD y de la señal *antes* de la última vela, así una
+#   vela diaria todavía abierta se puede reemplazar sin perder exactitud;
+# - los indicadores y valores rezagados ya calculados (lo que usa el escaneo).
+#
+# El archivo es un .npz columnar con versión de esquema, hash de los parámetros de los
+# indicadores y la fecha de la última vela incluida; si no coinciden se ignora. Al
+# arrancar, los tickers actualizados hace menos de CHECKPOINT_FRESH_SECONDS se usan
+# tal cual y el resto se pone al día con un único pedido en lote de las velas que
+# faltan (ver catch_up). Solo los tickers sin estado pasan por el camino completo.
+#
+# Las fechas se guardan como fechas de sesión sin zona horaria (panel.session_dates):
+# Ticker.history las trae con la zona del mercado y download_panel sin ella, y la vela
+# abierta solo se reemplaza si ambas coinciden. El esquema 1 guardaba la hora UTC.
+
+SCHEMA_VERSION = 2
+TAIL_BARS = 128   # SMA50 con rezago de 60 velas (~110) más margen
+# Períodos de Yahoo para ponerse al día según los días corridos sin velas
+CATCH_UP_PERIODS = ((4, '5d'), (25, '1mo'), (85, '3mo'))
+
+
+def _advance(ema, value, span):
+    # EMA con adjust=False (como pandas): la primera vela la inicializa
+    if np.isnan(ema):
+        return value
+    alpha = 2 / (span + 1)
+    return ema + alpha * (value - ema)
+
+
+class TickerState:
+    """Velas recientes y estado de las EMAs de un ticker."""
+
+    __slots__ = ('dates', 'close', 'volume', 'ema_fast', 'ema_slow', 'signal', 'updated', 'features')
+
+    def __init__(self, dates, close, volume, ema_fast, ema_slow, signal, updated, features=None):
+        self.dates = dates            # int64 ns, ordenadas
+        self.close = close
+        self.volume = volume
+        # Estado de las EMAs antes de la última vela (NaN: todavía sin inicializar)
+        self.ema_fast, self.ema_slow, self.signal = ema_fast, ema_slow, signal
+        self.updated = updated        # momento en que se bajaron velas por última vez
+        self.features = features or {}
+
+    @classmethod
+    def from_history(cls, hist, p, updated=None):
+        """Estado a partir del historial completo (el camino en frío)."""
+        from panel import session_dates
+
+        close = hist['Close'].astype('float64')
+        ema_fast = close.ewm(span=p['macd_fast'], adjust=False).mean()
+        ema_slow = close.ewm(span=p['macd_slow'], adjust=False).mean()
+        signal = (ema_fast - ema_slow).ewm(span=p['macd_signal'], adjust=False).mean()
+        prev = (lambda s: float(s.iloc[-2])) if len(hist) > 1 else (lambda s: float('nan'))
+        tail = hist.iloc[-TAIL_BARS:]
+        return cls(session_dates(tail.index),
+                   tail['Close'].to_numpy('float64'), tail['Volume'].to_numpy('float64'),
+                   prev(ema_fast), prev(ema_slow), prev(signal),
+                   time.time() if updated is None else updated)
+
+    @property
+    def last_date(self):
+        return int(self.dates[-1])
+
+    def macd_signal(self, p):
+        """MACD y señal en la última vela."""
+        ema_fast = _advance(self.ema_fast, self.close[-1], p['macd_fast'])
+        ema_slow = _advance(self.ema_slow, self.close[-1], p['macd_slow'])
+        macd = ema_fast - ema_slow
+        return macd, _advance(self.signal, macd, p['macd_signal'])
+
+    def extend(self, dates, close, volume, p):
+        """Agrega las velas nuevas; una con la misma fecha que la última la reemplaza.
+        `dates` son fechas de sesión (panel.session_dates). Devuelve False si no había
+        ninguna vela desde la última guardada."""
+        keep = dates >= self.last_date
+        dates, close, volume = dates[keep], close[keep], volume[keep]
+        if not len(dates):
+            return False
+        if dates[0] > self.last_date:
+            # Sin solapamiento: la última vela guardada queda cerrada y se recorre también
+            dates = np.concatenate([self.dates[-1:], dates])
+            close = np.concatenate([self.close[-1:], close])
+            volume = np.concatenate([self.volume[-1:], volume])
+        ema_fast, ema_slow, signal = self.ema_fast, self.ema_slow, self.signal
+        for value in close[:-1]:
+            ema_fast = _advance(ema_fast, value, p['macd_fast'])
+            ema_slow = _advance(ema_slow, value, p['macd_slow'])
+            signal = _advance(signal, ema_fast - ema_slow, p['macd_signal'])
+        self.ema_fast, self.ema_slow, self.signal = ema_fast, ema_slow, signal
+        self.dates = np.concatenate([self.dates[:-1], dates])[-TAIL_BARS:]
+        self.close = np.concatenate([self.close[:-1], close])[-TAIL_BARS:]
+        self.volume = np.concatenate([self.volume[:-1], volume])[-TAIL_BARS:]
+        self.features = {}
+        return True
+
+    def history(self):
+        """Las velas guardadas como DataFrame (mismo formato que market_data.history)."""
+        return pd.DataFrame({'Close': self.close, 'Volume': self.volume},
+                            index=pd.to_datetime(self.dates))
+
+    def is_fresh(self, max_age=None):
+        max_age = config.CHECKPOINT_FRESH_SECONDS if max_age is None else max_age
+        return time.time() - self.updated <= max_age
+
+
+def params_key(p):
+    return hashlib.sha1(json.dumps(p, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def save(states, p, path=None):
+    """Guarda los estados en un .npz columnar (escritura atómica)."""
+    path = path or config.CHECKPOINT_PATH
+    tickers = sorted(t for t, s in states.items() if len(s.dates))
+    n, width = len(tickers), TAIL_BARS
+    dates = np.zeros((n, width), dtype='int64')
+    close = np.full((n, width), np.nan)
+    volume = np.full((n, width), np.nan)
+    lengths = np.zeros(n, dtype='int32')
+    scalars = {name: np.full(n, np.nan) for name in ('ema_fast', 'ema_slow', 'signal', 'updated')}
+    feature_names = sorted({name for t in tickers for name in states[t].features})
+    features = np.full((n, len(feature_names)), np.nan)
+    for i, ticker in enumerate(tickers):
+        s = states[ticker]
+        k = len(s.dates)
+        lengths[i] = k
+        dates[i, width - k:], close[i, width - k:], volume[i, width - k:] = s.dates, s.close, s.volume
+        for name in scalars:
+            scalars[name][i] = getattr(s, name)
+        for j, name in enumerate(feature_names):
+            features[i, j] = s.features.get(name, np.nan)
+
+    meta = {
+        'schema': SCHEMA_VERSION,
+        'params': params_key(p),
+        'saved_at': time.time(),
+        'last_bar': int(dates[:, -1].max()) if n else None,
+    }
+    with metrics.span('checkpoint', op='save'):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}.npz"
+        np.savez(tmp_path, meta=np.array(json.dumps(meta)), tickers=np.array(tickers, dtype=str),
+                 dates=dates, close=close, volume=volume, lengths=lengths,
+                 feature_names=np.array(feature_names, dtype=str), features=features, **scalars)
+        os.replace(tmp_path, path)
+    return meta
+
+
+def load(p, path=None):
+    """Estados guardados por ticker; {} si no hay checkpoint o no sirve para estos parámetros."""
+    path = path or config.CHECKPOINT_PATH
+    if not os.path.exists(path):
+        return {}
+    try:
+        with metrics.span('checkpoint', op='load'), np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('schema') != SCHEMA_VERSION or meta.get('params') != params_key(p):
+                print(f"Checkpoint {path} ignorado: esquema o parámetros distintos")
+                return {}
+            arrays = {name: data[name] for name in data.files}
+    except Exception as e:
+        print(f"Error leyendo el checkpoint {path}: {e}")
+        return {}
+
+    states = {}
+    names = [str(name) for name in arrays['feature_names']]
+    for i, ticker in enumerate(arrays['tickers']):
+        k = int(arrays['lengths'][i])
+        features = {name: float(arrays['features'][i, j]) for j, name in enumerate(names)
+                    if not np.isnan(arrays['features'][i, j])}
+        states[str(ticker)] = TickerState(
+            arrays['dates'][i, -k:].copy(), arrays['close'][i, -k:].copy(), arrays['volume'][i, -k:].copy(),
+            float(arrays['ema_fast'][i]), float(arrays['ema_slow'][i]), float(arrays['signal'][i]),
+            float(arrays['updated'][i]), features)
+    metrics.inc('checkpoint_loaded_tickers_total', len(states))
+    return states
+
+
+def _catch_up_period(last_date):
+    days = (pd.Timestamp.now().normalize() - pd.Timestamp(last_date).normalize()).days
+    for max_days, period in CATCH_UP_PERIODS:
+        if days <= max_days:
+            return period
+    return None
+
+
+def catch_up(states, tickers, p):
+    """Pone al día los estados vencidos de `tickers` con un pedido en lote por período.
+
+    Devuelve los tickers actualizados. Los que quedan muy atrás (más que el período más
+    largo) o que no vinieron en la descarga siguen vencidos: el escaneo los recalcula
+    por el camino completo.
+    """
+    import panel
+
+    groups = {}
+    for ticker in tickers:
+        state = states.get(ticker)
+        if state is None or state.is_fresh():
+            continue
+        period = _catch_up_period(state.last_date)
+        if period:
+            groups.setdefault(period, []).append(ticker)
+
+    updated = []
+    for period, group in groups.items():
+        try:
+            bars = panel.download_panel(group, period=period, interval='1d')
+        except Exception as e:
+            metrics.inc('upstream_errors_total', service='yahoo')
+            print(f"Error poniendo al día el checkpoint ({period}): {e}")
+            continue
+        if bars is None:
+            continue
+        now = time.time()
+        dates = panel.session_dates(bars.dates)
+        close, volume = bars['Close'], bars['Volume']
+        for i, ticker in enumerate(bars.tickers):
+            rows = ~np.isnan(close[:, i])
+            if not rows.any():
+                continue
+            state = states[ticker]
+            # Solo queda al día si la descarga llegó hasta su última vela guardada
+            if not state.extend(dates[rows], np.asarray(close[rows, i], dtype='float64'),
+                                np.asarray(volume[rows, i], dtype='float64'), p):
+                continue
+            state.updated = now
+            updated.append(ticker)
+    metrics.inc('checkpoint_caught_up_tickers_total', len(updated))
+    return updated
+
+
+class Checkpointer:
+    """Estados en memoria del proceso, cargados del disco una vez y guardados cada
+    CHECKPOINT_INTERVAL_SECONDS como máximo."""
+
+    def __init__(self, p, path=None):
+        self.p = p
+        self.path = path or config.CHECKPOINT_PATH
+        self.states = None
+        self.dirty = False
+        self.saved_at = time.time()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # un solo guardado a la vez (mismo archivo temporal)
+
+    def get_states(self):
+        with self._lock:
+            if self.states is None:
+                self.states = load(self.p, self.path)
+            return self.states
+
+    def put(self, ticker, state):
+        states = self.get_states()
+        with self._lock:
+            states[ticker] = state
+            self.dirty = True
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def maybe_save(self, force=False):
+        # Se copia el dict bajo el lock (los workers del escaneo siguen llamando a put)
+        # y se graba la copia afuera, sin frenarlos mientras se escribe el archivo
+        with self._lock:
+            if not self.dirty or (not force and time.time() - self.saved_at < config.CHECKPOINT_INTERVAL_SECONDS):
+                return None
+            states = dict(self.states or {})
+            self.dirty = False
+        with self._save_lock:
+            try:
+                meta = save(states, self.p, self.path)
+            except Exception as e:
+                print(f"Error guardando el checkpoint: {e}")
+                self.dirty = True
+                return None
+            self.saved_at = time.time()
+            return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Muestra el contenido de un checkpoint de indicadores")
+    parser.add_argument('--path', default=config.CHECKPOINT_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"No hay checkpoint en {args.path}")
+        return 1
+    with np.load(args.path) as data:
+        meta = json.loads(str(data['meta']))
+        n = len(data['tickers'])
+        stale = int((time.time() - data['updated'] > config.CHECKPOINT_FRESH_SECONDS).sum())
+    last_bar = pd.Timestamp(meta['last_bar']).strftime('%Y-%m-%d') if meta['last_bar'] else '-'
+    print(f"Esquema v{meta['schema']} · parámetros {meta['params']} · {n} tickers "
+          f"({stale} vencidos) · última vela {last_bar} · guardado {time.ctime(meta['saved_at'])}")
+    print(f"{os.path.getsize(args.path) / 2**20:.2f} MB en disco")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
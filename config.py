@@ -3,3 +3,99 @@ TELEGRAM_TOKEN = ""
 TELEGRAM_CHAT_ID = ""        
 CSV_PATH = "DB/stocks.csv"
 DEEPSEEK_API_KEY = ""
+
+# Caché local de paneles de precios (ver panel.py)
+CACHE_DIR = "DB/cache"
+PANEL_MAX_AGE_HOURS = 12
+# Precios en float32 y volumen entero en paneles y caché (~mitad de memoria; ver panel.py)
+PANEL_COMPACT = False
+
+# Parámetros de los indicadores y umbrales de generate_recommendation
+# (se pueden ajustar con los resultados de sweep.py)
+INDICATOR_PARAMS = {
+    'sma_fast': 20,
+    'sma_slow': 50,
+    'rsi_window': 14,
+    'rsi_low': 30,
+    'rsi_high': 70,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'bb_window': 20,
+    'bb_std': 2,
+    'volume_window': 5,
+    'volume_spike': 1.5,
+}
+
+# Panel compartido entre workers (ver shared_panel.py)
+SHARED_PANEL_NAME = "financebot_panel"
+SHARED_PANEL_MAX_AGE_SECONDS = 3600
+
+# Velas base cacheadas en memoria y apertura de sesión para el remuestreo (ver resample.py)
+BAR_CACHE_TTL_SECONDS = {'1d': 3600, '5m': 120}
+BAR_CACHE_MAX_ENTRIES = 64
+SESSION_START = "09:30"
+
+# Fragmentos HTML renderizados, invalidados al cambiar sus datos (ver fragments.py)
+FRAGMENT_CACHE_MAX_ENTRIES = 256
+
+# Ledgers de operaciones: el del usuario por defecto y uno por usuario (ver positions.py).
+# El usuario lo elige el cliente (?user=, X-User) sin autenticación: ver app.current_user
+PORTFOLIO_CSV = "DB/portfolio.csv"
+PORTFOLIO_DIR = "DB/portfolios"
+
+# Correlación del universo: ventana en ruedas y umbrales de cluster y "clon" (ver correlation.py)
+CORRELATION_WINDOW = 252
+CLUSTER_THRESHOLD = 0.7
+CLONE_THRESHOLD = 0.85
+
+# Alertas de indicadores (ver alerts.py); la histéresis es una fracción del umbral
+ALERTS_PATH = "DB/alerts.json"
+ALERT_HYSTERESIS = 0.02
+
+# Análisis en lote de /api/v1/analysis (POST)
+BATCH_MAX_TICKERS = 100
+BATCH_FUNDAMENTAL_WORKERS = 8
+# Cada conjunto de tickers distinto genera un panel en DB/cache/batch; se conservan los
+# más recientes
+BATCH_PANEL_CACHE_MAX_FILES = 32
+
+# Origen de los datos de mercado: live, record o replay (ver market_data.py)
+MARKET_DATA_MODE = "live"
+MARKET_DATA_ARCHIVE = "DB/market_archive"
+
+# Límite de pedidos a Yahoo compartido por todos los escaneos (ver throttle.py)
+YAHOO_RATE_PER_SECOND = 8
+YAHOO_BURST = 16
+YAHOO_INITIAL_CONCURRENCY = 4
+YAHOO_MAX_CONCURRENCY = 32
+YAHOO_MAX_RETRIES = 3
+YAHOO_BACKOFF_SECONDS = 2.0
+SCAN_MAX_WORKERS = 32
+
+# Tiempo máximo de cada escaneo del universo y tickers a priorizar (ver scan_plan.py)
+SCAN_DEADLINE_SECONDS = 120
+WATCHLIST = []
+
+# Registro histórico de resultados de escaneos, un archivo por mes (ver scan_log.py)
+SCAN_LOG_DIR = "DB/scan_log"
+
+# Checkpoint del estado de indicadores para arrancar en caliente (ver checkpoint.py):
+# un ticker actualizado hace menos de FRESH segundos no se vuelve a pedir; se guarda
+# cada INTERVAL segundos como máximo
+CHECKPOINT_PATH = "DB/cache/indicators.ckpt.npz"
+CHECKPOINT_FRESH_SECONDS = 3600
+CHECKPOINT_INTERVAL_SECONDS = 300
+
+# Anomalías intradía sobre el panel de 5m del universo (ver intraday.py): ventana del
+# z-score del volumen en velas, umbrales del candidato y antigüedad máxima de la caché
+INTRADAY_ANOMALY = {
+    'window': 20,
+    'min_periods': 10,
+    'min_volume_z': 3.0,
+    'min_move': 0.02,
+}
+INTRADAY_PANEL_MAX_AGE_SECONDS = 120
+
+# Snapshot columnar de indicadores para otras herramientas (ver snapshot.py)
+SNAPSHOT_DIR = "DB/cache/snapshots"
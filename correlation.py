@@ -0,0 +1,265 @@
+import os
+import threading
+
+import config
+import metrics
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Correlación y clusters del universo con actualización incremental
+# ------------------------------------------------------------------------------------
+# La matriz de correlación se arma a partir de sumas de co-momentos por par (fechas
+# comunes, Σx, Σx², Σxy). Con cada vela nueva se suman sus términos y se restan los
+# de la vela que sale de la ventana: O(k·N²) por actualización en lugar de rehacer
+# todos los pares sobre la ventana completa. El estado se guarda en disco para que
+# un reinicio continúe desde la última fecha procesada.
+#
+# La última vela procesada puede estar incompleta (sesión abierta) o corregirse después,
+# así que se guardan sus retornos tal como se sumaron: en cada actualización se restan
+# esos valores y se vuelve a sumar la vela con los datos actuales. Las velas que salen de
+# la ventana se restan con los valores del panel, que pueden diferir de los sumados si
+# Yahoo ajustó el historial (dividendos, splits); para que ese error no se acumule, el
+# estado se reconstruye desde cero cada `window` velas incrementales.
+
+
+class CoMoments:
+    """Sumas por par sobre las fechas en que ambas columnas tienen dato."""
+
+    def __init__(self, size):
+        self.n = np.zeros((size, size))
+        self.sum_x = np.zeros((size, size))    # Σ x_i sobre las fechas donde j tiene dato
+        self.sum_xx = np.zeros((size, size))
+        self.sum_xy = np.zeros((size, size))
+
+    @classmethod
+    def from_returns(cls, returns):
+        moments = cls(returns.shape[1])
+        moments.add(returns)
+        return moments
+
+    @staticmethod
+    def _terms(rows):
+        valid = ~np.isnan(rows)
+        x = np.where(valid, rows, 0.0)
+        m = valid.astype('float64')
+        return m.T @ m, x.T @ m, (x * x).T @ m, x.T @ x
+
+    def add(self, rows):
+        n, sx, sxx, sxy = self._terms(rows)
+        self.n += n
+        self.sum_x += sx
+        self.sum_xx += sxx
+        self.sum_xy += sxy
+
+    def remove(self, rows):
+        n, sx, sxx, sxy = self._terms(rows)
+        self.n -= n
+        self.sum_x -= sx
+        self.sum_xx -= sxx
+        self.sum_xy -= sxy
+
+    def correlation(self, min_periods=3):
+        n = self.n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = self.sum_xy - self.sum_x * self.sum_x.T / n
+            var = self.sum_xx - self.sum_x ** 2 / n
+            corr = cov / np.sqrt(var * var.T)
+        corr[n < min_periods] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+def _panel_returns(panel):
+    # Cada ticker contra su vela anterior (ver panel.valid_returns), no contra la fila
+    # anterior del eje de fechas, que para una acción puede ser un sábado sin dato
+    from panel import valid_returns
+
+    return panel.dates[1:], valid_returns(panel['Close'])[1:]
+
+
+class UniverseCorrelation:
+    """Correlación de retornos diarios del universo sobre una ventana móvil."""
+
+    def __init__(self, tickers, window):
+        self.tickers = list(tickers)
+        self.window = window
+        self.moments = CoMoments(len(self.tickers))
+        self.start = None       # primera fecha dentro de la ventana
+        self.end = None         # última fecha procesada
+        self.last_row = None    # retornos de `end` tal como se sumaron
+        self.since_rebuild = 0  # velas agregadas desde la última reconstrucción
+        self._corr = None
+        self._index = {t: i for i, t in enumerate(self.tickers)}
+
+    def _rebuild(self, dates, returns):
+        rows = returns[-self.window:]
+        self.moments = CoMoments.from_returns(rows)
+        self.start, self.end = dates[-len(rows)], dates[-1]
+        self.last_row = rows[-1].copy()
+        self.since_rebuild = 0
+
+    def update(self, panel):
+        """Incorpora las velas del panel desde la última procesada (inclusive, por si cambió).
+
+        Si el panel no contiene la ventana actual (tickers distintos, huecos), trae
+        `window - 1` velas nuevas o más (saldrían de la ventana velas que nunca se
+        sumaron) o ya se sumaron `window` velas desde la última reconstrucción, se
+        reconstruye desde cero.
+        Devuelve 'incremental', 'full' o None si no había nada.
+        """
+        dates, returns = _panel_returns(panel)
+        if len(dates) == 0:
+            return None
+        if (panel.tickers != self.tickers or self.end is None or self.last_row is None
+                or self.end not in dates or self.start not in dates
+                or self.since_rebuild >= self.window
+                or len(dates) - 1 - dates.get_loc(self.end) >= self.window - 1):
+            with metrics.span('correlation', mode='full'):
+                self._rebuild(dates, returns)
+            self._corr = None
+            return 'full'
+
+        i_start, i_end = dates.get_loc(self.start), dates.get_loc(self.end)
+        new_rows = returns[i_end + 1:]
+        if not len(new_rows) and np.array_equal(returns[i_end], self.last_row, equal_nan=True):
+            return None
+        with metrics.span('correlation', mode='incremental'):
+            drop = max(0, (i_end + 1 - i_start) + len(new_rows) - self.window)
+            if drop:
+                self.moments.remove(returns[i_start:i_start + drop])
+            # La última vela se reemplaza por su versión actual
+            self.moments.remove(self.last_row[None, :])
+            self.moments.add(returns[i_end:])
+        self.start, self.end = dates[i_start + drop], dates[-1]
+        self.last_row = returns[-1].copy()
+        self.since_rebuild += len(new_rows)
+        self._corr = None
+        return 'incremental'
+
+    @property
+    def corr(self):
+        if self._corr is None:
+            self._corr = self.moments.correlation()
+        return self._corr
+
+    def pair(self, a, b):
+        i, j = self._index.get(a), self._index.get(b)
+        if i is None or j is None:
+            return None
+        value = self.corr[i, j]
+        return None if np.isnan(value) else float(value)
+
+    def similar(self, ticker, candidates, threshold=None):
+        """Candidatos cuya correlación con `ticker` supera el umbral, de mayor a menor."""
+        threshold = config.CLONE_THRESHOLD if threshold is None else threshold
+        i = self._index.get(ticker)
+        if i is None:
+            return []
+        found = []
+        for other in candidates:
+            j = self._index.get(other)
+            if j is None or other == ticker:
+                continue
+            value = self.corr[i, j]
+            if value >= threshold:
+                found.append((other, round(float(value), 2)))
+        return sorted(found, key=lambda item: -item[1])
+
+    def clusters(self, threshold=None):
+        """Clusters por enlace promedio: se unen grupos mientras su correlación
+        promedio supere el umbral. Devuelve listas de tickers (las más grandes primero)."""
+        threshold = config.CLUSTER_THRESHOLD if threshold is None else threshold
+        sim = np.nan_to_num(self.corr, nan=-1.0).copy()
+        np.fill_diagonal(sim, -np.inf)
+        sizes = np.ones(len(self.tickers))
+        members = [[t] for t in self.tickers]
+        active = np.ones(len(self.tickers), dtype=bool)
+
+        with metrics.span('clustering'):
+            while active.sum() > 1:
+                a, b = np.unravel_index(np.argmax(sim), sim.shape)
+                if sim[a, b] < threshold:
+                    break
+                # Similaridad promedio del grupo unido, ponderada por tamaño (UPGMA)
+                merged = (sizes[a] * sim[a] + sizes[b] * sim[b]) / (sizes[a] + sizes[b])
+                sim[a, :] = merged
+                sim[:, a] = merged
+                sim[a, a] = -np.inf
+                sim[b, :] = -np.inf
+                sim[:, b] = -np.inf
+                sizes[a] += sizes[b]
+                members[a] += members[b]
+                active[b] = False
+
+        groups = [sorted(members[i]) for i in np.flatnonzero(active) if len(members[i]) > 1]
+        return sorted(groups, key=len, reverse=True)
+
+    def groups_for(self, tickers, threshold=None):
+        """Clusters que contienen dos o más de los `tickers` dados (ej: las posiciones)."""
+        wanted = set(tickers)
+        groups = []
+        for group in self.clusters(threshold):
+            inside = [t for t in group if t in wanted]
+            if len(inside) > 1:
+                groups.append(inside)
+        return groups
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, tickers=np.array(self.tickers), window=self.window,
+                     start=np.datetime64(self.start, 'ns'), end=np.datetime64(self.end, 'ns'),
+                     n=self.moments.n, sum_x=self.moments.sum_x,
+                     sum_xx=self.moments.sum_xx, sum_xy=self.moments.sum_xy,
+                     last_row=self.last_row, since_rebuild=self.since_rebuild)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            state = cls(data['tickers'].tolist(), int(data['window']))
+            state.start = pd.Timestamp(data['start'][()])
+            state.end = pd.Timestamp(data['end'][()])
+            for name in ('n', 'sum_x', 'sum_xx', 'sum_xy'):
+                setattr(state.moments, name, data[name])
+            # Un estado guardado sin la última vela se reconstruye en la próxima actualización
+            if 'last_row' in data.files:
+                state.last_row = data['last_row']
+                state.since_rebuild = int(data['since_rebuild'])
+        return state
+
+
+_state = None
+_lock = threading.Lock()
+
+
+def _state_path():
+    return os.path.join(config.CACHE_DIR, 'correlation_state.npz')
+
+
+def get_universe_correlation(tickers, period='2y', window=None):
+    """Estado de correlación del universo, actualizado con el panel cacheado."""
+    import panel as panel_module
+
+    global _state
+    window = window or config.CORRELATION_WINDOW
+    tickers = sorted(set(tickers))
+    with _lock:
+        if _state is None and os.path.exists(_state_path()):
+            try:
+                _state = UniverseCorrelation.load(_state_path())
+            except Exception as e:
+                print(f"Error leyendo el estado de correlación: {e}")
+        if _state is None or _state.tickers != tickers or _state.window != window:
+            # El universo cambió: las sumas por par ya no sirven
+            _state = UniverseCorrelation(tickers, window)
+
+        prices = panel_module.load_price_panel(tickers, period=period)
+        if prices is None:
+            return _state if _state.end is not None else None
+        if _state.update(prices):
+            _state.save(_state_path())
+        return _state
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+import config
+import metrics
+
+# ------------------------------------------------------------------------------------
+# Caché de fragmentos HTML invalidada por escritura
+# ------------------------------------------------------------------------------------
+# Cada dato que alimenta una página tiene un número de versión que sube cuando se
+# escribe: 'portfolio:<usuario>' cuando ese usuario registra una operación,
+# 'prices:<ticker>' cuando la caché de velas (resample.py) guarda datos nuevos de ese
+# ticker, 'quotes' cuando se refrescan los precios de los portfolios y 'movers' cuando
+# se refresca el screener. Un fragmento se guarda con las versiones de lo que muestra;
+# mientras no cambien, la página reusa el HTML ya renderizado sin recalcular nada.
+
+_versions = {}
+_lock = threading.Lock()
+
+
+def bump(kind):
+    """Marca que `kind` cambió: los fragmentos que dependen de él dejan de valer."""
+    with _lock:
+        _versions[kind] = _versions.get(kind, 0) + 1
+
+
+def version(kind):
+    return _versions.get(kind, 0)
+
+
+def versions(kinds):
+    return tuple(_versions.get(kind, 0) for kind in kinds)
+
+
+class FragmentCache:
+    """LRU de fragmentos renderizados, por (nombre, clave de versiones)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def put(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = FragmentCache(config.FRAGMENT_CACHE_MAX_ENTRIES)
+
+
+def cached(name, key, render):
+    """HTML del fragmento `name` para la clave `key`; `render()` solo corre si no está."""
+    from markupsafe import Markup
+
+    full_key = (name, key)
+    html = _cache.get(full_key)
+    if html is not None:
+        metrics.inc('cache_hits_total', cache='fragment')
+        return html
+    metrics.inc('cache_misses_total', cache='fragment')
+    html = Markup(render())
+    _cache.put(full_key, html)
+    return html
+
+
+def clear():
+    _cache.clear()
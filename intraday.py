@@ -0,0 +1,167 @@
+import argparse
+import time
+
+import config
+import metrics
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# ------------------------------------------------------------------------------------
+# Detección de anomalías intradía sobre el panel de velas de 5m de todo el universo
+# ------------------------------------------------------------------------------------
+# En lugar de descargar y recorrer un DataFrame por ticker, se trabaja sobre las
+# matrices (velas × tickers) del panel de 5m y todo se calcula con operaciones de
+# arrays:
+#
+# - z-score del volumen de cada vela contra las `window` velas anteriores (sumas
+#   acumuladas, sin bucles; las velas faltantes no cuentan);
+# - movimiento acumulado desde la apertura de la sesión;
+# - desvío del precio contra el VWAP de la sesión.
+#
+# Los candidatos son los tickers cuya última vela tiene volumen anómalo y que suben
+# desde la apertura por encima del VWAP; se ordenan por z-score × movimiento. Con el
+# panel en caché, el barrido del universo completo tarda milisegundos.
+
+
+def _params(params=None):
+    return {**config.INTRADAY_ANOMALY, **(params or {})}
+
+
+def rolling_volume_zscore(volume, window, min_periods):
+    """z-score de cada vela contra las `window` anteriores (matriz velas × tickers)."""
+    valid = ~np.isnan(volume)
+    v = np.where(valid, volume, 0.0)
+    # Sumas acumuladas con una fila de ceros al principio: la ventana [t-window, t) sale
+    # de restar dos filas
+    zeros = np.zeros((1, volume.shape[1]))
+    cum = np.concatenate([zeros, np.cumsum(v, axis=0)])
+    cum_sq = np.concatenate([zeros, np.cumsum(v * v, axis=0)])
+    cum_n = np.concatenate([zeros, np.cumsum(valid, axis=0, dtype='float64')])
+    end = np.arange(len(volume))
+    start = np.maximum(end - window, 0)
+    total, total_sq, count = cum[end] - cum[start], cum_sq[end] - cum_sq[start], cum_n[end] - cum_n[start]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+        var = (total_sq - total * mean) / (count - 1)
+        z = (volume - mean) / np.sqrt(var)
+    z[(count < min_periods) | ~(var > 0)] = np.nan
+    return z
+
+
+def session_rows(dates):
+    """Filas de la última sesión del panel."""
+    days = dates.normalize()
+    return np.flatnonzero(days == days[-1])
+
+
+def compute_features(panel, params=None):
+    """Métricas de la última vela de cada ticker en la sesión actual."""
+    from panel import last_valid_rows
+
+    p = _params(params)
+    with metrics.span('indicators', source='intraday'):
+        close, volume = panel['Close'], panel['Volume']
+        rows = session_rows(panel.dates)
+        # El z-score solo hace falta en la sesión: alcanza con las `window` velas previas
+        start = max(rows[0] - p['window'], 0)
+        z = rolling_volume_zscore(np.asarray(volume[start:], dtype='float64'), p['window'], p['min_periods'])
+        z = z[rows - start]
+
+        s_close = np.asarray(close[rows], dtype='float64')
+        s_open = np.asarray(panel['Open'][rows], dtype='float64')
+        s_high = np.asarray(panel['High'][rows], dtype='float64')
+        s_low = np.asarray(panel['Low'][rows], dtype='float64')
+        s_volume = np.asarray(volume[rows], dtype='float64')
+
+        last, has_data = last_valid_rows(s_close)
+        first = np.argmax(~np.isnan(s_close), axis=0)
+        cols = np.arange(s_close.shape[1])
+
+        # VWAP de la sesión hasta la última vela de cada ticker
+        valid = ~np.isnan(s_close) & ~np.isnan(s_volume)
+        typical = np.where(valid, (s_high + s_low + s_close) / 3, 0.0)
+        weights = np.where(valid, s_volume, 0.0)
+        cum_pv = np.cumsum(typical * weights, axis=0)[last, cols]
+        cum_v = np.cumsum(weights, axis=0)[last, cols]
+
+        price = s_close[last, cols]
+        previous = s_close[np.maximum(last - 1, 0), cols]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap = cum_pv / cum_v
+            features = {
+                'price': price,
+                'volume': s_volume[last, cols],
+                'volume_z': z[last, cols],
+                'volume_ratio': s_volume[last, cols] / (weights.sum(axis=0) / valid.sum(axis=0)),
+                'move': price / s_open[first, cols] - 1,
+                'vwap': vwap,
+                'vwap_dev': price / vwap - 1,
+                'bar_change': np.where(last > first, price / previous - 1, np.nan),
+            }
+        for values in features.values():
+            values[~has_data] = np.nan
+        features['time'] = panel.dates[rows][last]
+        features['has_data'] = has_data
+    return features
+
+
+def rank_anomalies(panel, params=None, limit=None):
+    """Candidatos ordenados por z-score del volumen × movimiento desde la apertura."""
+    p = _params(params)
+    f = compute_features(panel, p)
+    with metrics.span('scoring', source='intraday'):
+        with np.errstate(invalid='ignore'):
+            mask = (f['volume_z'] >= p['min_volume_z']) & (f['move'] >= p['min_move']) & (f['vwap_dev'] > 0)
+        score = np.where(mask, f['volume_z'] * f['move'], -np.inf)
+        order = np.argsort(-score, kind='stable')[:int(mask.sum())]
+        if limit:
+            order = order[:limit]
+
+    return [{
+        'ticker': panel.tickers[i],
+        'price': float(f['price'][i]),
+        'pct_change': float(f['bar_change'][i] * 100),
+        'move_pct': float(f['move'][i] * 100),
+        'volume_z': float(f['volume_z'][i]),
+        'volume_ratio': float(f['volume_ratio'][i]),
+        'vwap_dev_pct': float(f['vwap_dev'][i] * 100),
+        'score': float(score[i]),
+        'timestamp': f['time'][i].strftime("%H:%M"),
+    } for i in order]
+
+
+def load_intraday_panel(tickers, max_age_seconds=None):
+    """Velas de 5m de los últimos días de todo el universo, en un solo pedido y cacheadas."""
+    import panel as panel_module
+
+    max_age_seconds = config.INTRADAY_PANEL_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+    return panel_module.load_price_panel(list(tickers), period='5d', interval='5m',
+                                         max_age_hours=max_age_seconds / 3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anomalías intradía del universo (volumen, movimiento, VWAP)")
+    parser.add_argument('--csv', default=config.CSV_PATH)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    import pandas as pd
+    tickers = pd.read_csv(args.csv)['Symbol'].tolist()
+    prices = load_intraday_panel(tickers)
+    if prices is None:
+        print("No se pudo obtener el panel intradía.")
+        return 1
+    start = time.perf_counter()
+    candidates = rank_anomalies(prices, limit=args.limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{len(prices.tickers)} tickers · {len(prices)} velas · {elapsed:.1f} ms")
+    for c in candidates:
+        print(f"{c['ticker']:<8} {c['timestamp']}  ${c['price']:.2f}  desde apertura {c['move_pct']:+.2f}%  "
+              f"vol z {c['volume_z']:.1f}  VWAP {c['vwap_dev_pct']:+.2f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,39 @@
+import importlib
+import threading
+
+# ------------------------------------------------------------------------------------
+# Importación diferida de dependencias pesadas (pandas, yfinance, requests...)
+# ------------------------------------------------------------------------------------
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """Proxy que importa el módulo real recién en el primer acceso a un atributo."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        estado = "cargado" if self._module is not None else "sin cargar"
+        return f"<LazyModule {self._name} ({estado})>"
+
+
+def lazy_import(name):
+    """Devuelve un proxy del módulo `name` que se importa en el primer uso."""
+    return LazyModule(name)
+
+
+def is_loaded(proxy):
+    return proxy._module is not None
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+import config
+import metrics
+import throttle
+from lazy import lazy_import
+
+yf = lazy_import('yfinance')
+requests = lazy_import('requests')
+
+# ------------------------------------------------------------------------------------
+# Proveedor de datos de mercado con modos live / record / replay
+# ------------------------------------------------------------------------------------
+# Todas las consultas a Yahoo (historial, info, descargas en bloque y screener) pasan
+# por acá. En modo "record" cada respuesta se guarda comprimida en un archivo local;
+# en modo "replay" se sirven desde ese archivo sin red, con una latencia simulada
+# opcional. Así las mediciones de rendimiento son reproducibles en cualquier máquina.
+#
+# El modo se elige con FINANCEBOT_MARKET_DATA (live, record, replay) o con
+# config.MARKET_DATA_MODE; el archivo con FINANCEBOT_MARKET_ARCHIVE y la latencia
+# (en milisegundos) con FINANCEBOT_REPLAY_LATENCY_MS.
+#
+# Los pedidos reales (live y record) pasan por throttle.call: límite global de pedidos
+# por segundo, concurrencia adaptativa y reintentos ante 429. El replay no lo usa.
+#
+# gzip, pickle, hashlib y json solo hacen falta para grabar y reproducir: se importan
+# dentro de esas funciones para que el modo live no los cargue al arrancar.
+
+MODES = ('live', 'record', 'replay')
+SCREENER_URL = "https://query2.finance.yahoo.com/v1/finance/screener"
+
+MODE = os.environ.get('FINANCEBOT_MARKET_DATA', config.MARKET_DATA_MODE)
+ARCHIVE_DIR = os.environ.get('FINANCEBOT_MARKET_ARCHIVE', config.MARKET_DATA_ARCHIVE)
+REPLAY_LATENCY_MS = float(os.environ.get('FINANCEBOT_REPLAY_LATENCY_MS', 0))
+
+_lock = threading.Lock()
+
+
+class ReplayMissError(LookupError):
+    """El modo replay no tiene grabada la consulta pedida."""
+
+
+def set_mode(mode, archive_dir=None, latency_ms=None):
+    global MODE, ARCHIVE_DIR, REPLAY_LATENCY_MS
+    if mode not in MODES:
+        raise ValueError(f"Modo desconocido: {mode} (opciones: {', '.join(MODES)})")
+    MODE = mode
+    ARCHIVE_DIR = archive_dir or ARCHIVE_DIR
+    REPLAY_LATENCY_MS = REPLAY_LATENCY_MS if latency_ms is None else latency_ms
+
+
+def _key(kind, args):
+    import hashlib
+    import json
+
+    canonical = json.dumps([kind, args], sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:20], canonical
+
+
+def _path(kind, key):
+    return os.path.join(ARCHIVE_DIR, kind, f"{key}.pkl.gz")
+
+
+def _store(kind, key, canonical, value):
+    import gzip
+    import json
+    import pickle
+
+    path = _path(kind, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    # Índice legible de lo grabado (una línea por consulta nueva)
+    with _lock, open(os.path.join(ARCHIVE_DIR, 'index.jsonl'), 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'kind': kind, 'key': key, 'args': canonical, 'recorded_at': time.time()}) + "\n")
+
+
+def _load(kind, key, canonical):
+    import gzip
+    import pickle
+
+    path = _path(kind, key)
+    if not os.path.exists(path):
+        metrics.inc('cache_misses_total', cache='replay')
+        raise ReplayMissError(f"Sin grabación para {canonical} en {ARCHIVE_DIR}")
+    if REPLAY_LATENCY_MS:
+        time.sleep(REPLAY_LATENCY_MS / 1000)
+    metrics.inc('cache_hits_total', cache='replay')
+    with gzip.open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _fetch(kind, args, live):
+    """Aplica el modo actual a una consulta: en vivo, grabándola o reproduciéndola."""
+    if MODE == 'live':
+        return throttle.call(live)
+    key, canonical = _key(kind, args)
+    if MODE == 'replay':
+        return _load(kind, key, canonical)
+    value = throttle.call(live)
+    _store(kind, key, canonical, value)
+    return value
+
+
+def history(ticker, **kwargs):
+    """Equivalente a yf.Ticker(ticker).history(**kwargs)."""
+    return _fetch('history', {'ticker': ticker, **kwargs},
+                  lambda: yf.Ticker(ticker).history(**kwargs))
+
+
+def info(ticker):
+    """Equivalente a yf.Ticker(ticker).info."""
+    return _fetch('info', {'ticker': ticker}, lambda: dict(yf.Ticker(ticker).info))
+
+
+def download(tickers, **kwargs):
+    """Equivalente a yf.download(tickers, **kwargs)."""
+    return _fetch('download', {'tickers': list(tickers), **kwargs},
+                  lambda: yf.download(tickers, **kwargs))
+
+
+def screener(params, timeout=None):
+    """JSON del screener de Yahoo (acciones con mayor variación, etc.)."""
+    def live():
+        response = requests.get(SCREENER_URL, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    return _fetch('screener', {'params': params}, live)
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ------------------------------------------------------------------------------------
+# Métricas de rendimiento: spans por etapa, histogramas y contadores
+# ------------------------------------------------------------------------------------
+
+# Límites de los buckets de los histogramas (segundos)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = 'financebot'
+
+HELP = {
+    'stage_duration_seconds': 'Duración de cada etapa (fetch, indicators, scoring, fundamentals, ai, telegram, render)',
+    'request_duration_seconds': 'Duración total de cada request HTTP por endpoint',
+    'cache_hits_total': 'Aciertos de caché',
+    'cache_misses_total': 'Fallos de caché',
+    'upstream_errors_total': 'Errores de servicios externos (Yahoo, Telegram, DeepSeek)',
+    'scanned_tickers_total': 'Tickers evaluados por los escaneos del universo',
+    'alerts_fired_total': 'Alertas de indicadores disparadas',
+    'yahoo_throttled_total': 'Pedidos a Yahoo rechazados por límite de tráfico (429)',
+    'fetch_concurrency_decreases_total': 'Reducciones de la concurrencia adaptativa hacia Yahoo',
+    'checkpoint_loaded_tickers_total': 'Tickers con estado de indicadores cargado del checkpoint',
+    'checkpoint_caught_up_tickers_total': 'Tickers del checkpoint puestos al día con velas nuevas',
+    'resident_memory_bytes': 'Memoria residente (RSS) actual del proceso',
+    'peak_resident_memory_bytes': 'Pico de memoria residente (RSS) del proceso',
+}
+
+_lock = threading.Lock()
+_histograms = {}   # (nombre, labels) -> [conteos por bucket, suma, total]
+_counters = {}     # (nombre, labels) -> valor
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    """Registra una observación en el histograma `name`."""
+    key = _key(name, labels)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                entry[0][i] += 1
+        entry[1] += value
+        entry[2] += 1
+
+
+def inc(name, value=1, **labels):
+    """Incrementa el contador `name`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def span(stage, **labels):
+    """Mide la duración del bloque y la registra como etapa `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage_duration_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+
+def rss_bytes():
+    """Memoria residente actual del proceso (Linux); None si no se puede leer."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """Pico de memoria residente del proceso desde que arrancó."""
+    try:
+        import resource
+        # ru_maxrss está en KB en Linux (en bytes en macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(f'{k}="{str(v)}"' for k, v in pairs)
+    return '{' + body + '}'
+
+
+def render_prometheus():
+    """Devuelve todas las métricas en formato de texto de Prometheus."""
+    with _lock:
+        histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    declared = set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# HELP {PREFIX}_{name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        declare(name, 'histogram')
+        for bound, bucket_count in zip(BUCKETS, buckets):
+            lines.append(f"{PREFIX}_{name}_bucket{_format_labels(labels, [('le', bound)])} {bucket_count}")
+        lines.append(f"{PREFIX}_{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{PREFIX}_{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{PREFIX}_{name}_count{_format_labels(labels)} {count}")
+
+    for (name, labels), value in sorted(counters.items()):
+        declare(name, 'counter')
+        lines.append(f"{PREFIX}_{name}{_format_labels(labels)} {value}")
+
+    for name, value in (('resident_memory_bytes', rss_bytes()), ('peak_resident_memory_bytes', peak_rss_bytes())):
+        if value is not None:
+            declare(name, 'gauge')
+            lines.append(f"{PREFIX}_{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def summary_lines():
+    """Resumen legible de las mismas métricas, pensado para las CLIs."""
+    with _lock:
+        histograms = {k: (v[1], v[2]) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    if histograms:
+        lines.append(f"{'Etapa':<32} {'N':>6} {'Total (s)':>10} {'Prom. (ms)':>11}")
+        for (name, labels), (total, count) in sorted(histograms.items(), key=lambda x: -x[1][0]):
+            label = ','.join(f"{v}" for _, v in labels) or name
+            if name != 'stage_duration_seconds':
+                label = f"{name.split('_')[0]}:{label}"
+            lines.append(f"{label:<32} {count:>6} {total:>10.3f} {total / count * 1000:>11.1f}")
+    for (name, labels), value in sorted(counters.items()):
+        label = ','.join(f"{k}={v}" for k, v in labels)
+        lines.append(f"{name}{' (' + label + ')' if label else ''}: {value}")
+    return lines or ["Sin métricas registradas todavía."]
+
+
+def print_summary():
+    print("\n⏱️ Métricas de rendimiento")
+    for line in summary_lines():
+        print(line)
@@ -0,0 +1,25 @@
+import config
+import metrics
+from lazy import lazy_import
+
+requests = lazy_import('requests')
+
+# ------------------------------------------------------------------------------------
+# Envío de mensajes por Telegram
+# ------------------------------------------------------------------------------------
+# Módulo aparte para que quien solo necesita avisar (ej: alerts.py desde un proceso
+# de fondo) no tenga que importar la app Flask entera.
+
+
+def send_telegram_message(message):
+    url = f"https://api.telegram.org/bot{config.TELEGRAM_TOKEN}/sendMessage"
+    payload = {
+        "chat_id": config.TELEGRAM_CHAT_ID,
+        "text": message,
+        "parse_mode": "Markdown"
+    }
+    with metrics.span('telegram'):
+        response = requests.post(url, json=payload)
+    if not response.ok:
+        metrics.inc('upstream_errors_total', service='telegram')
+    return response.ok
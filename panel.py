@@ -0,0 +1,302 @@
+import hashlib
+import os
+import time
+
+import config
+import market_data
+import metrics
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Panel de precios: matrices fechas × tickers cacheadas en disco
+# ------------------------------------------------------------------------------------
+
+FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# ------------------------------------------------------------------------------------
+# Modo compacto (config.PANEL_COMPACT)
+# ------------------------------------------------------------------------------------
+# Precios en float32, volumen como entero sin signo (uint32, o uint64 si algún valor no
+# entra) y, en disco, el eje de fechas como desplazamientos int32 desde la primera
+# fecha. Memoria y disco quedan en ~la mitad que con float64.
+#
+# Garantías de precisión:
+# - float32 tiene 24 bits de mantisa: cada precio queda con error relativo ≤ 6e-8
+#   (≤ 0,0003 USD en una acción de 5000 USD, por debajo del centavo que da Yahoo).
+# - Los indicadores se calculan siempre en float64 (frame() decodifica a float64) y
+#   solo se guardan en float32: SMA, bandas y volumen promedio con error relativo
+#   ~1e-7. RSI y BB% dependen de diferencias entre precios y pierden algo más, del
+#   orden de 1e-3 puntos (en escala 0-100).
+# - El volumen se redondea a entero; un hueco se guarda como el máximo del tipo y se
+#   lee como NaN.
+# - Una regla solo puede cambiar si los valores comparados están a esa distancia (ej.
+#   SMA20 casi igual a SMA50, o RSI en 30,0001): en 5 años × 500 tickers cambian unas
+#   pocas decisiones históricas y ninguna de la última fecha. tools/compact_check.py
+#   compara ambos caminos y falla si se rompe alguna de estas garantías.
+
+PRICE_DTYPE = 'float32'
+
+
+def _encode_volume(values):
+    values = np.asarray(values, dtype='float64')
+    missing = np.isnan(values)
+    dtype = np.uint32 if np.nanmax(values, initial=0) < np.iinfo(np.uint32).max else np.uint64
+    encoded = np.rint(np.where(missing, 0, values)).astype(dtype)
+    encoded[missing] = np.iinfo(dtype).max
+    return encoded
+
+
+def _decode_volume(values):
+    decoded = values.astype('float64')
+    decoded[values == np.iinfo(values.dtype).max] = np.nan
+    return decoded
+
+
+class PricePanel:
+    """Precios OHLCV de muchos tickers sobre un eje de fechas común.
+
+    Cada campo es una matriz (fechas, tickers); los huecos (ticker sin cotización
+    ese día) son NaN.
+    """
+
+    def __init__(self, dates, tickers, fields):
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = list(tickers)
+        self.fields = fields
+
+    def __getitem__(self, field):
+        """Matriz del campo. En modo compacto el volumen se decodifica a float64 con NaN
+        en los huecos; los precios se devuelven en float32."""
+        values = self.fields[field]
+        if values.dtype.kind == 'u':
+            return _decode_volume(values)
+        return values
+
+    @property
+    def compact(self):
+        return self.fields['Close'].dtype == np.dtype(PRICE_DTYPE)
+
+    def to_compact(self):
+        """Copia del panel en modo compacto (ver arriba las garantías de precisión)."""
+        if self.compact:
+            return self
+        fields = {f: _encode_volume(v) if f == 'Volume' else v.astype(PRICE_DTYPE)
+                  for f, v in self.fields.items()}
+        return PricePanel(self.dates, self.tickers, fields)
+
+    def to_float64(self):
+        if not self.compact:
+            return self
+        return PricePanel(self.dates, self.tickers,
+                          {f: np.asarray(self[f], dtype='float64') for f in self.fields})
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.tickers)
+
+    def frame(self, field):
+        """Devuelve un campo como DataFrame (índice fechas, columnas tickers) en float64."""
+        values = np.asarray(self[field], dtype='float64')
+        return pd.DataFrame(values, index=self.dates, columns=self.tickers, copy=False)
+
+    def column(self, ticker):
+        """Posición del ticker en el eje de columnas, o None si no está en el panel."""
+        if getattr(self, '_columns', None) is None:
+            self._columns = {t: i for i, t in enumerate(self.tickers)}
+        return self._columns.get(ticker)
+
+    def history(self, ticker):
+        """Reconstruye el DataFrame OHLCV de un ticker, como `stock.history()`."""
+        col = self.column(ticker)
+        hist = pd.DataFrame({f: np.asarray(self.fields[f][:, col], dtype='float64') for f in self.fields},
+                            index=self.dates)
+        if 'Volume' in self.fields and self.fields['Volume'].dtype.kind == 'u':
+            hist['Volume'] = _decode_volume(self.fields['Volume'][:, col])
+        return hist.dropna(subset=['Close'])
+
+    def nbytes(self):
+        return sum(a.nbytes for a in self.fields.values())
+
+    def save(self, path):
+        """Guarda el panel como .npz. La escritura es atómica (archivo temporal + rename)."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, tickers=np.array(self.tickers), **self._date_arrays(), **self.fields)
+        os.replace(tmp_path, path)
+
+    def _date_arrays(self):
+        ns = self.dates.values.astype('datetime64[ns]').astype('int64')
+        if not self.compact or not len(ns):
+            return {'dates': ns}
+        # Eje compartido: primera fecha + desplazamientos int32 en días (o segundos si intradía)
+        base = ns[0]
+        unit = 86_400 * 10**9 if (self.dates == self.dates.normalize()).all() else 10**9
+        return {'date_base': np.int64(base), 'date_unit': np.int64(unit),
+                'date_offsets': ((ns - base) // unit).astype('int32')}
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if 'date_offsets' in data.files:
+                ns = int(data['date_base']) + data['date_offsets'].astype('int64') * int(data['date_unit'])
+            else:
+                ns = data['dates']
+            dates = pd.to_datetime(ns.astype('datetime64[ns]'))
+            tickers = data['tickers'].tolist()
+            fields = {f: data[f] for f in data.files if f in FIELDS}
+        return cls(dates, tickers, fields)
+
+    def save_npy(self, directory):
+        """Guarda cada campo como .npy separado para abrirlo luego con memory-map."""
+        os.makedirs(directory, exist_ok=True)
+        for field, values in self.fields.items():
+            tmp_path = os.path.join(directory, f"{field}.npy.tmp{os.getpid()}")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(values))
+            os.replace(tmp_path, os.path.join(directory, f"{field}.npy"))
+        index = pd.DataFrame({'ticker': self.tickers})
+        index.to_csv(os.path.join(directory, 'tickers.csv'), index=False)
+        np.save(os.path.join(directory, 'dates.npy'),
+                self.dates.values.astype('datetime64[ns]').astype('int64'))
+
+    @classmethod
+    def open_npy(cls, directory, fields=FIELDS):
+        """Abre un panel guardado con save_npy en modo solo lectura sin copiar los datos."""
+        dates = pd.to_datetime(np.load(os.path.join(directory, 'dates.npy')).astype('datetime64[ns]'))
+        tickers = pd.read_csv(os.path.join(directory, 'tickers.csv'), keep_default_na=False)['ticker'].tolist()
+        arrays = {f: np.load(os.path.join(directory, f"{f}.npy"), mmap_mode='r') for f in fields}
+        return cls(dates, tickers, arrays)
+
+
+def session_dates(index):
+    """Fechas de velas diarias como int64 ns, sin zona horaria y a medianoche.
+
+    Ticker.history devuelve el índice con la zona del mercado (04:00/05:00 UTC en
+    `.values`) y download_panel lo devuelve sin zona: así ambos coinciden.
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize().values.astype('datetime64[ns]').astype('int64')
+
+
+def last_valid_rows(values):
+    """Índice de la última fila no NaN de cada columna y si la columna tiene algún dato."""
+    valid = ~np.isnan(values)
+    return len(values) - 1 - np.argmax(valid[::-1], axis=0), valid.any(axis=0)
+
+
+def valid_row_groups(values):
+    """Agrupa las columnas que tienen dato en las mismas filas: [(filas, columnas)].
+
+    En un panel de acciones y cripto quedan dos grupos grandes (días hábiles y todos
+    los días) más uno por cada ticker con un hueco propio (listado posterior, feriado).
+    """
+    valid = ~np.isnan(values)
+    groups = {}
+    for j in range(valid.shape[1]):
+        groups.setdefault(valid[:, j].tobytes(), []).append(j)
+    return [(np.flatnonzero(valid[:, cols[0]]), np.array(cols)) for cols in groups.values()]
+
+
+def valid_returns(values):
+    """Retorno de cada columna contra su fila con dato anterior, en las filas con dato.
+
+    Las fechas del panel son la unión de las de todos los tickers (las cripto cotizan
+    los fines de semana): un pct_change sobre ese eje deja NaN el retorno del lunes de
+    cada acción. Acá el lunes se compara con el viernes.
+    """
+    values = np.asarray(values, dtype='float64')
+    valid = ~np.isnan(values)
+    last = np.maximum.accumulate(np.where(valid, np.arange(len(values))[:, None], -1), axis=0)
+    prev = np.full(values.shape, -1)
+    prev[1:] = last[:-1]
+    base = values[np.maximum(prev, 0), np.arange(values.shape[1])]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = values / base - 1
+    returns[~valid | (prev < 0)] = np.nan
+    return returns
+
+
+def download_panel(tickers, period='2y', interval='1d'):
+    """Descarga en un solo pedido el historial de todos los tickers."""
+    with metrics.span('fetch', source='bulk'):
+        data = market_data.download(tickers, period=period, interval=interval, group_by='column',
+                                    auto_adjust=True, threads=True, progress=False)
+    if data is None or data.empty:
+        return None
+
+    data = data.dropna(how='all')
+    fields = {}
+    for field in FIELDS:
+        frame = data[field]
+        if isinstance(frame, pd.Series):
+            frame = frame.to_frame(tickers[0])
+        fields[field] = frame.reindex(columns=tickers).to_numpy(dtype='float64')
+    return PricePanel(data.index.tz_localize(None) if data.index.tz else data.index, tickers, fields)
+
+
+def _cache_path(tickers, period, interval, cache_dir=None):
+    key = hashlib.sha1(f"{','.join(sorted(tickers))}|{period}|{interval}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir or config.CACHE_DIR, f"panel_{interval}_{period}_{key}.npz")
+
+
+def _prune_cache(cache_dir, max_files):
+    """Deja solo los `max_files` paneles escritos más recientemente en `cache_dir`."""
+    try:
+        names = [n for n in os.listdir(cache_dir) if n.startswith('panel_') and n.endswith('.npz')]
+    except FileNotFoundError:
+        return
+    if len(names) <= max_files:
+        return
+    paths = []
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        try:
+            paths.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    paths.sort()
+    for _, path in paths[:len(paths) - max_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_price_panel(tickers, period='2y', interval='1d', max_age_hours=None, refresh=False, compact=None,
+                     cache_dir=None, max_files=None):
+    """Devuelve el panel desde la caché en disco si es reciente; si no, lo descarga.
+
+    Con `compact` (por defecto config.PANEL_COMPACT) el panel y su caché quedan en modo
+    compacto; una caché guardada en el otro modo se convierte al leerla. Los paneles de
+    conjuntos de tickers arbitrarios (ej: el análisis en lote) van a su propio `cache_dir`,
+    que se recorta a `max_files` archivos en cada descarga para no llenar el disco.
+    """
+    max_age_hours = config.PANEL_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    compact = config.PANEL_COMPACT if compact is None else compact
+    path = _cache_path(tickers, period, interval, cache_dir)
+
+    if not refresh and os.path.exists(path):
+        age_hours = (time.time() - os.path.getmtime(path)) / 3600
+        if age_hours <= max_age_hours:
+            metrics.inc('cache_hits_total', cache='panel')
+            panel = PricePanel.load(path)
+            return panel.to_compact() if compact else panel.to_float64()
+
+    metrics.inc('cache_misses_total', cache='panel')
+    panel = download_panel(tickers, period=period, interval=interval)
+    if panel is not None:
+        if compact:
+            panel = panel.to_compact()
+        panel.save(path)
+        if max_files:
+            _prune_cache(os.path.dirname(path), max_files)
+    return panel
@@ -0,0 +1,276 @@
+import bisect
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import config
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Motor de posiciones: lotes FIFO con agregados por ticker
+# ------------------------------------------------------------------------------------
+# Cada compra agrega un lote y cada venta consume los lotes más antiguos. Cantidad,
+# costo y P&L realizado se mantienen actualizados en cada operación, así valuar el
+# portfolio recorre posiciones y no lotes.
+#
+# Cada usuario tiene su propio ledger (PORTFOLIO_DIR/<usuario>.csv; el usuario por
+# defecto sigue usando PORTFOLIO_CSV) y su propio libro en memoria, indexado por
+# usuario → ticker → lotes ordenados por fecha. Un pedido solo lee y recorre los lotes
+# de su usuario.
+#
+# Las operaciones se aplican en orden de fecha (a igual fecha, en el orden de carga) y
+# cada venta se valida contra los lotes que había a su fecha. Cargar una operación con
+# fecha anterior a otras ya registradas rearma el libro del usuario desde su ledger.
+
+LEDGER_COLUMNS = ['ticker', 'quantity', 'purchase_date', 'purchase_price', 'side']
+DEFAULT_USER = 'default'
+_USER_PATTERN = re.compile(r'^[a-z0-9_-]{1,64}$')
+_EPSILON = 1e-9
+
+
+class Position:
+    """Lotes abiertos de un ticker y sus totales acumulados."""
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.lots = []            # [fecha, cantidad restante, precio], ordenados por fecha
+        self.quantity = 0.0
+        self.cost_basis = 0.0
+        self.realized_pnl = 0.0
+
+    @property
+    def avg_cost(self):
+        return self.cost_basis / self.quantity if self.quantity > _EPSILON else 0.0
+
+    def buy(self, quantity, price, date):
+        # Si se carga una compra con fecha anterior, queda en su lugar en la cola FIFO
+        bisect.insort(self.lots, [date, quantity, price], key=lambda lot: lot[0])
+        self.quantity += quantity
+        self.cost_basis += quantity * price
+
+    def held_on(self, date):
+        """Cantidad en cartera a la fecha `date` (lotes comprados hasta ese día)."""
+        return sum(lot[1] for lot in self.lots if lot[0] <= date)
+
+    def sell(self, quantity, price, date):
+        # Solo se pueden vender lotes comprados hasta la fecha de la venta; como los lotes
+        # están ordenados por fecha, la venta consume un prefijo de la cola
+        held = self.held_on(date)
+        if quantity > held + _EPSILON:
+            raise ValueError(f"No se pueden vender {quantity:g} {self.ticker} el {date}: "
+                             f"solo hay {held:g} en cartera a esa fecha")
+        remaining = quantity
+        while remaining > _EPSILON:
+            lot = self.lots[0]
+            used = min(lot[1], remaining)
+            self.realized_pnl += used * (price - lot[2])
+            self.cost_basis -= used * lot[2]
+            lot[1] -= used
+            remaining -= used
+            if lot[1] <= _EPSILON:
+                self.lots.pop(0)
+        self.quantity -= quantity
+        if self.quantity <= _EPSILON:
+            self.quantity = 0.0
+            self.cost_basis = 0.0
+
+    def open_lots(self):
+        return [{'ticker': self.ticker, 'quantity': qty, 'purchase_date': date, 'purchase_price': price}
+                for date, qty, price in self.lots]
+
+
+class PositionBook:
+    """Todas las posiciones del ledger, actualizadas incrementalmente."""
+
+    def __init__(self):
+        self.positions = OrderedDict()
+        self.last_date = ''       # fecha de la operación más reciente aplicada
+
+    def apply(self, trade):
+        ticker = trade['ticker']
+        date = trade_date(trade)
+        # La posición nueva se registra recién cuando la operación es válida: una venta
+        # rechazada no deja una posición vacía en el libro
+        position = self.positions.get(ticker) or Position(ticker)
+        if trade.get('side', 'buy') == 'sell':
+            position.sell(float(trade['quantity']), float(trade['purchase_price']), date)
+        else:
+            position.buy(float(trade['quantity']), float(trade['purchase_price']), date)
+        self.positions.setdefault(ticker, position)
+        self.last_date = max(self.last_date, date)
+
+    def open_positions(self):
+        return [p for p in self.positions.values() if p.quantity > _EPSILON]
+
+    def valuation(self, prices):
+        """Valor, costo y P&L por posición dados los precios actuales {ticker: precio}."""
+        rows = []
+        for position in self.positions.values():
+            price = prices.get(position.ticker)
+            if position.quantity <= _EPSILON or price is None:
+                continue
+            value = position.quantity * price
+            pnl = value - position.cost_basis
+            rows.append({
+                'ticker': position.ticker,
+                'total_quantity': position.quantity,
+                'avg_cost': position.avg_cost,
+                'current_price': price,
+                'pnl': pnl,
+                'pnl_percent': (pnl / position.cost_basis) * 100 if position.cost_basis else 0,
+                'realized_pnl': position.realized_pnl,
+            })
+        return rows
+
+    def realized_pnl(self):
+        return sum(p.realized_pnl for p in self.positions.values())
+
+
+def trade_date(trade):
+    """Fecha de la operación como "AAAA-MM-DD" ('' si falta, así queda primera)."""
+    date = trade.get('purchase_date')
+    if date is None or (isinstance(date, float) and date != date):
+        return ''
+    return str(date)[:10]
+
+
+def replay(trades):
+    """Arma un libro aplicando las operaciones en orden de fecha (y de carga, a igual
+    fecha). Levanta ValueError si alguna venta no tiene posición suficiente."""
+    book = PositionBook()
+    for trade in sorted(trades, key=trade_date):
+        book.apply(trade)
+    return book
+
+
+def read_ledger(path):
+    """Lee el ledger CSV en orden de fecha y, a igual fecha, en el orden en que se cargó;
+    las filas sin columna `side` son compras (formato anterior)."""
+    try:
+        df = pd.read_csv(path)
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        return []
+    df = df.dropna(subset=['ticker'])
+    if 'side' not in df.columns:
+        df['side'] = 'buy'
+    df['side'] = df['side'].fillna('buy')
+    # sorted es estable: las operaciones del mismo día mantienen el orden del archivo
+    return sorted(df.to_dict('records'), key=trade_date)
+
+
+def normalize_user(user=None):
+    """Nombre de usuario en minúsculas; se valida porque forma parte de la ruta del ledger."""
+    user = (user or DEFAULT_USER).strip().lower()
+    if not _USER_PATTERN.match(user):
+        raise ValueError(f"Usuario inválido: {user!r} (letras, números, '_' o '-')")
+    return user
+
+
+def ledger_path(user=None):
+    user = normalize_user(user)
+    if user == DEFAULT_USER:
+        return config.PORTFOLIO_CSV
+    return os.path.join(config.PORTFOLIO_DIR, f"{user}.csv")
+
+
+def list_users():
+    """Usuarios con ledger en disco."""
+    users = [DEFAULT_USER] if os.path.exists(config.PORTFOLIO_CSV) else []
+    try:
+        names = sorted(os.listdir(config.PORTFOLIO_DIR))
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        user, ext = os.path.splitext(name)
+        if ext == '.csv' and _USER_PATTERN.match(user) and user not in users:
+            users.append(user)
+    return users
+
+
+_lock = threading.Lock()
+_books = {}   # usuario -> (libro, stamp del CSV con el que se armó)
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return path, st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return path, None
+
+
+def ledger_version(user=None):
+    """Identifica el contenido actual del ledger del usuario (cambia con cualquier escritura)."""
+    return _stamp(ledger_path(user))
+
+
+def get_book(user=None):
+    """Libro de posiciones del usuario en memoria; solo se relee su CSV si otro proceso
+    lo modificó."""
+    user = normalize_user(user)
+    path = ledger_path(user)
+    with _lock:
+        stamp = _stamp(path)
+        book, book_stamp = _books.get(user, (None, None))
+        if book is None or stamp != book_stamp:
+            book = PositionBook()
+            for trade in read_ledger(path):
+                try:
+                    book.apply(trade)
+                except ValueError as e:
+                    print(f"Operación ignorada en {path}: {e}")
+            _books[user] = (book, stamp)
+        return book
+
+
+def open_tickers(users=None):
+    """Tickers distintos con posición abierta entre todos los usuarios (o los indicados)."""
+    tickers = set()
+    for user in list_users() if users is None else users:
+        tickers.update(p.ticker for p in get_book(user).open_positions())
+    return sorted(tickers)
+
+
+def _ensure_side_column(path):
+    # Los ledgers viejos no tienen la columna `side`; se agrega una sola vez
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+    if 'side' in header:
+        return
+    df = pd.read_csv(path)
+    df['side'] = 'buy'
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    df[LEDGER_COLUMNS].to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def record_trade(trade, user=None):
+    """Valida la operación contra el libro del usuario, la agrega a su CSV y actualiza
+    los agregados."""
+    user = normalize_user(user)
+    path = ledger_path(user)
+    trade = {**trade, 'side': trade.get('side', 'buy')}
+    book = get_book(user)
+    with _lock:
+        # Primero se aplica en memoria: una venta sin posición suficiente no llega al CSV.
+        # Una operación con fecha anterior a la última cargada cambia qué lotes consumieron
+        # las ventas posteriores, así que se rearma el libro con todo el ledger
+        if trade_date(trade) < book.last_date:
+            book = replay(read_ledger(path) + [trade])
+        else:
+            book.apply(trade)
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            _ensure_side_column(path)
+            pd.DataFrame([trade])[LEDGER_COLUMNS].to_csv(path, mode='a', header=not os.path.exists(path),
+                                                        index=False)
+        except Exception:
+            _books.pop(user, None)  # El libro quedó adelantado respecto del CSV: se relee en el próximo uso
+            raise
+        _books[user] = (book, _stamp(path))
+    return book
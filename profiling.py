@@ -0,0 +1,90 @@
+import io
+import os
+import re
+from datetime import datetime
+
+# ------------------------------------------------------------------------------------
+# Perfilado bajo demanda de un request o de una acción del menú
+# ------------------------------------------------------------------------------------
+# Se activa con FINANCEBOT_PROFILE=1. Aun así, solo se perfila lo que se pide
+# explícitamente: en la web con la cabecera `X-Profile: 1` o `?profile=1`, y en las
+# CLIs agregando una "p" a la opción del menú (ej: "1p"). Con la variable apagada no
+# se registra ningún hook, así que el costo es cero; cProfile y pstats se importan
+# recién al perfilar para no sumar al arranque de las CLIs.
+
+ENABLED = os.environ.get('FINANCEBOT_PROFILE', '') not in ('', '0', 'false', 'no')
+PROFILE_DIR = os.environ.get('FINANCEBOT_PROFILE_DIR', 'profiles')
+TOP_N = int(os.environ.get('FINANCEBOT_PROFILE_TOP', '25'))
+
+
+def _slug(label):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', label).strip('_') or 'perfil'
+
+
+def write_profile(profiler, label, directory=None, top_n=None):
+    """Guarda el perfil (.prof) y un resumen de las N funciones más costosas (.txt)."""
+    directory = directory or PROFILE_DIR
+    top_n = top_n or TOP_N
+    import pstats
+
+    os.makedirs(directory, exist_ok=True)
+
+    base = os.path.join(directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{_slug(label)}")
+    profiler.dump_stats(base + '.prof')
+
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    buffer.write(f"Perfil de {label}\n\n")
+    stats.sort_stats('cumulative').print_stats(top_n)
+    buffer.write("\n--- Ordenado por tiempo propio ---\n")
+    stats.sort_stats('tottime').print_stats(top_n)
+    with open(base + '.txt', 'w', encoding='utf-8') as f:
+        f.write(buffer.getvalue())
+
+    return base + '.prof', base + '.txt'
+
+
+def run_profiled(label, func, *args, **kwargs):
+    """Ejecuta `func` bajo cProfile y escribe los artefactos del perfil."""
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        prof_path, summary_path = write_profile(profiler, label)
+        print(f"\n🧪 Perfil guardado en {prof_path} (resumen: {summary_path})")
+
+
+def _requested(request):
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    return flag not in (None, '', '0', 'false', 'no')
+
+
+def init_app(app):
+    """Registra los hooks de perfilado en la app Flask si FINANCEBOT_PROFILE está activo."""
+    if not ENABLED:
+        return
+
+    import cProfile
+
+    from flask import g, request
+
+    @app.before_request
+    def start_profiler():
+        if _requested(request):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+        profiler.disable()
+        try:
+            write_profile(profiler, f"{request.method}_{request.path}")
+        except OSError as e:
+            app.logger.warning(f"No se pudo guardar el perfil: {e}")
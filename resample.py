@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+
+import config
+import fragments
+import market_data
+import metrics
+from lazy import lazy_import
+
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Remuestreo local de velas: semanal/mensual desde diario, 15m/30m/1h desde 5m
+# ------------------------------------------------------------------------------------
+# Solo se descargan las velas base (1d y 5m) y se guardan en una caché en memoria;
+# cualquier otra temporalidad se deriva localmente sin tráfico de red extra.
+
+OHLCV_AGG = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+    'Dividends': 'sum',
+    'Stock Splits': 'prod',
+}
+
+# Temporalidad pedida -> vela base que se descarga
+BASE_INTERVAL = {
+    '1d': '1d', '1wk': '1d', '1mo': '1d',
+    '5m': '5m', '15m': '5m', '30m': '5m', '1h': '5m',
+}
+
+INTRADAY_MINUTES = {'5m': 5, '15m': 15, '30m': 30, '1h': 60}
+
+_cache = OrderedDict()   # LRU acotada: un escaneo del universo no la hace crecer sin límite
+_lock = threading.Lock()
+
+
+def _agg_for(hist):
+    agg = {col: how for col, how in OHLCV_AGG.items() if col in hist.columns}
+    if 'Stock Splits' in agg:
+        # Un split de 0 significa "sin split"; para el producto se toma como 1
+        hist = hist.assign(**{'Stock Splits': hist['Stock Splits'].replace(0, 1)})
+    return hist, agg
+
+
+def _finish(bars):
+    if 'Stock Splits' in bars.columns:
+        bars['Stock Splits'] = bars['Stock Splits'].replace(1, 0)
+    return bars[[c for c in OHLCV_AGG if c in bars.columns]]
+
+
+def resample_daily(hist, timeframe):
+    """Agrupa velas diarias en semanales (cierre viernes) o mensuales."""
+    if timeframe == '1d':
+        return hist
+    rule = {'1wk': pd.offsets.Week(weekday=4), '1mo': pd.offsets.MonthEnd()}[timeframe]
+    hist, agg = _agg_for(hist[list(OHLCV_AGG.keys() & set(hist.columns))])
+    bars = hist.resample(rule).agg(agg).dropna(subset=['Close'])
+    return _finish(bars)
+
+
+def resample_intraday(hist, timeframe, session_start=None):
+    """Agrupa velas de 5m en 15m/30m/1h alineadas a la apertura de cada sesión.
+
+    Las velas se etiquetan con su hora de inicio (como Yahoo) y nunca cruzan de un
+    día a otro: la primera vela de 1h de la sesión es 09:30-10:30, no 09:00-10:00.
+    """
+    if timeframe == '5m':
+        return hist
+    session_start = session_start or config.SESSION_START
+    hours, minutes = (int(x) for x in session_start.split(':'))
+    open_offset = pd.Timedelta(hours=hours, minutes=minutes)
+    width = INTRADAY_MINUTES[timeframe]
+
+    day = hist.index.normalize()
+    since_open = (hist.index - day - open_offset) // pd.Timedelta(minutes=1)
+    bucket_start = day + open_offset + pd.to_timedelta((since_open // width) * width, unit='min')
+
+    hist, agg = _agg_for(hist[list(OHLCV_AGG.keys() & set(hist.columns))])
+    bars = hist.groupby(bucket_start).agg(agg).dropna(subset=['Close'])
+    bars.index.name = hist.index.name
+    return _finish(bars)
+
+
+def resample(hist, timeframe, session_start=None):
+    if timeframe in INTRADAY_MINUTES:
+        return resample_intraday(hist, timeframe, session_start)
+    return resample_daily(hist, timeframe)
+
+
+def _cached_history(ticker, interval, period):
+    key = (ticker, interval, period)
+    ttl = config.BAR_CACHE_TTL_SECONDS.get(interval, 60)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+    if entry is not None and time.time() - entry[0] <= ttl:
+        metrics.inc('cache_hits_total', cache='bars')
+        return entry[1]
+
+    metrics.inc('cache_misses_total', cache='bars')
+    with metrics.span('fetch', interval=interval):
+        hist = market_data.history(ticker, period=period, interval=interval)
+    if not hist.empty:
+        # Los fragmentos HTML que muestran este ticker se vuelven a renderizar
+        fragments.bump(f"prices:{ticker}")
+        with _lock:
+            _cache[key] = (time.time(), hist)
+            _cache.move_to_end(key)
+            while len(_cache) > config.BAR_CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return hist
+
+
+def get_bars(ticker, interval='1d', period='6mo', session_start=None):
+    """Velas de `ticker` en cualquier temporalidad soportada.
+
+    Solo las velas base (1d o 5m) se piden a Yahoo; el resto se deriva de la caché.
+    Devuelve una copia, así el llamador puede agregar columnas sin tocar la caché.
+    """
+    base = BASE_INTERVAL[interval]
+    hist = _cached_history(ticker, base, period)
+    if hist.empty or interval == base:
+        return hist.copy()
+    return resample(hist, interval, session_start)
+
+
+def refresh(tickers, interval='1d', period='6mo'):
+    """Renueva en la caché las velas vencidas de `tickers` sin copiarlas (ver fragments.py)."""
+    base = BASE_INTERVAL[interval]
+    for ticker in tickers:
+        try:
+            _cached_history(ticker, base, period)
+        except Exception as e:
+            metrics.inc('upstream_errors_total', service='yahoo')
+            print(f"Error actualizando velas de {ticker}: {str(e)}")
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+def weekly_trend(daily_hist, window=10):
+    """Confirmación semanal de tendencia a partir de las velas diarias ya descargadas."""
+    weekly = resample_daily(daily_hist, '1wk')
+    if len(weekly) < window + 1:
+        return None
+    sma = weekly['Close'].rolling(window=window).mean()
+    close, sma_now, sma_prev = weekly['Close'].iloc[-1], sma.iloc[-1], sma.iloc[-2]
+    if close > sma_now and sma_now > sma_prev:
+        label = "Semanal al alza"
+    elif close < sma_now and sma_now < sma_prev:
+        label = "Semanal a la baja"
+    else:
+        label = "Semanal lateral"
+    return f"{label}: cierre ${close:.2f} vs SMA{window} semanal ${sma_now:.2f}"
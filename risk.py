@@ -0,0 +1,186 @@
+import threading
+import time
+from statistics import NormalDist
+
+import config
+import metrics
+from correlation import CoMoments
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# ------------------------------------------------------------------------------------
+# Riesgo del portfolio: volatilidad, beta, VaR/CVaR, drawdown y correlaciones
+# ------------------------------------------------------------------------------------
+# Todo se calcula sobre una matriz de retornos diarios (fechas × activos) que incluye
+# al S&P 500 como última columna. Cada métrica es una operación matricial sobre todos
+# los activos a la vez; los huecos (activo sin cotización ese día) son NaN y se
+# excluyen con máscaras, sin recorrer los tickers uno por uno.
+
+BENCHMARK = '^GSPC'
+TRADING_DAYS = 252
+CONFIDENCE = 0.95
+
+_cache = {}
+_lock = threading.Lock()
+
+
+class ReturnMatrix:
+    """Precios y retornos diarios de los activos; la última columna es el benchmark."""
+
+    def __init__(self, dates, tickers, close):
+        from panel import valid_returns
+
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.close = close
+        # Cada activo contra su cotización anterior (ver panel.valid_returns): el eje de
+        # fechas es la unión de todos, y con una cripto en el portfolio el retorno del
+        # lunes de las acciones quedaría NaN y sesgaría beta, VaR y CVaR
+        self.returns = valid_returns(close)[1:]
+
+    @property
+    def assets(self):
+        return self.tickers[:-1]
+
+
+def get_return_matrix(tickers, period='2y'):
+    """Matriz de retornos de `tickers` + benchmark, cacheada en memoria y en disco."""
+    import panel as panel_module
+
+    key = (tuple(sorted(tickers)), period)
+    ttl = config.PANEL_MAX_AGE_HOURS * 3600
+    with _lock:
+        entry = _cache.get(key)
+    if entry is not None and time.time() - entry[0] <= ttl:
+        metrics.inc('cache_hits_total', cache='returns')
+        return entry[1]
+
+    metrics.inc('cache_misses_total', cache='returns')
+    symbols = list(key[0]) + [BENCHMARK]
+    prices = panel_module.load_price_panel(symbols, period=period)
+    if prices is None:
+        return None
+    matrix = ReturnMatrix(prices.dates, prices.tickers, np.asarray(prices['Close'], dtype='float64'))
+    with _lock:
+        _cache[key] = (time.time(), matrix)
+    return matrix
+
+
+def pairwise_correlation(returns):
+    """Correlación de Pearson entre columnas usando, para cada par, solo las fechas
+    en que ambas tienen dato (ver correlation.CoMoments)."""
+    return CoMoments.from_returns(returns).correlation()
+
+
+def volatility(returns):
+    with np.errstate(invalid='ignore'):
+        return np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+
+
+def beta(returns):
+    """Beta de cada columna contra la última (benchmark), con fechas comunes."""
+    market = returns[:, -1:]
+    valid = ~np.isnan(returns) & ~np.isnan(market)
+    x = np.where(valid, returns, 0.0)
+    y = np.where(valid, market, 0.0)
+    n = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = (x * y).sum(axis=0) - x.sum(axis=0) * y.sum(axis=0) / n
+        var = (y * y).sum(axis=0) - y.sum(axis=0) ** 2 / n
+        return cov / var
+
+
+def historical_var(returns, confidence=CONFIDENCE):
+    """VaR y CVaR históricos (pérdidas como valores positivos) por columna."""
+    with np.errstate(invalid='ignore'):
+        cutoff = np.nanquantile(returns, 1 - confidence, axis=0)
+        tail = returns <= cutoff
+        tail_count = tail.sum(axis=0)
+        cvar = np.where(tail, returns, 0.0).sum(axis=0) / np.where(tail_count, tail_count, np.nan)
+    return -cutoff, -cvar
+
+
+def parametric_var(returns, confidence=CONFIDENCE):
+    """VaR y CVaR suponiendo retornos normales."""
+    normal = NormalDist()
+    z = normal.inv_cdf(1 - confidence)
+    with np.errstate(invalid='ignore'):
+        mu = np.nanmean(returns, axis=0)
+        sigma = np.nanstd(returns, axis=0, ddof=1)
+    var = -(mu + z * sigma)
+    cvar = -(mu - sigma * normal.pdf(z) / (1 - confidence))
+    return var, cvar
+
+
+def max_drawdown(close):
+    """Máxima caída desde un pico previo para cada columna de precios."""
+    running_max = np.fmax.accumulate(close, axis=0)
+    with np.errstate(invalid='ignore'):
+        return np.nanmin(close / running_max - 1, axis=0)
+
+
+def _portfolio_returns(matrix, weights):
+    # Un activo sin cotización ese día (todavía no listado, feriado) aporta 0
+    asset_returns = np.nan_to_num(matrix.returns[:, :-1], nan=0.0)
+    return asset_returns @ weights
+
+
+def compute_risk(matrix, weights, confidence=CONFIDENCE):
+    """Todas las métricas de riesgo por activo y del portfolio ponderado por valor."""
+    returns = matrix.returns
+    weights = np.asarray(weights, dtype='float64')
+    weights = weights / weights.sum()
+
+    portfolio = _portfolio_returns(matrix, weights)
+    # La serie del portfolio se agrega como una columna más antes del benchmark
+    with_portfolio = np.column_stack([returns[:, :-1], portfolio, returns[:, -1]])
+    equity = np.concatenate([[1.0], np.cumprod(1 + portfolio)])
+    close = np.column_stack([matrix.close[:, :-1], equity, matrix.close[:, -1]])
+
+    vol = volatility(with_portfolio)
+    betas = beta(with_portfolio)
+    hist_var, hist_cvar = historical_var(with_portfolio, confidence)
+    par_var, par_cvar = parametric_var(with_portfolio, confidence)
+    drawdown = max_drawdown(close)
+
+    names = matrix.assets + ['Portfolio', matrix.tickers[-1]]
+    rows = [{
+        'ticker': name,
+        'weight': float(weights[i]) if i < len(weights) else (1.0 if name == 'Portfolio' else None),
+        'volatility': float(vol[i]),
+        'beta': float(betas[i]),
+        'var_hist': float(hist_var[i]),
+        'cvar_hist': float(hist_cvar[i]),
+        'var_param': float(par_var[i]),
+        'cvar_param': float(par_cvar[i]),
+        'max_drawdown': float(drawdown[i]),
+    } for i, name in enumerate(names)]
+
+    corr = pairwise_correlation(returns[:, :-1])
+    return {
+        'confidence': confidence,
+        'start': matrix.dates[0],
+        'end': matrix.dates[-1],
+        'days': len(returns),
+        'assets': rows[:-2],
+        'portfolio': rows[-2],
+        'benchmark': rows[-1],
+        'correlation': {
+            'tickers': matrix.assets,
+            'matrix': [[None if np.isnan(v) else round(float(v), 2) for v in row] for row in corr],
+        },
+    }
+
+
+def portfolio_risk(performance, period='2y'):
+    """Riesgo de las posiciones abiertas (la salida de calculate_portfolio_performance)."""
+    if not performance:
+        return None
+    values = {p['ticker']: p['current_price'] * p['total_quantity'] for p in performance}
+    matrix = get_return_matrix(list(values), period)
+    if matrix is None or len(matrix.returns) < 2:
+        return None
+    with metrics.span('risk'):
+        weights = [values[t] for t in matrix.assets]
+        return compute_risk(matrix, weights)
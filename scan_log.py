@@ -0,0 +1,241 @@
+import argparse
+import bisect
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+
+# ------------------------------------------------------------------------------------
+# Registro histórico de escaneos (solo se agrega al final)
+# ------------------------------------------------------------------------------------
+# Cada escaneo agrega una línea JSON por resultado (ticker, precio, entrada, objetivo,
+# señales, momento y tipo de escaneo) a SCAN_LOG_DIR/<AAAA-MM>.jsonl. Nada se reescribe:
+# una consulta por rango de fechas solo abre los meses que toca y, como dentro de cada
+# archivo las líneas quedan en orden de tiempo, el rango se corta con bisect.
+#
+# Ese orden no está garantizado: dos procesos (la web y una CLI desde cron) toman el
+# momento antes de escribir y pueden agregar sus líneas al revés. Un archivo con alguna
+# línea fuera de orden se consulta recorriendo sus filas en lugar de con bisect.
+#
+# El índice de cada archivo (momentos y filas por ticker) se arma en la primera consulta
+# y se extiende leyendo solo los bytes agregados desde la anterior, así preguntar
+# "¿cuántas veces salió NVDA este trimestre?" no vuelve a parsear meses de escaneos.
+
+
+def _codec():
+    # Se importa en el primer uso para no sumar al arranque de los menús. orjson es
+    # opcional: sin él se usa json de la librería estándar
+    try:
+        import orjson
+        return orjson.dumps, orjson.loads
+    except ImportError:
+        import json
+        return lambda record: json.dumps(record, ensure_ascii=False).encode('utf-8'), json.loads
+
+
+def _dumps(record):
+    return _codec()[0](record)
+
+
+def _loads(line):
+    return _codec()[1](line)
+
+
+def _number(value):
+    """Los precios llegan como número o como texto "$123.45" según el escaneo."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.replace('$', '').replace(',', '').strip()
+    try:
+        return round(float(value), 4)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_time(value):
+    """Momento como epoch: acepta None, números, datetime y fechas ISO ("2025-07-01")."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+def _month_path(ts):
+    return os.path.join(config.SCAN_LOG_DIR, f"{time.strftime('%Y-%m', time.localtime(ts))}.jsonl")
+
+
+def append(scan, results, ts=None, partial=False):
+    """Agrega los resultados de un escaneo al registro. Nunca interrumpe el escaneo."""
+    if not results:
+        return 0
+    ts = time.time() if ts is None else ts
+    lines = []
+    for result in results:
+        lines.append(_dumps({
+            'ts': round(ts, 3),
+            'scan': scan,
+            'ticker': result['ticker'],
+            'price': _number(result.get('price')),
+            'entry': _number(result.get('entry')),
+            'target': _number(result.get('target')),
+            'reasons': list(result.get('reasons', [])),
+            'partial': bool(partial),
+        }))
+    path = _month_path(ts)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Una sola escritura en modo append: las líneas de dos procesos no se mezclan
+        with open(path, 'ab') as f:
+            f.write(b'\n'.join(lines) + b'\n')
+    except OSError as e:
+        print(f"Error guardando el registro de escaneos: {e}")
+        return 0
+    return len(lines)
+
+
+class _Segment:
+    """Índice en memoria de un archivo mensual, extendido a medida que crece."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.times = []
+        self.records = []
+        self.by_ticker = {}
+        self.ordered = True     # False si alguna línea tiene un momento anterior a la previa
+
+    def refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size < self.offset:  # El archivo se truncó o reemplazó: se reindexa
+            self.__init__(self.path)
+        if size == self.offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = data.rfind(b'\n') + 1  # Una línea a medio escribir se lee la próxima vez
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = _loads(line)
+            except ValueError:
+                continue
+            index = len(self.records)
+            if self.times and record['ts'] < self.times[-1]:
+                self.ordered = False
+            self.records.append(record)
+            self.times.append(record['ts'])
+            self.by_ticker.setdefault(record['ticker'], []).append(index)
+        self.offset += end
+
+    def rows(self, ticker=None, start=None, end=None):
+        if not self.ordered:
+            # Recorrido completo, devuelto en orden de tiempo como en el caso ordenado
+            candidates = range(len(self.times)) if ticker is None else self.by_ticker.get(ticker, [])
+            times = self.times
+            rows = [i for i in candidates
+                    if (start is None or times[i] >= start) and (end is None or times[i] < end)]
+            return sorted(rows, key=times.__getitem__)
+        lo = 0 if start is None else bisect.bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect.bisect_left(self.times, end)
+        if ticker is None:
+            return range(lo, hi)
+        rows = self.by_ticker.get(ticker, [])
+        return rows[bisect.bisect_left(rows, lo):bisect.bisect_left(rows, hi)]
+
+
+_segments = {}
+_lock = threading.Lock()
+
+
+def _month_paths(start=None, end=None):
+    try:
+        names = sorted(n for n in os.listdir(config.SCAN_LOG_DIR) if n.endswith('.jsonl'))
+    except FileNotFoundError:
+        return []
+    first = os.path.basename(_month_path(start)) if start is not None else None
+    last = os.path.basename(_month_path(end)) if end is not None else None
+    return [os.path.join(config.SCAN_LOG_DIR, n) for n in names
+            if (first is None or n >= first) and (last is None or n <= last)]
+
+
+def _iter_records(ticker=None, start=None, end=None, scan=None):
+    start, end = parse_time(start), parse_time(end)
+    ticker = ticker.upper() if ticker else None
+    with _lock:
+        segments = []
+        for path in _month_paths(start, end):
+            segment = _segments.get(path)
+            if segment is None:
+                segment = _segments[path] = _Segment(path)
+            segment.refresh()
+            segments.append((segment, segment.rows(ticker, start, end)))
+    for segment, rows in segments:
+        for row in rows:
+            record = segment.records[row]
+            if scan is None or record['scan'] == scan:
+                yield record
+
+
+def query(ticker=None, start=None, end=None, scan=None, limit=None):
+    """Resultados registrados en [start, end), del más reciente al más viejo."""
+    records = list(_iter_records(ticker, start, end, scan))
+    records.reverse()
+    return records[:limit] if limit else records
+
+
+def flag_counts(start=None, end=None, scan=None):
+    """Cuántas veces salió cada ticker en [start, end), con la primera y última vez."""
+    counts = {}
+    for record in _iter_records(None, start, end, scan):
+        entry = counts.get(record['ticker'])
+        if entry is None:
+            counts[record['ticker']] = {'ticker': record['ticker'], 'count': 1, 'first_ts': record['ts'],
+                                        'last_ts': record['ts'], 'last_price': record['price']}
+        else:
+            entry['count'] += 1
+            entry['last_ts'] = record['ts']
+            entry['last_price'] = record['price']
+    return sorted(counts.values(), key=lambda c: (-c['count'], -c['last_ts']))
+
+
+def format_ts(ts):
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta el registro histórico de escaneos")
+    parser.add_argument('--ticker', help="Resultados de un ticker (si no, ranking de tickers)")
+    parser.add_argument('--days', type=int, default=90, help="Ventana hacia atrás en días")
+    parser.add_argument('--scan', help="Tipo de escaneo (daily, intraday, ...)")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    start = datetime.now() - timedelta(days=args.days)
+    began = time.perf_counter()
+    if args.ticker:
+        records = query(args.ticker, start=start, scan=args.scan)
+        elapsed = (time.perf_counter() - began) * 1000
+        print(f"{args.ticker.upper()}: {len(records)} veces en {args.days} días ({elapsed:.0f} ms)")
+        for r in records[:args.limit]:
+            price = f"${r['price']:.2f}" if r['price'] is not None else '-'
+            print(f"  {format_ts(r['ts'])}  {r['scan']:<9} {price}  " + " | ".join(r['reasons']))
+    else:
+        counts = flag_counts(start=start, scan=args.scan)
+        elapsed = (time.perf_counter() - began) * 1000
+        print(f"{len(counts)} tickers señalados en {args.days} días ({elapsed:.0f} ms)")
+        for c in counts[:args.limit]:
+            print(f"  {c['ticker']:<8} {c['count']:>4} veces · última {format_ts(c['last_ts'])}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
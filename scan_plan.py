@@ -0,0 +1,253 @@
+import glob
+import json
+import os
+import threading
+import time
+
+import config
+import metrics
+import throttle
+
+# ------------------------------------------------------------------------------------
+# Orden de prioridad y tiempo límite de los escaneos del universo
+# ------------------------------------------------------------------------------------
+# Cuando un escaneo tiene un tiempo máximo, el orden decide qué tickers llegan a
+# evaluarse. El plan los ordena por nivel:
+#
+#   1. posiciones abiertas de los portfolios de todos los usuarios
+#   2. watchlist (config.WATCHLIST y tickers con alertas registradas)
+#   3. los LIQUID_TOP más líquidos según el volumen en dólares cacheado en disco
+#   4. los que algún escaneo señaló en los últimos FLAGGED_MAX_AGE_DAYS días
+#   5. el resto, también por liquidez (y en el orden del CSV si no hay datos)
+#
+# Si se agota SCAN_DEADLINE_SECONDS el escaneo devuelve lo que encontró hasta ahí,
+# marcado como parcial y con la cobertura por nivel.
+
+TIERS = ('posiciones', 'watchlist', 'liquidez', 'señaladas', 'resto')
+LIQUID_TOP = 100
+FLAGGED_MAX_AGE_DAYS = 5
+
+
+def _flagged_path():
+    return os.path.join(config.CACHE_DIR, 'flagged.json')
+
+
+def load_holdings():
+    import positions
+    try:
+        return positions.open_tickers()  # de todos los usuarios
+    except Exception as e:
+        print(f"Error leyendo posiciones para el escaneo: {e}")
+        return []
+
+
+def load_watchlist():
+    tickers = list(config.WATCHLIST)
+    alerts_path = config.ALERTS_PATH
+    if alerts_path and os.path.exists(alerts_path):
+        try:
+            with open(alerts_path, encoding='utf-8') as f:
+                tickers += [a['ticker'] for a in json.load(f)]
+        except Exception as e:
+            print(f"Error leyendo alertas para el escaneo: {e}")
+    return [t.upper() for t in tickers]
+
+
+def load_flagged(max_age_days=FLAGGED_MAX_AGE_DAYS):
+    """Tickers señalados por escaneos recientes, del más reciente al más viejo."""
+    try:
+        with open(_flagged_path(), encoding='utf-8') as f:
+            flagged = json.load(f)
+    except (OSError, ValueError):
+        return []
+    cutoff = time.time() - max_age_days * 86400
+    return [t for t, ts in sorted(flagged.items(), key=lambda item: -item[1]) if ts >= cutoff]
+
+
+def record_flagged(tickers):
+    """Guarda los tickers que dio un escaneo para priorizarlos en los siguientes."""
+    if not tickers:
+        return
+    path = _flagged_path()
+    try:
+        with open(path, encoding='utf-8') as f:
+            flagged = json.load(f)
+    except (OSError, ValueError):
+        flagged = {}
+    now = time.time()
+    cutoff = now - FLAGGED_MAX_AGE_DAYS * 86400
+    flagged = {t: ts for t, ts in flagged.items() if ts >= cutoff}
+    flagged.update({t: now for t in tickers})
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(flagged, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error guardando tickers señalados: {e}")
+
+
+def cached_volumes():
+    """Volumen promedio en dólares por ticker con lo que ya hay en disco (sin red):
+    el último snapshot columnar o, si no hay, el panel diario cacheado más reciente."""
+    from lazy import lazy_import
+    np = lazy_import('numpy')
+
+    volumes = {}
+    try:
+        import snapshot
+        snap = snapshot.open_snapshot(config.SNAPSHOT_DIR)
+        if snap is not None:
+            dollar = np.asarray(snap.column('Close')) * np.asarray(snap.column('AvgVolume'))
+            volumes = {s: float(dollar[i]) for s, i in snap.index.items() if not np.isnan(dollar[i])}
+    except Exception as e:
+        print(f"Error leyendo el snapshot para el escaneo: {e}")
+    if volumes:
+        return volumes
+
+    paths = glob.glob(os.path.join(config.CACHE_DIR, 'panel_1d_*.npz'))
+    if paths:
+        try:
+            from panel import PricePanel
+            cached = PricePanel.load(max(paths, key=os.path.getmtime))
+            with np.errstate(all='ignore'):
+                dollar = np.nanmean(cached['Close'][-20:] * cached['Volume'][-20:], axis=0)
+            volumes = {t: float(v) for t, v in zip(cached.tickers, dollar) if not np.isnan(v)}
+        except Exception as e:
+            print(f"Error leyendo el panel cacheado para el escaneo: {e}")
+    return volumes
+
+
+def build_plan(tickers, holdings=None, watchlist=None, flagged=None, volumes=None):
+    """Devuelve [(ticker, nivel)] en el orden en que conviene escanearlos.
+
+    Los argumentos en None se cargan de disco. Las posiciones y la watchlist se
+    escanean aunque no estén en el CSV.
+    """
+    holdings = load_holdings() if holdings is None else holdings
+    watchlist = load_watchlist() if watchlist is None else watchlist
+    flagged = load_flagged() if flagged is None else flagged
+    volumes = cached_volumes() if volumes is None else volumes
+
+    plan, seen = [], set()
+
+    def take(candidates, tier):
+        for ticker in candidates:
+            if ticker not in seen:
+                seen.add(ticker)
+                plan.append((ticker, tier))
+
+    universe = list(dict.fromkeys(tickers))
+    # sorted es estable: sin volumen cacheado se respeta el orden del CSV
+    by_volume = sorted(universe, key=lambda t: -volumes.get(t, -1.0))
+    take(holdings, 'posiciones')
+    take(watchlist, 'watchlist')
+    take([t for t in by_volume[:LIQUID_TOP] if t in volumes], 'liquidez')
+    take([t for t in flagged if t in set(universe)], 'señaladas')
+    take(by_volume, 'resto')
+    return plan
+
+
+class Deadline:
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+
+    def remaining(self):
+        if not self.seconds:
+            return None
+        return max(0.0, self.started + self.seconds - time.monotonic())
+
+    def expired(self):
+        return self.seconds is not None and self.remaining() == 0
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+class ScanResult(list):
+    """Lista de resultados con la cobertura del escaneo (`partial` y `coverage`)."""
+
+    def __init__(self, items, coverage):
+        super().__init__(items)
+        self.coverage = coverage
+
+    @property
+    def partial(self):
+        return self.coverage['partial']
+
+
+class ScanTracker:
+    """Registra qué tickers del plan se evaluaron antes del tiempo límite."""
+
+    def __init__(self, plan, seconds=None):
+        self.plan = plan
+        self.deadline = Deadline(config.SCAN_DEADLINE_SECONDS if seconds is None else seconds)
+        self._done = set()
+        self._lock = threading.Lock()
+        # RSS al empezar y máxima durante el escaneo (se muestrea en cada ticker)
+        self.rss_start = self.rss_peak = metrics.rss_bytes()
+
+    @property
+    def tickers(self):
+        return [ticker for ticker, _ in self.plan]
+
+    def run(self, func, ticker):
+        """Evalúa un ticker si queda tiempo; si no, lo saltea y devuelve None."""
+        if self.deadline.expired():
+            return None
+        try:
+            result = func(ticker)
+        except throttle.ThrottledError:
+            raise  # limitado por Yahoo: todavía no cuenta como evaluado
+        except Exception:
+            self.mark(ticker)
+            raise
+        self.mark(ticker)
+        return result
+
+    def mark(self, ticker):
+        rss = metrics.rss_bytes()
+        with self._lock:
+            self._done.add(ticker)
+            if rss is not None and (self.rss_peak is None or rss > self.rss_peak):
+                self.rss_peak = rss
+
+    def result(self, items, target=None):
+        """ScanResult con los resultados y la cobertura. Es parcial si se agotó el tiempo
+        antes de evaluar todo el plan y sin haber llegado a `target` resultados."""
+        tiers = {}
+        with self._lock:
+            done = set(self._done)
+        for ticker, tier in self.plan:
+            entry = tiers.setdefault(tier, {'scanned': 0, 'total': 0})
+            entry['total'] += 1
+            entry['scanned'] += ticker in done
+        total = len(self.plan)
+        partial = (len(done) < total and self.deadline.expired()
+                   and (target is None or len(items) < target))
+        coverage = {
+            'partial': partial,
+            'scanned': len(done),
+            'total': total,
+            'percent': round(100 * len(done) / total, 1) if total else 100.0,
+            'elapsed_seconds': round(self.deadline.elapsed(), 1),
+            'deadline_seconds': self.deadline.seconds,
+            'tiers': tiers,
+            'rss_start_mb': round(self.rss_start / 2**20, 1) if self.rss_start else None,
+            'rss_peak_mb': round(self.rss_peak / 2**20, 1) if self.rss_peak else None,
+        }
+        return ScanResult(items, coverage)
+
+
+def describe(coverage):
+    """Línea de texto con la cobertura, para la consola y Telegram."""
+    text = (f"{coverage['scanned']}/{coverage['total']} tickers ({coverage['percent']}%) "
+            f"en {coverage['elapsed_seconds']}s")
+    if coverage.get('rss_peak_mb'):
+        text += f" · RSS pico {coverage['rss_peak_mb']} MB (inicio {coverage['rss_start_mb']} MB)"
+    if not coverage['partial']:
+        return text
+    by_tier = ", ".join(f"{tier} {c['scanned']}/{c['total']}" for tier, c in coverage['tiers'].items())
+    return f"Resultado PARCIAL (se agotó el tiempo): {text} · {by_tier}"
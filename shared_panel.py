@@ -0,0 +1,268 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import config
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# ------------------------------------------------------------------------------------
+# Panel de precios en memoria compartida para varios workers
+# ------------------------------------------------------------------------------------
+# Un proceso cargador publica cada versión del panel en un segmento propio
+# (`<nombre>_v<N>`) que no se vuelve a modificar. Un segmento de control pequeño
+# indica cuál es la versión vigente y se protege con un seqlock: el escritor pone el
+# contador en impar, actualiza y lo vuelve a par; el lector reintenta si lo ve impar
+# o si cambió mientras leía. Así todos los workers mapean los mismos bytes (la RSS
+# no crece con la cantidad de workers) y nunca ven una versión a medio escribir.
+
+MAGIC = b'FBPANEL1'
+# magic, seq, version, data_size, published_at
+_CONTROL = struct.Struct('<8sQQQd')
+_ALIGN = 64
+
+
+class _ReadOnlySegment:
+    """Segmento abierto solo para lectura.
+
+    En Linux se mapea /dev/shm/<nombre> con PROT_READ, así un worker no puede
+    modificar el panel. En otros sistemas se usa SharedMemory y se lo quita del
+    resource_tracker, que si no borraría el segmento al terminar el lector.
+    """
+
+    def __init__(self, name):
+        path = os.path.join('/dev/shm', name)
+        self.path = None
+        if os.path.isdir('/dev/shm'):
+            with open(path, 'rb') as f:
+                self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.path, self.inode = path, os.fstat(f.fileno()).st_ino
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            try:
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
+            except Exception:
+                pass
+            self.buf = self._shm.buf
+
+    def replaced(self):
+        """True si el segmento ya no existe o es otro con el mismo nombre (un cargador
+        nuevo lo recreó). Solo se puede saber en Linux; en otros sistemas da False."""
+        if self.path is None:
+            return False
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return True
+
+
+def _layout(panel):
+    meta = {
+        'tickers': panel.tickers,
+        'dates': panel.dates.values.astype('datetime64[ns]').astype('int64').tolist(),
+        'fields': [],
+    }
+    meta_bytes = json.dumps(meta).encode()
+    offset = -(-(8 + len(meta_bytes) + 4096) // _ALIGN) * _ALIGN
+    for name, values in panel.fields.items():
+        meta['fields'].append({'name': name, 'dtype': values.dtype.str,
+                               'shape': list(values.shape), 'offset': offset})
+        offset += -(-values.nbytes // _ALIGN) * _ALIGN
+    return meta, offset
+
+
+class SharedPanelWriter:
+    """Publica versiones del panel; lo usa un único proceso cargador."""
+
+    def __init__(self, name=None, keep=2):
+        self.name = name or config.SHARED_PANEL_NAME
+        self.keep = keep
+        self.version = 0
+        self._segments = []
+        try:
+            self._control = shared_memory.SharedMemory(self.name, create=True, size=_CONTROL.size)
+        except FileExistsError:
+            # Un cargador anterior murió sin limpiar: se reutiliza y se continúa la numeración
+            self._control = shared_memory.SharedMemory(self.name)
+            magic, seq, version, _, _ = _CONTROL.unpack_from(self._control.buf)
+            if magic == MAGIC:
+                self.version = version
+                self._remove_stale(version)
+        _CONTROL.pack_into(self._control.buf, 0, MAGIC, 0, self.version, 0, 0.0)
+
+    def _remove_stale(self, version):
+        for old_version in range(max(1, version - self.keep), version + 1):
+            try:
+                stale = shared_memory.SharedMemory(f"{self.name}_v{old_version}")
+            except FileNotFoundError:
+                continue
+            stale.close()
+            stale.unlink()
+
+    def publish(self, panel):
+        """Copia el panel a un segmento nuevo y lo marca como versión vigente."""
+        meta, size = _layout(panel)
+        meta_bytes = json.dumps(meta).encode()
+        version = self.version + 1
+        segment = shared_memory.SharedMemory(f"{self.name}_v{version}", create=True, size=size)
+        struct.pack_into('<Q', segment.buf, 0, len(meta_bytes))
+        segment.buf[8:8 + len(meta_bytes)] = meta_bytes
+        for field in meta['fields']:
+            target = np.ndarray(field['shape'], dtype=field['dtype'], buffer=segment.buf,
+                                offset=field['offset'])
+            target[...] = panel.fields[field['name']]
+            del target
+
+        # Seqlock: impar mientras se actualiza el puntero a la versión vigente
+        seq = _CONTROL.unpack_from(self._control.buf)[1]
+        struct.pack_into('<Q', self._control.buf, 8, seq + 1)
+        _CONTROL.pack_into(self._control.buf, 0, MAGIC, seq + 1, version, size, time.time())
+        struct.pack_into('<Q', self._control.buf, 8, seq + 2)
+
+        self.version = version
+        self._segments.append(segment)
+        # Los lectores que todavía mapean una versión vieja la conservan hasta soltarla
+        while len(self._segments) > self.keep:
+            old = self._segments.pop(0)
+            old.close()
+            old.unlink()
+        return version
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+        self._control.close()
+        self._control.unlink()
+
+
+class SharedPanelReader:
+    """Mapea en modo lectura la versión vigente del panel publicado."""
+
+    def __init__(self, name=None):
+        self.name = name or config.SHARED_PANEL_NAME
+        self._control = _ReadOnlySegment(self.name)
+        self._segment = None
+        self._panel = None
+        self.version = 0
+        self.published_at = 0.0
+
+    def _read_control(self, retries=1000):
+        for _ in range(retries):
+            magic, seq1, version, size, published_at = _CONTROL.unpack_from(self._control.buf)
+            if seq1 % 2 == 0:
+                seq2 = struct.unpack_from('<Q', self._control.buf, 8)[0]
+                if seq1 == seq2:
+                    return magic, version, published_at
+            time.sleep(0)
+        raise TimeoutError("El panel compartido está siendo actualizado")
+
+    def snapshot(self):
+        """Devuelve un PricePanel cuyos arrays apuntan directamente a la memoria compartida."""
+        from panel import PricePanel
+
+        magic, version, published_at = self._read_control()
+        if magic != MAGIC or version == 0:
+            return None
+        if version == self.version and self._panel is not None:
+            return self._panel
+
+        segment = _ReadOnlySegment(f"{self.name}_v{version}")
+        meta_len = struct.unpack_from('<Q', segment.buf, 0)[0]
+        meta = json.loads(bytes(segment.buf[8:8 + meta_len]))
+        fields = {}
+        for field in meta['fields']:
+            values = np.ndarray(field['shape'], dtype=field['dtype'], buffer=segment.buf,
+                                offset=field['offset'])
+            if values.flags.writeable:
+                values.flags.writeable = False
+            fields[field['name']] = values
+        dates = pd.to_datetime(np.array(meta['dates'], dtype='int64').astype('datetime64[ns]'))
+
+        # La versión anterior se suelta sin cerrarla: puede haber arrays que la sigan usando
+        self._segment = segment
+        self._panel = PricePanel(dates, meta['tickers'], fields)
+        self.version = version
+        self.published_at = published_at
+        return self._panel
+
+
+_reader = None
+_last_attempt = 0.0
+
+
+def get_shared_panel(retry_seconds=30, max_age_seconds=None):
+    """Panel compartido vigente, o None si no hay un cargador publicando.
+
+    El lector se vuelve a abrir si cambió el nombre del segmento, si un cargador nuevo
+    lo recreó o si la versión vigente está vencida: un cargador que se reinicia crea un
+    segmento de control nuevo y el mapeo anterior ya no recibe versiones.
+    """
+    global _reader, _last_attempt
+    max_age_seconds = config.SHARED_PANEL_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+    if _reader is not None and (_reader.name != config.SHARED_PANEL_NAME or _reader._control.replaced()):
+        _reader = None
+    if _reader is None:
+        if time.time() - _last_attempt < retry_seconds:
+            return None
+        _last_attempt = time.time()
+        try:
+            _reader = SharedPanelReader()
+        except FileNotFoundError:
+            return None
+    try:
+        snapshot = _reader.snapshot()
+    except FileNotFoundError:
+        _reader = None
+        return None
+    except TimeoutError:
+        return None
+    if snapshot is None or time.time() - _reader.published_at > max_age_seconds:
+        _reader = None
+        return None
+    return snapshot
+
+
+def run_loader(tickers, period='1y', refresh_seconds=900):
+    """Bucle del proceso cargador: descarga el panel y publica una versión nueva.
+
+    Con cada versión también se publica el snapshot columnar de indicadores (snapshot.py).
+    """
+    import panel as panel_module
+    import snapshot
+
+    writer = SharedPanelWriter()
+    try:
+        while True:
+            prices = panel_module.load_price_panel(tickers, period=period,
+                                                  max_age_hours=refresh_seconds / 3600)
+            if prices is not None:
+                version = writer.publish(prices)
+                print(f"Panel v{version} publicado: {prices.shape[0]} fechas × {prices.shape[1]} tickers "
+                      f"({prices.nbytes() / 1e6:.1f} MB)")
+                try:
+                    snapshot.publish(prices)
+                except Exception as e:
+                    print(f"Error publicando el snapshot de indicadores: {e}")
+            time.sleep(refresh_seconds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    from app import load_sp500_tickers
+
+    parser = argparse.ArgumentParser(description="Cargador del panel de precios compartido")
+    parser.add_argument('--period', default='1y')
+    parser.add_argument('--refresh', type=int, default=900, help="Segundos entre actualizaciones")
+    args = parser.parse_args()
+    run_loader(load_sp500_tickers(), period=args.period, refresh_seconds=args.refresh)
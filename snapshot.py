@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import config
+import metrics
+from lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# ------------------------------------------------------------------------------------
+# Snapshot columnar de indicadores y señales para otras herramientas
+# ------------------------------------------------------------------------------------
+# Cada escaneo del universo publica un directorio con un .npy por columna (un valor
+# por ticker) y un índice de símbolos. Un consumidor abre la columna con mmap y lee
+# los 500 tickers sin copiar datos.
+#
+# El cargador del panel compartido publica desde el panel completo (`publish`); los
+# escaneos diarios publican desde sus registros (`publish_records`: última fila y
+# rezagos de cada ticker). Un escaneo que se cortó antes solo trae parte del universo:
+# el resto de las filas se copia del snapshot vigente.
+#
+# Escritura atómica: el snapshot se arma en un directorio temporal, se renombra a su
+# nombre definitivo y recién entonces se reemplaza el enlace `latest` (os.replace
+# sobre un symlink). Un lector resuelve `latest` una vez y lee un directorio que ya
+# no cambia; nunca ve archivos a medio escribir.
+
+FEATURES = ('Close', 'Volume', 'SMA20', 'SMA50', 'RSI', 'MACD', 'Signal', 'UpperBand', 'LowerBand',
+            'BB_Percent', 'AvgVolume')
+SIGNALS = ('comprar', 'no_comprar', 'corto', 'mediano', 'largo', 'volume_spike', 'valid', 'signal')
+PRICES = ('entry', 'target')
+LATEST = 'latest'
+# Rezagos que usan las reglas de mediano y largo plazo: (columna, n) es hist[columna].iloc[-n]
+LAGS = (('SMA20', 10), ('SMA50', 20), ('SMA50', 60))
+
+
+def _snapshot_root():
+    return config.SNAPSHOT_DIR
+
+
+def _params(params):
+    """Parámetros de indicadores y umbrales: los de config.INDICATOR_PARAMS con los de
+    `params` encima. Las funciones públicas los resuelven una sola vez acá."""
+    return {**config.INDICATOR_PARAMS, **(params or {})}
+
+
+def _write_npy(directory, name, values):
+    with open(os.path.join(directory, f"{name}.npy"), 'wb') as f:
+        np.save(f, np.ascontiguousarray(values))
+
+
+def build_columns(panel, params=None):
+    """Última fila de cada indicador y señal por ticker, como arrays de largo N."""
+    import backtest
+    from panel import last_valid_rows
+
+    p = _params(params)
+    ind = backtest.compute_indicators(panel, p)
+    rules = backtest.evaluate_rules(ind, p)
+    rows, has_data = last_valid_rows(ind['Close'].to_numpy())
+    cols = np.arange(len(panel.tickers))
+
+    columns = {}
+    for name in FEATURES:
+        columns[name] = ind[name].to_numpy()[rows, cols].astype('float64')
+    for name in SIGNALS:
+        columns[name] = np.asarray(rules[name])[rows, cols].astype(bool) & has_data
+    for name in PRICES:
+        columns[name] = rules[name].to_numpy()[rows, cols].astype('float64')
+    for name in FEATURES + PRICES:
+        columns[name][~has_data] = np.nan
+    columns['date'] = panel.dates.values.astype('datetime64[ns]').astype('int64')[rows]
+    return columns
+
+
+def feature_record(ticker, hist, latest):
+    """Registro de un ticker para `publish_records` a partir de (hist, última fila)."""
+    from panel import session_dates
+
+    return {
+        'ticker': ticker,
+        'date': int(session_dates(hist.index[-1:])[0]),
+        'latest': {name: float(latest[name]) for name in FEATURES},
+        'lags': {(column, n): float(hist[column].iloc[-n]) for column, n in LAGS},
+    }
+
+
+def columns_from_records(records, params=None):
+    """Las mismas columnas que build_columns, desde los registros de un escaneo.
+
+    Aplica las reglas de backtest.evaluate_rules sobre la última fila: los valores
+    rezagados de las medias salen de `lags`.
+    """
+    p = _params(params)
+    columns = {name: np.array([r['latest'][name] for r in records], dtype='float64') for name in FEATURES}
+    lag = {key: np.array([r['lags'].get(key, np.nan) for r in records], dtype='float64') for key in LAGS}
+    price, sma20, sma50 = columns['Close'], columns['SMA20'], columns['SMA50']
+    rsi, macd, signal = columns['RSI'], columns['MACD'], columns['Signal']
+
+    with np.errstate(invalid='ignore'):
+        trend_up = sma20 > sma50
+        macd_up = macd > signal
+        buy_score = np.where(trend_up, 1, -1) + np.where(macd_up, 1, -1)
+        columns['comprar'] = buy_score > 1
+        columns['no_comprar'] = buy_score < -1
+        columns['corto'] = macd_up & (rsi > p['rsi_low']) & (rsi < p['rsi_high']) & (price > sma20)
+        columns['mediano'] = trend_up & (lag[('SMA20', 10)] < sma20) & (lag[('SMA50', 20)] < sma50)
+        columns['largo'] = (sma50 > lag[('SMA50', 60)]) & (price > sma50)
+        columns['volume_spike'] = columns['Volume'] > columns['AvgVolume'] * p['volume_spike']
+        columns['valid'] = (~np.isnan(lag[('SMA50', 60)]) & ~np.isnan(rsi) & ~np.isnan(signal)
+                            & ~np.isnan(columns['UpperBand']))
+        columns['signal'] = columns['comprar'] & columns['corto'] & columns['valid']
+        columns['entry'] = np.where(columns['BB_Percent'] < 30, columns['LowerBand'], sma20)
+        columns['target'] = columns['UpperBand'].copy()
+    columns['date'] = np.array([r.get('date', 0) for r in records], dtype='int64')
+    return columns
+
+
+def _merge_previous(symbols, columns, root):
+    """Agrega las filas del snapshot vigente que este escaneo no recorrió."""
+    previous = open_snapshot(root)
+    if previous is None or set(previous.meta['columns']) != set(columns):
+        return symbols, columns
+    seen = set(symbols)
+    rows = [i for i, s in enumerate(previous.symbols) if s not in seen]
+    if not rows:
+        return symbols, columns
+    merged = {name: np.concatenate([values, np.asarray(previous.column(name))[rows]])
+              for name, values in columns.items()}
+    return symbols + [previous.symbols[i] for i in rows], merged
+
+
+def publish_records(records, params=None, root=None, keep=3):
+    """Publica el snapshot de un escaneo a partir de sus registros. Devuelve su
+    directorio, o None si el escaneo no produjo registros."""
+    if not records:
+        return None
+    root = root or _snapshot_root()
+    p = _params(params)
+    with metrics.span('snapshot', source='scan'):
+        columns = columns_from_records(records, p)
+        symbols, columns = _merge_previous([r['ticker'] for r in records], columns, root)
+        return _write(symbols, columns, p, root, keep)
+
+
+def publish(panel, params=None, root=None, keep=3):
+    """Escribe un snapshot nuevo y lo marca como vigente. Devuelve su directorio."""
+    root = root or _snapshot_root()
+    p = _params(params)
+    with metrics.span('snapshot'):
+        return _write(panel.tickers, build_columns(panel, p), p, root, keep)
+
+
+def _write(symbols, columns, p, root, keep):
+    """Escribe las columnas en un directorio nuevo y mueve `latest` a él."""
+    os.makedirs(root, exist_ok=True)
+    # Nombres ordenables y únicos aunque se publique varias veces por segundo
+    name = time.strftime('%Y%m%d-%H%M%S') + f"-{time.time_ns() % 10**9:09d}-{os.getpid()}"
+    tmp_dir = os.path.join(root, f".tmp-{name}")
+    os.makedirs(tmp_dir)
+    try:
+        for column, values in columns.items():
+            _write_npy(tmp_dir, column, values)
+        with open(os.path.join(tmp_dir, 'symbols.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(symbols), f)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'created_at': time.time(), 'params': p, 'columns': sorted(columns),
+                       'rows': len(symbols)}, f)
+        final_dir = os.path.join(root, name)
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    link_tmp = os.path.join(root, f".{LATEST}-{os.getpid()}")
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    os.symlink(name, link_tmp)
+    os.replace(link_tmp, os.path.join(root, LATEST))
+    _prune(root, keep)
+    return final_dir
+
+
+def _prune(root, keep):
+    # Los lectores que todavía tienen columnas mapeadas las siguen viendo tras el borrado
+    current = os.path.realpath(os.path.join(root, LATEST))
+    snapshots = sorted(d for d in os.listdir(root)
+                       if not d.startswith('.') and d != LATEST and os.path.isdir(os.path.join(root, d)))
+    for old in snapshots[:-keep]:
+        path = os.path.join(root, old)
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class Snapshot:
+    """Snapshot abierto en modo lectura; las columnas se mapean en memoria."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'symbols.json'), encoding='utf-8') as f:
+            self.symbols = json.load(f)
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self._columns = {}
+
+    def column(self, name):
+        """Array de solo lectura respaldado por el archivo (sin copia)."""
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode='r')
+        return self._columns[name]
+
+    def row(self, symbol):
+        i = self.index[symbol]
+        return {name: self.column(name)[i].item() for name in self.meta['columns']}
+
+
+def open_snapshot(root=None, retries=3):
+    """Abre el snapshot vigente (el que apunta `latest`), o None si no hay ninguno."""
+    link = os.path.join(root or _snapshot_root(), LATEST)
+    for attempt in range(retries):
+        if not os.path.lexists(link):
+            return None
+        try:
+            return Snapshot(os.path.realpath(link))
+        except FileNotFoundError:
+            # Se publicó otro y este se borró entre resolver el enlace y abrirlo
+            if attempt == retries - 1:
+                raise
+
+
+def main():
+    import panel as panel_module
+    from app import load_sp500_tickers
+
+    parser = argparse.ArgumentParser(description="Publica el snapshot columnar de indicadores del universo")
+    parser.add_argument('--csv', default=config.CSV_PATH)
+    parser.add_argument('--period', default='1y')
+    args = parser.parse_args()
+
+    prices = panel_module.load_price_panel(load_sp500_tickers(args.csv), period=args.period)
+    if prices is None:
+        print("No se pudo obtener el panel de precios.")
+        return 1
+    directory = publish(prices)
+    print(f"Snapshot publicado en {directory} ({len(prices.tickers)} tickers)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
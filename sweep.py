@@ -0,0 +1,190 @@
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import time
+
+import config
+
+# ------------------------------------------------------------------------------------
+# Barrido de parámetros de los indicadores en paralelo
+# ------------------------------------------------------------------------------------
+# Cada combinación del grid se evalúa con backtest.run_backtest en un pool de
+# procesos. El panel se escribe una sola vez como .npy y cada worker lo abre con
+# memory-map en modo lectura: las páginas se comparten entre procesos y las tareas
+# solo transportan el dict de parámetros. Cada resultado se agrega a un archivo
+# JSONL de checkpoint, así que un barrido interrumpido se retoma donde quedó. El
+# checkpoint es por panel (tickers y rango de fechas, ver panel_fingerprint): los
+# resultados sobre otro universo u otro período no se reutilizan.
+
+DEFAULT_GRID = {
+    'sma_fast': [10, 20, 30],
+    'sma_slow': [50, 100],
+    'rsi_window': [9, 14],
+    'rsi_low': [25, 30, 35],
+    'rsi_high': [65, 70, 75],
+    'macd_fast': [12],
+    'macd_slow': [26],
+    'macd_signal': [9],
+    'bb_std': [1.5, 2, 2.5],
+}
+
+_worker_panel = None
+
+
+def expand_grid(grid):
+    """Devuelve la lista de combinaciones (dicts) del grid, ignorando las inválidas."""
+    keys = sorted(grid)
+    combos = []
+    for values in itertools.product(*(grid[k] for k in keys)):
+        params = dict(zip(keys, values))
+        full = {**config.INDICATOR_PARAMS, **params}
+        if full['sma_fast'] >= full['sma_slow'] or full['macd_fast'] >= full['macd_slow']:
+            continue
+        if full['rsi_low'] >= full['rsi_high']:
+            continue
+        combos.append(params)
+    return combos
+
+
+def params_key(params):
+    # Se completa con los valores por defecto para que {'bb_std': 2} y {} sean la misma combinación
+    return json.dumps({**config.INDICATOR_PARAMS, **params}, sort_keys=True)
+
+
+def panel_fingerprint(panel):
+    """Identifica el panel del barrido: tickers, cantidad de velas y primera y última fecha."""
+    dates = panel.dates
+    first, last = (str(dates[0]), str(dates[-1])) if len(dates) else ('', '')
+    raw = f"{','.join(panel.tickers)}|{len(dates)}|{first}|{last}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def load_checkpoint(path, fingerprint=None):
+    """Lee los resultados ya calculados sobre el panel `fingerprint` (todos si es None);
+    tolera una última línea a medio escribir."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if fingerprint is not None and result.get('panel') != fingerprint:
+                continue
+            done[params_key(result['params'])] = result
+    return done
+
+
+def _init_worker(panel_dir):
+    global _worker_panel
+    from panel import PricePanel
+    _worker_panel = PricePanel.open_npy(panel_dir)
+
+
+def _nan_to_none(value):
+    return None if value != value else value
+
+
+def evaluate(params):
+    """Evalúa una combinación sobre el panel compartido del worker."""
+    import backtest
+
+    report = backtest.run_backtest(_worker_panel, params)
+    summary = {'params': params, 'signals': report['fills']['signals'],
+               'elapsed': round(report['elapsed'], 3)}
+    for h in report['horizons']:
+        stats = report['returns']['COMPRAR + corto plazo'][h]
+        summary[f'hit_{h}d'] = _nan_to_none(stats['hit_rate'])
+        summary[f'mean_{h}d'] = _nan_to_none(stats['mean'])
+    summary['entry_fill_rate'] = _nan_to_none(float(report['fills']['entry_fill_rate']))
+    summary['target_hit_rate'] = _nan_to_none(float(report['fills']['target_hit_rate']))
+    return summary
+
+
+def run_sweep(panel, grid=None, checkpoint_path=None, max_workers=None, panel_dir=None):
+    """Evalúa todas las combinaciones pendientes del grid y devuelve todos los resultados."""
+    combos = expand_grid(grid or DEFAULT_GRID)
+    fingerprint = panel_fingerprint(panel)
+    checkpoint_path = checkpoint_path or os.path.join(config.CACHE_DIR, f'sweep_checkpoint_{fingerprint}.jsonl')
+    os.makedirs(os.path.dirname(checkpoint_path) or '.', exist_ok=True)
+
+    done = load_checkpoint(checkpoint_path, fingerprint)
+    pending = [c for c in combos if params_key(c) not in done]
+    print(f"Barrido: {len(combos)} combinaciones, {len(done)} en checkpoint, {len(pending)} pendientes")
+    if not pending:
+        return [done[params_key(c)] for c in combos if params_key(c) in done]
+
+    owns_dir = panel_dir is None
+    if owns_dir:
+        os.makedirs(config.CACHE_DIR, exist_ok=True)
+        panel_dir = tempfile.mkdtemp(prefix='sweep_panel_', dir=config.CACHE_DIR)
+    panel.save_npy(panel_dir)
+
+    start = time.perf_counter()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                                    initargs=(panel_dir,)) as executor, \
+                open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            futures = {executor.submit(evaluate, params): params for params in pending}
+            for n, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error evaluando {futures[future]}: {e}")
+                    continue
+                result['panel'] = fingerprint
+                checkpoint.write(json.dumps(result) + "\n")
+                checkpoint.flush()
+                done[params_key(result['params'])] = result
+                if n % 10 == 0 or n == len(pending):
+                    print(f"  {n}/{len(pending)} combinaciones ({time.perf_counter() - start:.1f}s)")
+    finally:
+        if owns_dir:
+            for name in os.listdir(panel_dir):
+                os.remove(os.path.join(panel_dir, name))
+            os.rmdir(panel_dir)
+
+    return [done[params_key(c)] for c in combos if params_key(c) in done]
+
+
+def rank_results(results, metric='mean_20d', min_signals=30):
+    eligible = [r for r in results if r['signals'] >= min_signals and r.get(metric) is not None]
+    return sorted(eligible, key=lambda r: r[metric], reverse=True)
+
+
+def main():
+    import panel as panel_module
+    from app import load_sp500_tickers
+
+    parser = argparse.ArgumentParser(description="Barrido de parámetros de los indicadores")
+    parser.add_argument('--period', default='5y')
+    parser.add_argument('--csv', default=config.CSV_PATH)
+    parser.add_argument('--grid', help="Grid en JSON, ej: '{\"sma_fast\": [10, 20]}'")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--metric', default='mean_20d')
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    grid = {**DEFAULT_GRID, **json.loads(args.grid)} if args.grid else DEFAULT_GRID
+    prices = panel_module.load_price_panel(load_sp500_tickers(args.csv), period=args.period)
+    if prices is None:
+        print("No se pudo obtener el panel de precios.")
+        return 1
+
+    results = run_sweep(prices, grid, args.checkpoint, args.workers)
+    print(f"\nMejores combinaciones por {args.metric}:")
+    for r in rank_results(results, args.metric)[:args.top]:
+        print(f"{r[args.metric] * 100:7.2f}%  hit20d {r['hit_20d'] * 100:5.1f}%  "
+              f"señales {r['signals']:6}  {r['params']}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,193 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+import metrics
+
+# ------------------------------------------------------------------------------------
+# Control de concurrencia adaptativo (AIMD) y límite de pedidos a Yahoo
+# ------------------------------------------------------------------------------------
+# Todos los pedidos en vivo de market_data pasan por dos controles compartidos:
+#
+# - TokenBucket: tope global de pedidos por segundo (con ráfaga), sin importar
+#   cuántos hilos o escaneos haya en paralelo.
+# - AdaptiveLimiter: cantidad de pedidos simultáneos. Sube de a poco (+1 por cada
+#   "ventana" de respuestas rápidas) y se reduce a la mitad ante un 429/rate limit o
+#   cuando la latencia se dispara. Así converge al máximo que Yahoo tolera.
+
+
+class ThrottledError(Exception):
+    """Yahoo rechazó el pedido por exceso de tráfico (429 / rate limit)."""
+
+
+def is_throttle_error(error):
+    if isinstance(error, ThrottledError):
+        return True
+    text = f"{type(error).__name__} {error}"
+    return 'RateLimit' in text or '429' in text or 'Too Many Requests' in text
+
+
+class TokenBucket:
+    """Permite `rate` pedidos por segundo con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Frena todos los pedidos por `seconds` (después de un 429)."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class AdaptiveLimiter:
+    """Límite de pedidos simultáneos con aumento aditivo y reducción multiplicativa."""
+
+    def __init__(self, initial, minimum, maximum, latency_factor=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.baseline = None         # latencia típica (EWMA) con la red sin congestión
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease()
+            elif latency is not None:
+                if self.baseline is None:
+                    self.baseline = latency
+                if latency > self.baseline * self.latency_factor:
+                    self._decrease()
+                else:
+                    self.baseline = 0.9 * self.baseline + 0.1 * latency
+                    # +1 al límite por cada `limit` respuestas rápidas
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def _decrease(self):
+        # Una sola reducción por "vuelta" (latencia típica): los pedidos que ya estaban en
+        # curso cuando llegó la señal no vuelven a reducir el límite
+        now = time.monotonic()
+        if now - self._last_decrease >= (self.baseline or 0.5) * 2:
+            self.limit = max(self.minimum, self.limit / 2)
+            self._last_decrease = now
+            metrics.inc('fetch_concurrency_decreases_total')
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        start = time.perf_counter()
+        outcome = {'throttled': False, 'ok': False}
+        try:
+            yield outcome
+        finally:
+            latency = time.perf_counter() - start if outcome['ok'] else None
+            self.release(latency, outcome['throttled'])
+
+
+bucket = TokenBucket(config.YAHOO_RATE_PER_SECOND, config.YAHOO_BURST)
+limiter = AdaptiveLimiter(config.YAHOO_INITIAL_CONCURRENCY, 1,
+                          config.YAHOO_MAX_CONCURRENCY)
+
+
+def call(func):
+    """Ejecuta un pedido a Yahoo respetando ambos límites; reintenta los 429 con espera
+    exponencial y, si se agotan los intentos, levanta ThrottledError."""
+    retries = config.YAHOO_MAX_RETRIES
+    backoff = config.YAHOO_BACKOFF_SECONDS
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        with limiter.slot() as outcome:
+            try:
+                result = func()
+                outcome['ok'] = True
+                return result
+            except Exception as e:
+                if not is_throttle_error(e):
+                    raise
+                outcome['throttled'] = True
+                metrics.inc('yahoo_throttled_total')
+                error = e
+        delay = backoff * 2 ** attempt
+        bucket.pause(delay)
+        time.sleep(delay)
+    raise ThrottledError(f"Yahoo limitó los pedidos: {error}")
+
+
+def run_scan(items, func, stop=None, max_workers=None, retry_rounds=2, deadline=None, on_result=None):
+    """Procesa `items` en paralelo y devuelve los resultados no nulos.
+
+    La cantidad de hilos es solo un techo: la concurrencia real hacia Yahoo la define
+    el limitador adaptativo. Los ítems que terminan en ThrottledError se reintentan en
+    rondas posteriores en lugar de perderse. `stop(results)` corta el escaneo antes, y
+    también se corta al vencer `deadline` (scan_plan.Deadline) con lo obtenido hasta ahí;
+    en ambos casos se devuelve recién cuando terminaron los pedidos ya en curso.
+    `on_result(result)` recibe cada resultado apenas termina, sin esperar al resto.
+    """
+    import concurrent.futures
+
+    max_workers = max_workers or config.SCAN_MAX_WORKERS
+    results = []
+    pending = list(items)
+    for round_number in range(retry_rounds + 1):
+        throttled = []
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        futures = {executor.submit(func, item): item for item in pending}
+        try:
+            timeout = deadline.remaining() if deadline else None
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                try:
+                    result = future.result()
+                except ThrottledError:
+                    throttled.append(futures[future])
+                    continue
+                except Exception:
+                    continue
+                if result:
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+                    if stop and stop(results):
+                        return results
+        except concurrent.futures.TimeoutError:
+            return results
+        finally:
+            # Al cortar antes se cancelan los pedidos que no empezaron, pero se espera a
+            # los que están en curso: escriben en estructuras del llamador (registros,
+            # checkpoint) y usan turnos del limitador, así que no pueden seguir sueltos
+            # después de devolver. La espera la acota el timeout de cada pedido.
+            executor.shutdown(wait=True, cancel_futures=True)
+        if not throttled or (deadline and deadline.expired()):
+            break
+        print(f"{len(throttled)} tickers limitados por Yahoo; reintentando (ronda {round_number + 1})")
+        pending = throttled
+    return results
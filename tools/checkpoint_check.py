@@ -0,0 +1,120 @@
+"""Verifica la puesta al día del checkpoint de indicadores (checkpoint.py) sin red.
+
+Arma un historial diario con zona horaria (como Ticker.history) cuya última vela está
+abierta, lo guarda como estado y lo pone al día con catch_up contra un panel en lote
+sin zona horaria (como download_panel) que trae esa vela ya cerrada y algunas nuevas.
+Verifica que:
+- la vela abierta se reemplace (cierres iguales al historial completo);
+- MACD y señal coincidan con el cálculo sobre el historial completo;
+- un estado cuya descarga no llega a su última vela no quede marcado como al día;
+- guardar y leer el checkpoint conserve fechas y valores.
+Sale con código 1 si alguna verificación falla.
+
+Uso: python tools/checkpoint_check.py [--bars 180] [--new 3] [--tz America/New_York]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import checkpoint  # noqa: E402
+import config  # noqa: E402
+import panel  # noqa: E402
+
+TOLERANCE = 1e-9
+
+
+def synthetic_history(bars, tz, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    index = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=1), periods=bars, tz=tz)
+    return pd.DataFrame({'Close': close, 'Volume': rng.lognormal(14, 0.5, bars)}, index=index)
+
+
+def reference_macd(close, p):
+    ema_fast = close.ewm(span=p['macd_fast'], adjust=False).mean()
+    ema_slow = close.ewm(span=p['macd_slow'], adjust=False).mean()
+    macd = ema_fast - ema_slow
+    return float(macd.iloc[-1]), float(macd.ewm(span=p['macd_signal'], adjust=False).mean().iloc[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bars', type=int, default=180)
+    parser.add_argument('--new', type=int, default=3, help="Velas nuevas que trae la descarga")
+    parser.add_argument('--tz', default='America/New_York')
+    args = parser.parse_args()
+
+    p = config.INDICATOR_PARAMS
+    full = synthetic_history(args.bars, args.tz)
+    cut = args.bars - args.new
+    # Lo que vio el último escaneo: la vela `cut - 1` todavía abierta, con otro cierre
+    partial = full.iloc[:cut].copy()
+    partial.iloc[-1, partial.columns.get_loc('Close')] *= 0.95
+    stale = time.time() - 2 * config.CHECKPOINT_FRESH_SECONDS
+    states = {
+        'OPEN': checkpoint.TickerState.from_history(partial, p, updated=stale),
+        'BEHIND': checkpoint.TickerState.from_history(full, p, updated=stale),
+    }
+
+    # La descarga en lote llega sin zona horaria, como la devuelve download_panel; para
+    # BEHIND solo trae velas anteriores a su última guardada
+    bulk = full.iloc[cut - 1:]
+    close = np.column_stack([bulk['Close'].to_numpy(), np.full(len(bulk), np.nan)])
+    close[:2, 1] = full['Close'].iloc[-4:-2].to_numpy()
+    volume = np.column_stack([bulk['Volume'].to_numpy()] * 2)
+    columns = ['OPEN', 'BEHIND']
+
+    def download_panel(tickers, period, interval):
+        cols = [columns.index(t) for t in tickers]
+        fields = {f: close[:, cols] for f in ('Open', 'High', 'Low', 'Close')}
+        fields['Volume'] = volume[:, cols]
+        return panel.PricePanel(bulk.index.tz_localize(None), tickers, fields)
+
+    panel.download_panel = download_panel
+    updated = checkpoint.catch_up(states, ['OPEN', 'BEHIND'], p)
+
+    failures = []
+    state = states['OPEN']
+    tail = full.iloc[-len(state.close):]
+    close_error = float(np.max(np.abs(state.close - tail['Close'].to_numpy())))
+    macd, signal = state.macd_signal(p)
+    ref_macd, ref_signal = reference_macd(full['Close'], p)
+    macd_error = max(abs(macd - ref_macd), abs(signal - ref_signal))
+    dates_ok = np.array_equal(state.dates, panel.session_dates(tail.index))
+    print(f"Vela abierta reemplazada: error de cierres {close_error:.2e}, fechas {'OK' if dates_ok else 'distintas'}")
+    print(f"MACD {macd:.4f} (ref {ref_macd:.4f}) · señal {signal:.4f} (ref {ref_signal:.4f}) · error {macd_error:.2e}")
+    if close_error > TOLERANCE or not dates_ok:
+        failures.append("la vela abierta no se reemplazó")
+    if macd_error > TOLERANCE:
+        failures.append("MACD o señal distintos del historial completo")
+    if 'OPEN' not in updated or not state.is_fresh():
+        failures.append("OPEN no quedó al día")
+    if 'BEHIND' in updated or states['BEHIND'].is_fresh():
+        failures.append("BEHIND quedó al día sin velas nuevas")
+    print(f"Al día: {sorted(updated)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'check.ckpt.npz')
+        checkpoint.save(states, p, path)
+        loaded = checkpoint.load(p, path)
+    roundtrip = all(np.array_equal(loaded[t].dates, s.dates) and np.array_equal(loaded[t].close, s.close)
+                    for t, s in states.items())
+    print(f"Guardar y leer: {'OK' if roundtrip else 'distinto'}")
+    if not roundtrip:
+        failures.append("el checkpoint leído no coincide con el guardado")
+
+    for failure in failures:
+        print(f"FALLA: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,151 @@
+"""Compara el modo compacto de los paneles (float32 / volumen entero) contra float64.
+
+Arma un panel de varios años y 500 tickers (sintético, o uno cacheado con --cache),
+calcula indicadores y reglas por ambos caminos y verifica:
+- error relativo máximo de precios e indicadores dentro de lo documentado en panel.py;
+- que las recomendaciones de la última fecha (las que ve el escaneo) no cambien;
+- cuántas decisiones históricas (fecha × ticker) cambian, si alguna.
+También informa la memoria y el tamaño en disco de cada modo. Sale con código 1 si
+alguna garantía no se cumple.
+
+Uso: python tools/compact_check.py [--years 5] [--tickers 500] [--cache DB/cache/panel_....npz]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import backtest  # noqa: E402
+from panel import PricePanel  # noqa: E402
+
+# Error relativo admitido: precios guardados en float32 (2^-24) e indicadores derivados
+PRICE_TOLERANCE = 2 ** -24
+INDICATOR_TOLERANCE = 1e-6
+POINT_TOLERANCE = {'RSI': 1e-2, 'BB_Percent': 1e-2}
+RULES = ('comprar', 'no_comprar', 'corto', 'mediano', 'largo', 'volume_spike', 'signal')
+
+
+def synthetic_panel(years, n_tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2025-12-31', periods=years * 252)
+    n = len(dates)
+    start = rng.uniform(5, 3000, n_tickers)
+    returns = rng.normal(0.0003, 0.02, (n, n_tickers))
+    close = start * np.exp(np.cumsum(returns, axis=0))
+    spread = np.abs(rng.normal(0, 0.01, (n, n_tickers)))
+    volume = rng.lognormal(14, 1.2, n_tickers) * rng.lognormal(0, 0.5, (n, n_tickers))
+    fields = {
+        'Open': close * (1 + rng.normal(0, 0.005, (n, n_tickers))),
+        'High': close * (1 + spread),
+        'Low': close * (1 - spread),
+        'Close': close,
+        'Volume': np.floor(volume),
+    }
+    # Algunos tickers empiezan a cotizar más tarde (huecos al principio, como una IPO)
+    late = rng.choice(n_tickers, n_tickers // 20, replace=False)
+    for col in late:
+        first = rng.integers(1, n // 2)
+        for values in fields.values():
+            values[:first, col] = np.nan
+    # Redondeo a centavos, como los precios de Yahoo
+    for field in ('Open', 'High', 'Low', 'Close'):
+        fields[field] = np.round(fields[field], 2)
+    return PricePanel(dates, [f"T{i:03d}" for i in range(n_tickers)], fields)
+
+
+def _relative_error(a, b):
+    a = np.asarray(a, dtype='float64')
+    b = np.asarray(b, dtype='float64')
+    both = ~np.isnan(a) & ~np.isnan(b)
+    if (np.isnan(a) != np.isnan(b)).any():
+        return np.inf
+    scale = np.maximum(np.abs(a[both]), 1e-12)
+    return float(np.max(np.abs(a[both] - b[both]) / scale)) if both.any() else 0.0
+
+
+def _disk_size(panel):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'panel.npz')
+        panel.save(path)
+        size = os.path.getsize(path)
+        reloaded = PricePanel.load(path)
+    return size, reloaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--cache', help="Panel cacheado (.npz) a usar en lugar del sintético")
+    args = parser.parse_args()
+
+    full = PricePanel.load(args.cache).to_float64() if args.cache else synthetic_panel(args.years, args.tickers)
+    compact = full.to_compact()
+    failures = []
+
+    print(f"Panel: {full.shape[0]} fechas × {full.shape[1]} tickers")
+    full_disk, _ = _disk_size(full)
+    compact_disk, reloaded = _disk_size(compact)
+    if not reloaded.dates.equals(full.dates):
+        failures.append("el eje de fechas no sobrevive a guardar/cargar en modo compacto")
+
+    for field in full.fields:
+        error = _relative_error(full[field], reloaded[field])
+        tolerance = 0.5 if field == 'Volume' else PRICE_TOLERANCE  # el volumen se redondea a entero
+        if field == 'Volume':
+            error = float(np.nanmax(np.abs(np.asarray(full[field]) - reloaded[field])))
+        print(f"  {field:<10} error máx {error:.2e}")
+        if error > tolerance:
+            failures.append(f"{field}: error {error:.2e} > {tolerance:.2e}")
+
+    ind_full = backtest.compute_indicators(full)
+    ind_compact = backtest.compute_indicators(reloaded)
+    for name in ind_full:
+        if name in full.fields:
+            continue  # Close y Volume ya se compararon arriba
+        error = _relative_error(ind_full[name].to_numpy(), ind_compact[name].to_numpy())
+        tolerance, unit = INDICATOR_TOLERANCE, 'relativo'
+        difference = np.abs(ind_full[name].to_numpy() - ind_compact[name].to_numpy())
+        if name in ('MACD', 'Signal'):
+            # Oscilan alrededor de 0: el error se mide contra el nivel del precio
+            error = float(np.nanmax(difference / np.abs(ind_full['Close'].to_numpy())))
+        elif name in POINT_TOLERANCE:
+            # Escalas 0-100 que dependen de diferencias de precios: error absoluto en puntos
+            error, tolerance, unit = float(np.nanmax(difference)), POINT_TOLERANCE[name], 'puntos'
+        print(f"  {name:<10} error máx {error:.2e} ({unit})")
+        if error > tolerance:
+            failures.append(f"{name}: error {error:.2e} > {tolerance:.0e}")
+
+    rules_full = backtest.evaluate_rules(ind_full)
+    rules_compact = backtest.evaluate_rules(ind_compact)
+    print("Decisiones distintas (todas las fechas / última fecha):")
+    # Un cambio histórico aislado es esperable (valores comparados casi iguales); en la
+    # última fecha, la que usa el escaneo, no debe haber ninguno en el panel de prueba
+    for rule in RULES:
+        a = np.asarray(rules_full[rule], dtype=bool)
+        b = np.asarray(rules_compact[rule], dtype=bool)
+        changed, last_changed = int((a != b).sum()), int((a[-1] != b[-1]).sum())
+        print(f"  {rule:<13} {changed:>6} de {a.size} / {last_changed} de {a.shape[1]}")
+        if last_changed:
+            failures.append(f"la regla {rule} cambia en la última fecha para {last_changed} tickers")
+
+    ind_bytes = lambda ind: sum(frame.to_numpy().nbytes for frame in ind.values())  # noqa: E731
+    print(f"Memoria del panel:       {full.nbytes() / 2**20:8.1f} MB -> {compact.nbytes() / 2**20:8.1f} MB")
+    print(f"Memoria de indicadores:  {ind_bytes(ind_full) / 2**20:8.1f} MB -> {ind_bytes(ind_compact) / 2**20:8.1f} MB")
+    print(f"Disco (.npz):            {full_disk / 2**20:8.1f} MB -> {compact_disk / 2**20:8.1f} MB")
+
+    if failures:
+        print("\nFALLA:\n  " + "\n  ".join(failures))
+        return 1
+    print("\nOK: el modo compacto respeta las garantías de precisión")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Control del tiempo de arranque con `python -X importtime`.
+
+Importa cada punto de entrada en un intérprete limpio y falla (código de salida 1)
+si supera su presupuesto en milisegundos o si arrastra alguna dependencia pesada
+que debería cargarse de forma diferida.
+
+Uso: python tools/import_budget.py
+"""
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (módulo, directorio desde el que se importa, presupuesto en ms)
+ENTRY_POINTS = [
+    ('main', os.path.join(ROOT, 'Manual'), 50),
+    ('manualBOT', os.path.join(ROOT, 'Manual'), 50),
+    ('app', ROOT, 400),
+]
+
+# Estas librerías solo deben importarse cuando realmente se usan
+HEAVY_MODULES = ['pandas', 'numpy', 'yfinance', 'requests']
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def measure(module, cwd):
+    """Devuelve (ms acumulados del módulo, conjunto de módulos importados)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{result.stderr}")
+
+    cumulative_us = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        imported.add(name)
+        if name == module and len(match.group(3)) == 1:
+            cumulative_us = int(match.group(2))
+    return (cumulative_us or 0) / 1000, imported
+
+
+def main():
+    failures = []
+    for module, cwd, budget_ms in ENTRY_POINTS:
+        elapsed_ms, imported = measure(module, cwd)
+        heavy = [m for m in HEAVY_MODULES if m in imported]
+        status = "OK" if elapsed_ms <= budget_ms and not heavy else "FALLA"
+        print(f"{status:5} {module:10} {elapsed_ms:8.1f} ms (presupuesto {budget_ms} ms)"
+              + (f" · importa {', '.join(heavy)}" if heavy else ""))
+        if status != "OK":
+            failures.append(module)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())